@@ -3,6 +3,7 @@ import argparse, os
 from robot.utils.base.load_file import load_yaml
 from robot.config._GLOBAL_CONFIG import CONFIG_DIR
 from robot.robot import get_robot
+from robot.robot.base_robot_node import ROBOT_MAP
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--task_name", type=str, required=True, help="task name, e.g. reacher-easy")
@@ -10,6 +11,11 @@ parser.add_argument("--base_cfg", type=str, required=True, help="config file nam
 parser.add_argument("--idx", type=int, required=True, help="config file name for data collection")
 parser.add_argument("--collect", action="store_true", help="enable data collection")
 parser.add_argument("--collect_idx", type=int, help="required when --collect is set")
+parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor, e.g. 2.0 for twice as fast")
+parser.add_argument("--rate", type=float, default=None, help="resample commands to this rate in Hz, e.g. 200")
+parser.add_argument("--native_rate", action="store_true", help="resample to the fastest controller rate in ROBOT_MAP")
+parser.add_argument("--no_timestamp", action="store_true", help="ignore recorded timestamps and replay at save_freq")
+parser.add_argument("--max_gap", type=float, default=None, help="gaps longer than this (seconds) are skipped")
 args_cli = parser.parse_args()
 if args_cli.collect and args_cli.collect_idx is None:
     parser.error("--collect requires --collect_idx (e.g. --collect --collect_idx 3)")
@@ -29,4 +35,9 @@ if __name__ == "__main__":
 
     save_dir = os.path.join(base_cfg["collect"].get("save_dir"), base_cfg["collect"]["task_name"], base_cfg["collect"]["type"])
     
-    robot.replay(data_path=os.path.join(save_dir, f"{args_cli.idx}.hdf5"), fps= base_cfg["collect"].get("save_freq", 30), key_banned=["eef"], is_collect=args_cli.collect, episode_id=args_cli.collect_idx)
\ No newline at end of file
+    rate = args_cli.rate
+    if rate is None and args_cli.native_rate:
+        rate = max(ROBOT_MAP["controller"].get(controller_type, 30) for controller_type in robot.controllers.keys())
+
+    robot.replay(data_path=os.path.join(save_dir, f"{args_cli.idx}.hdf5"), fps= base_cfg["collect"].get("save_freq", 30), key_banned=["eef"], is_collect=args_cli.collect, episode_id=args_cli.collect_idx,
+                 speed=args_cli.speed, rate=rate, use_timestamps=not args_cli.no_timestamp, max_gap=args_cli.max_gap)
\ No newline at end of file
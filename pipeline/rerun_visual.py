@@ -27,6 +27,8 @@ import sys
 from tqdm import tqdm
 import argparse
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import base64
 from io import BytesIO
 
@@ -67,6 +69,11 @@ except ImportError:
     debug_print("RERUN", "未安装rerun-sdk，请运行: pip install rerun-sdk", "ERROR")
     sys.exit(1)
 
+try:
+    from robot.data.manifest import list_episode_files
+except ImportError:
+    list_episode_files = None
+
 try:
     from PIL import Image
     HAS_PIL = True
@@ -130,16 +137,11 @@ def decode_image_from_bytes(img_bytes):
             return None
 
 
-def extract_images_from_dataset(dataset, frame_idx):
+def extract_image(data):
     """
-    从数据集中提取图像
+    从单帧数据中提取图像
     处理各种可能的图像存储格式
     """
-    if frame_idx >= len(dataset):
-        return None
-    
-    data = dataset[frame_idx]
-    
     # 情况1: 直接是numpy数组图像
     if isinstance(data, np.ndarray):
         if len(data.shape) >= 2:  # 已经是图像
@@ -160,6 +162,16 @@ def extract_images_from_dataset(dataset, frame_idx):
     return None
 
 
+def extract_images_from_dataset(dataset, frame_idx):
+    """
+    从数据集中提取图像
+    处理各种可能的图像存储格式
+    """
+    if frame_idx >= len(dataset):
+        return None
+    return extract_image(dataset[frame_idx])
+
+
 def is_tactile_image_data(data, frame_idx=0):
     """
     检测触觉数据是否为图像格式
@@ -200,18 +212,15 @@ def is_tactile_image_data(data, frame_idx=0):
     return False
 
 
-def apply_tactile_colormap(tactile_data):
+def apply_tactile_colormap(tactile_data, value_range=None):
     """
     为触觉数据应用颜色映射
     将触觉压力数据转换为彩色热力图
+    value_range: 整个数据集的 (min, max)，为 None 时使用单帧的范围
     """
     # 归一化到0-255
     if tactile_data.dtype != np.uint8:
-        if tactile_data.max() > tactile_data.min():
-            normalized = (tactile_data - tactile_data.min()) / (tactile_data.max() - tactile_data.min())
-            normalized = (normalized * 255).astype(np.uint8)
-        else:
-            normalized = np.zeros_like(tactile_data, dtype=np.uint8)
+        normalized = normalize_to_uint8(tactile_data, value_range)
     else:
         normalized = tactile_data
     
@@ -252,33 +261,138 @@ def apply_tactile_colormap(tactile_data):
     return colored
 
 
-def log_timeseries_data(entity_path, data, frame_idx, name_prefix="value"):
+# 按块读取/解码图像的参数: 每块至少 BLOCK_FRAMES 帧 (向上对齐到 HDF5 chunk)，每个数据集最多提前解码 DECODE_LOOKAHEAD 块
+BLOCK_FRAMES = 64
+DECODE_LOOKAHEAD = 4
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def normalize_to_uint8(data, value_range=None):
+    """按 value_range (默认为数据自身的范围) 线性映射到 0-255"""
+    lo, hi = value_range if value_range is not None else (data.min(), data.max())
+    if hi <= lo:
+        return np.zeros(data.shape, dtype=np.uint8)
+    scaled = (data.astype(np.float32) - lo) * (255.0 / (hi - lo))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def iter_dataset_blocks(dataset, block_frames=BLOCK_FRAMES):
+    """
+    按 HDF5 chunk 对齐的块顺序读取 dataset，返回 (start, block)
+    每个 chunk 只被解压一次
+    """
+    chunk = dataset.chunks[0] if dataset.chunks else 1
+    step = max(chunk, -(-block_frames // chunk) * chunk)
+    for start in range(0, len(dataset), step):
+        yield start, dataset[start:start + step]
+
+
+def dataset_value_range(dataset):
     """
-    记录时间序列数据到Rerun
-    自动处理标量、向量和多维数据
+    数值型数据集的全局 (min, max)，用于非 uint8 图像的归一化
+    编码图像或 uint8 数据返回 None
+    """
+    if dataset.dtype.kind not in "iuf" or dataset.dtype == np.uint8:
+        return None
+    lo, hi = np.inf, -np.inf
+    for _, block in iter_dataset_blocks(dataset):
+        if block.size:
+            lo, hi = min(lo, block.min()), max(hi, block.max())
+    return (lo, hi) if lo <= hi else None
+
+
+def to_display_image(image, value_range=None, reverse_channels=False):
+    """转换为 Rerun 显示用的 uint8 RGB 图像"""
+    if image.dtype != np.uint8:
+        image = normalize_to_uint8(image, value_range)
+    if len(image.shape) == 2:
+        image = np.stack([image, image, image], axis=-1)
+    elif len(image.shape) == 3 and image.shape[2] == 4:
+        image = image[:, :, :3]
+    if reverse_channels:
+        image = image[:, :, ::-1]
+    return image
+
+
+def _transform_block(block, transform):
+    return [transform(block[i]) for i in range(len(block))]
+
+
+class BlockPrefetcher:
+    """
+    在主线程按块读取 dataset (h5py 不在线程间共享)，在线程池中提前解码/转换，按帧顺序返回结果
+    transform: 单帧数据 -> 任意结果 (例如显示用图像)，在 worker 线程中执行
+    """
+    def __init__(self, dataset, pool, transform, lookahead=DECODE_LOOKAHEAD, block_frames=BLOCK_FRAMES):
+        self.length = len(dataset)
+        self.pool = pool
+        self.transform = transform
+        self.lookahead = lookahead
+        self._blocks = iter_dataset_blocks(dataset, block_frames)
+        self._pending = deque()
+        self._current = []
+        self._pos = 0
+        self._fill()
+
+    def __len__(self):
+        return self.length
+
+    def _fill(self):
+        while len(self._pending) < self.lookahead:
+            try:
+                _, block = next(self._blocks)
+            except StopIteration:
+                return
+            self._pending.append(self.pool.submit(_transform_block, block, self.transform))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pos >= len(self._current):
+            if not self._pending:
+                raise StopIteration
+            self._current = self._pending.popleft().result()
+            self._pos = 0
+            self._fill()
+        result = self._current[self._pos]
+        self._pos += 1
+        return result
+
+
+def log_timeseries_columns(entity_path, data, name_prefix="value"):
+    """
+    整列记录时间序列数据到Rerun (rr.send_columns)，每个 entity 只调用一次
+    自动处理标量、向量和多维数据，entity 结构与逐帧记录时相同
     """
     # 如果数据为None或空，直接返回，不记录任何内容
-    if data is None or len(data) == 0 or frame_idx >= len(data):
+    if data is None or len(data) == 0:
+        return
+    
+    data = np.asarray(data)
+    if data.dtype.kind not in "biuf":
+        debug_print("TIMESERIES", f"跳过非数值数据: {entity_path} ({data.dtype})", "DEBUG")
         return
     
-    frame_data = data[frame_idx]
+    indexes = [rr.TimeColumn("frame", sequence=np.arange(len(data)))]
+    values = data.reshape(len(data), -1).astype(np.float64)
     
     # 标量
-    if np.isscalar(frame_data) or (isinstance(frame_data, np.ndarray) and frame_data.size == 1):
-        value = float(frame_data) if not isinstance(frame_data, np.ndarray) else float(frame_data.item())
-        rr.log(entity_path, rr.Scalars([value]))
-    
-    # 向量
-    elif isinstance(frame_data, np.ndarray):
-        if len(frame_data.shape) == 1:
-            # 1D向量 - 记录每个元素
-            for i, val in enumerate(frame_data):
-                rr.log(f"{entity_path}/{name_prefix}_{i+1}", rr.Scalars([float(val)]))
-            # 也记录整个向量
-            rr.log(f"{entity_path}_vector", rr.Tensor(frame_data, dim_names=["dim"]))
-        else:
-            # 多维数据 - 作为张量
-            rr.log(entity_path, rr.Tensor(frame_data))
+    if values.shape[1] == 1:
+        rr.send_columns(entity_path, indexes=indexes, columns=rr.Scalars.columns(scalars=values[:, 0]))
+    
+    # 向量 - 记录每个元素，同时把整个向量作为一组曲线记录 (Tensor 不支持按列批量写入)
+    elif len(data.shape) == 2:
+        for i in range(values.shape[1]):
+            rr.send_columns(f"{entity_path}/{name_prefix}_{i+1}", indexes=indexes,
+                            columns=rr.Scalars.columns(scalars=values[:, i]))
+        rr.send_columns(f"{entity_path}_vector", indexes=indexes, columns=rr.Scalars.columns(scalars=values))
+    
+    # 多维数据 - 作为张量逐帧记录
+    else:
+        for frame_idx in range(len(data)):
+            rr.set_time("frame", sequence=frame_idx)
+            rr.log(entity_path, rr.Tensor(data[frame_idx]))
 
 
 def visualize_act_format(f, verbose=False):
@@ -513,6 +627,58 @@ def visualize_custom_format(f, verbose=False):
     return datasets, images, tactile_images, max_frames
 
 
+def image_transform(value_range=None, reverse_channels=False):
+    """
+    在 worker 线程中执行: 单帧数据 -> [(entity 后缀, rr.Image)]
+    解码、格式转换和 Rerun 的数据打包都不占用主线程
+    """
+    def transform(data):
+        image = extract_image(data)
+        if image is None:
+            return None
+        image = np.ascontiguousarray(to_display_image(image, value_range, reverse_channels))
+        return [("", rr.Image(image))]
+    return transform
+
+
+def tactile_transform(value_range=None, decode=False):
+    """
+    在 worker 线程中执行: 单帧触觉数据 -> [(entity 后缀, archetype)]
+    2D 数据记录热力图和原始张量, 彩色图像直接显示
+    decode: 数据可能是编码后的图像
+    """
+    def transform(data):
+        frame = extract_image(data) if decode else data
+        if frame is None:
+            return None
+        if len(frame.shape) == 2:
+            return [
+                ("_heatmap", rr.Image(apply_tactile_colormap(frame, value_range))),
+                # 同时记录原始数据的张量表示
+                ("_raw", rr.Tensor(frame)),
+            ]
+        if frame.dtype != np.uint8:
+            frame = normalize_to_uint8(frame, value_range)
+        return [("", rr.Image(np.ascontiguousarray(frame)))]
+    return transform
+
+
+def log_prefetched_streams(streams, max_frames, verbose=False):
+    """
+    按帧记录已在线程池中准备好的图像
+    streams: {entity_path: BlockPrefetcher}, 每帧结果为 [(entity 后缀, archetype)] 或 None
+    """
+    if not streams:
+        return
+    for frame_idx in tqdm(range(max_frames), desc="记录帧数据", disable=not verbose):
+        rr.set_time("frame", sequence=frame_idx)
+        for entity_path, prefetcher in streams.items():
+            if frame_idx < len(prefetcher):
+                result = next(prefetcher)
+                for suffix, archetype in result or ():
+                    rr.log(f"{entity_path}{suffix}", archetype)
+
+
 def visualize_hdf5_with_rerun(hdf5_path, verbose=False):
     """
     使用Rerun可视化HDF5文件内容（通用版本）
@@ -568,63 +734,28 @@ def visualize_hdf5_with_rerun(hdf5_path, verbose=False):
                 debug_print("VISUALIZE", f"  - 相机: {len(camera_data) if camera_data else 0}", "DEBUG")
                 debug_print("VISUALIZE", f"  - 触觉: {len(tactile_data) if tactile_data else 0}", "DEBUG")
             
-            for frame_idx in tqdm(range(max_frames), desc="记录帧数据", disable=not verbose):
-                rr.set_time("frame", sequence=frame_idx)
-                
-                # 左臂数据 - 只在数据存在时记录
-                if left_arm_data['joints'] is not None and len(left_arm_data['joints']) > 0:
-                    log_timeseries_data("robot/left_arm/joints", left_arm_data['joints'], frame_idx, "joint")
-                if left_arm_data['gripper'] is not None and len(left_arm_data['gripper']) > 0:
-                    log_timeseries_data("robot/left_arm/gripper", left_arm_data['gripper'], frame_idx, "gripper")
-                if left_arm_data['eefort'] is not None and len(left_arm_data['eefort']) > 0:
-                    log_timeseries_data("robot/left_arm/eefort", left_arm_data['eefort'], frame_idx, "force")
-                
-                # 右臂数据 - 只在数据存在时记录
-                if right_arm_data['joints'] is not None and len(right_arm_data['joints']) > 0:
-                    log_timeseries_data("robot/right_arm/joints", right_arm_data['joints'], frame_idx, "joint")
-                if right_arm_data['gripper'] is not None and len(right_arm_data['gripper']) > 0:
-                    log_timeseries_data("robot/right_arm/gripper", right_arm_data['gripper'], frame_idx, "gripper")
-                if right_arm_data['eefort'] is not None and len(right_arm_data['eefort']) > 0:
-                    log_timeseries_data("robot/right_arm/eefort", right_arm_data['eefort'], frame_idx, "force")
+            # 数值数据整列写入，每个 entity 一次 send_columns
+            for arm_name, arm_data in (("left_arm", left_arm_data), ("right_arm", right_arm_data)):
+                log_timeseries_columns(f"robot/{arm_name}/joints", arm_data['joints'], "joint")
+                log_timeseries_columns(f"robot/{arm_name}/gripper", arm_data['gripper'], "gripper")
+                log_timeseries_columns(f"robot/{arm_name}/eefort", arm_data['eefort'], "force")
+            
+            with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+                streams = {}
+                # 相机图像 - 在线程池中提前解码
+                for camera_name, cam_dataset in camera_data.items():
+                    streams[f"cameras/{camera_name}"] = BlockPrefetcher(cam_dataset, pool, image_transform(dataset_value_range(cam_dataset), reverse_channels=True))
                 
-                # 相机图像 - 只在有相机数据时记录
-                if camera_data:
-                    for camera_name, cam_dataset in camera_data.items():
-                        if frame_idx < len(cam_dataset):
-                            image = extract_images_from_dataset(cam_dataset, frame_idx)
-                            if image is not None:
-                                # 确保图像格式正确
-                                if image.dtype != np.uint8:
-                                    if image.max() > 0:
-                                        image = (image - image.min()) / (image.max() - image.min()) * 255
-                                    image = image.astype(np.uint8)
-                                
-                                # Rerun期望RGB格式
-                                if len(image.shape) == 2:
-                                    image = np.stack([image, image, image], axis=-1)
-                                elif len(image.shape) == 3 and image.shape[2] == 4:
-                                    image = image[:, :, :3]
-                                rr.log(f"cameras/{camera_name}", rr.Image(image[:,:,::-1]))
+                # 触觉数据 - 图像格式用热力图显示，其余整列作为时间序列
+                if tactile_data and verbose:
+                    debug_print("VISUALIZE", f"开始记录 {len(tactile_data)} 个触觉数据集", "DEBUG")
+                for tactile_name, tactile_dataset in tactile_data.items():
+                    if is_tactile_image_data(tactile_dataset):
+                        streams[f"tactile/{tactile_name}"] = BlockPrefetcher(tactile_dataset, pool, tactile_transform(dataset_value_range(tactile_dataset)))
+                    else:
+                        log_timeseries_columns(f"tactile/{tactile_name}", tactile_dataset[:])
                 
-                # 触觉数据 - 只在有触觉数据时记录
-                if tactile_data:
-                    # 在第一帧时记录调试信息
-                    if frame_idx == 0 and verbose:
-                        debug_print("VISUALIZE", f"开始记录 {len(tactile_data)} 个触觉数据集", "DEBUG")
-                    
-                    for tactile_name, tactile_dataset in tactile_data.items():
-                        if frame_idx < len(tactile_dataset):
-                            # 检测是否为触觉图像数据
-                            if is_tactile_image_data(tactile_dataset, frame_idx):
-                                tactile_frame = tactile_dataset[frame_idx]
-                                # 应用热力图颜色映射
-                                tactile_colored = apply_tactile_colormap(tactile_frame)
-                                rr.log(f"tactile/{tactile_name}_heatmap", rr.Image(tactile_colored))
-                                # 同时记录原始数据的张量表示
-                                rr.log(f"tactile/{tactile_name}_raw", rr.Tensor(tactile_frame))
-                            else:
-                                # 非图像格式的触觉数据，使用时间序列显示
-                                log_timeseries_data(f"tactile/{tactile_name}", tactile_dataset, frame_idx)
+                log_prefetched_streams(streams, max_frames, verbose)
         
         elif data_format == 'openpi':
             robot_data, camera_data, max_frames = visualize_openpi_format(f, verbose)
@@ -642,33 +773,17 @@ def visualize_hdf5_with_rerun(hdf5_path, verbose=False):
             
             # 记录OpenPI格式数据
             debug_print("VISUALIZE", "正在记录数据到Rerun...", "INFO")
-            for frame_idx in tqdm(range(max_frames), desc="记录帧数据", disable=not verbose):
-                rr.set_time("frame", sequence=frame_idx)
-                
-                # 机器人数据 - 只在有数据时记录
-                if robot_data:
-                    for data_name, data_array in robot_data.items():
-                        if data_array is not None and len(data_array) > 0:
-                            log_timeseries_data(f"robot/{data_name}", data_array, frame_idx, "dim")
-                
-                # 相机图像 - 只在有相机数据时记录
-                if camera_data:
-                    for camera_name, cam_dataset in camera_data.items():
-                        if frame_idx < len(cam_dataset):
-                            image = extract_images_from_dataset(cam_dataset, frame_idx)
-                            if image is not None:
-                                # 确保图像格式正确
-                                if image.dtype != np.uint8:
-                                    if image.max() > 0:
-                                        image = (image - image.min()) / (image.max() - image.min()) * 255
-                                    image = image.astype(np.uint8)
-                                
-                                if len(image.shape) == 2:
-                                    image = np.stack([image, image, image], axis=-1)
-                                elif len(image.shape) == 3 and image.shape[2] == 4:
-                                    image = image[:, :, :3]
-                                
-                                rr.log(f"cameras/{camera_name}", rr.Image(image))
+            # 机器人数据 - 整列写入
+            for data_name, data_array in robot_data.items():
+                log_timeseries_columns(f"robot/{data_name}", data_array, "dim")
+            
+            # 相机图像 - 在线程池中提前解码
+            with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+                streams = {
+                    f"cameras/{camera_name}": BlockPrefetcher(cam_dataset, pool, image_transform(dataset_value_range(cam_dataset)))
+                    for camera_name, cam_dataset in camera_data.items()
+                }
+                log_prefetched_streams(streams, max_frames, verbose)
         
         else:  # custom format
             datasets, images, tactile_images, max_frames = visualize_custom_format(f, verbose)
@@ -703,56 +818,24 @@ def visualize_hdf5_with_rerun(hdf5_path, verbose=False):
                 debug_print("VISUALIZE", f"  - 普通图像: {len(images) if images else 0}", "DEBUG")
                 debug_print("VISUALIZE", f"  - 触觉图像: {len(tactile_images) if tactile_images else 0}", "DEBUG")
             
-            for frame_idx in tqdm(range(max_frames), desc="记录帧数据", disable=not verbose):
-                rr.set_time("frame", sequence=frame_idx)
-                
-                # 数值数据 - 只在有数据时记录
-                if datasets:
-                    for data_name, data_array in datasets.items():
-                        if data_array is not None and len(data_array) > 0:
-                            log_timeseries_data(f"data/{data_name}", data_array, frame_idx, "value")
+            # 数值数据 - 整列写入
+            for data_name, data_array in datasets.items():
+                log_timeseries_columns(f"data/{data_name}", data_array, "value")
+            
+            with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+                # 普通图像数据
+                streams = {
+                    f"images/{img_name}": BlockPrefetcher(img_dataset, pool, image_transform(dataset_value_range(img_dataset)))
+                    for img_name, img_dataset in images.items()
+                }
                 
-                # 普通图像数据 - 只在有图像数据时记录
-                if images:
-                    for img_name, img_dataset in images.items():
-                        if frame_idx < len(img_dataset):
-                            image = extract_images_from_dataset(img_dataset, frame_idx)
-                            if image is not None:
-                                # 确保图像格式正确
-                                if image.dtype != np.uint8:
-                                    if image.max() > 0:
-                                        image = (image - image.min()) / (image.max() - image.min()) * 255
-                                    image = image.astype(np.uint8)
-                                
-                                if len(image.shape) == 2:
-                                    image = np.stack([image, image, image], axis=-1)
-                                elif len(image.shape) == 3 and image.shape[2] == 4:
-                                    image = image[:, :, :3] 
-                                rr.log(f"images/{img_name}", rr.Image(image))
+                # 触觉图像数据（2D 用热力图显示，彩色图像直接显示）
+                if tactile_images and verbose:
+                    debug_print("VISUALIZE", f"开始记录 {len(tactile_images)} 个触觉图像数据集", "DEBUG")
+                for tactile_name, tactile_dataset in tactile_images.items():
+                    streams[f"tactile/{tactile_name}"] = BlockPrefetcher(tactile_dataset, pool, tactile_transform(dataset_value_range(tactile_dataset), decode=True))
                 
-                # 触觉图像数据（用热力图显示） - 只在有触觉数据时记录
-                if tactile_images:
-                    # 在第一帧时记录调试信息
-                    if frame_idx == 0 and verbose:
-                        debug_print("VISUALIZE", f"开始记录 {len(tactile_images)} 个触觉图像数据集", "DEBUG")
-                    
-                    for tactile_name, tactile_dataset in tactile_images.items():
-                        if frame_idx < len(tactile_dataset):
-                            tactile_frame = extract_images_from_dataset(tactile_dataset, frame_idx)
-                            if tactile_frame is not None:
-                                # 如果是2D数据，应用热力图
-                                if len(tactile_frame.shape) == 2:
-                                    tactile_colored = apply_tactile_colormap(tactile_frame)
-                                    rr.log(f"tactile/{tactile_name}_heatmap", rr.Image(tactile_colored))
-                                    # 同时记录原始数据
-                                    rr.log(f"tactile/{tactile_name}_raw", rr.Tensor(tactile_frame))
-                                else:
-                                    # 如果已经是彩色图像，直接显示
-                                    if tactile_frame.dtype != np.uint8:
-                                        if tactile_frame.max() > 0:
-                                            tactile_frame = (tactile_frame - tactile_frame.min()) / (tactile_frame.max() - tactile_frame.min()) * 255
-                                        tactile_frame = tactile_frame.astype(np.uint8)
-                                    rr.log(f"tactile/{tactile_name}", rr.Image(tactile_frame))
+                log_prefetched_streams(streams, max_frames, verbose)
         
         if verbose:
             debug_print("VISUALIZE", f"完成记录 {max_frames} 帧数据", "INFO")
@@ -770,12 +853,15 @@ def visualize_folder_with_rerun(folder_path, verbose=False):
         debug_print("FOLDER", f"文件夹不存在: {folder_path}", "ERROR")
         return
     
-    # 递归查找所有HDF5文件
+    # 数据目录下有 manifest.jsonl 时直接读取, 否则递归查找所有HDF5文件
     hdf5_files = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith('.hdf5') or file.endswith('.h5'):
-                hdf5_files.append(os.path.join(root, file))
+    if list_episode_files is not None:
+        hdf5_files = list_episode_files(folder_path, recursive=True)
+    else:
+        for root, dirs, files in os.walk(folder_path):
+            for file in files:
+                if file.endswith('.hdf5') or file.endswith('.h5'):
+                    hdf5_files.append(os.path.join(root, file))
     
     if not hdf5_files:
         debug_print("FOLDER", f"在文件夹 {folder_path} 中未找到HDF5文件", "ERROR")
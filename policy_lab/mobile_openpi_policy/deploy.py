@@ -7,11 +7,11 @@ def get_model(deploy_cfg):
 
 def eval_one_episode(TASK_ENV, model_client):
     instruction = TASK_ENV.get_instruction()
-    model_client.call(func_name="set_language", obs=instruction)
+    model_client.call(func_name="set_language", obs=instruction, idempotent=True)
 
     while not TASK_ENV.is_episode_end(): # Check whether the episode ends
         obs = TASK_ENV.get_obs() # Get Observation
-        model_client.call(func_name="update_obs", obs=obs)  # Update Observation, `update_obs` here can be modified
+        model_client.call(func_name="update_obs", obs=obs, idempotent=True)  # Update Observation, `update_obs` here can be modified
         actions = model_client.call(func_name="get_action") # Get Action according to observation chunk
         
         for action_idx, action in enumerate(actions):
@@ -19,4 +19,4 @@ def eval_one_episode(TASK_ENV, model_client):
             
             if action_idx != len(actions) - 1:
                 obs = TASK_ENV.get_obs() # Get Observation
-                model_client.call(func_name="update_obs", obs=obs)
\ No newline at end of file
+                model_client.call(func_name="update_obs", obs=obs, idempotent=True)
\ No newline at end of file
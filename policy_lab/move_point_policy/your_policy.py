@@ -1,5 +1,6 @@
 import numpy as np
 from robot.utils.base.data_handler import debug_print
+from robot.utils.base.action_chunk import ActionChunk, DUAL_ARM_LAYOUT
 import numpy as np
 
 STATE_POINTS = [
@@ -66,23 +67,7 @@ class Your_Policy:
         
         actions = self.model.infer()
 
-        ret_actions = []
-        for action in actions:
-            ret_action = {
-                "arm": {
-                    "left_arm": {
-                        "joint": action[:6],
-                        "gripper": action[6],
-                    },
-                    "right_arm": {
-                        "joint": action[7:13],
-                        "gripper": action[13],
-                    }
-                }
-            }
-            ret_actions.append(ret_action)
-
-        return ret_actions
+        return ActionChunk(actions, DUAL_ARM_LAYOUT)
 
     def set_language(self, instruction):
         # Set the language instruction for the model here
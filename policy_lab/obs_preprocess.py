@@ -0,0 +1,81 @@
+"""
+Shared observation preprocessing for policy_lab policies.
+ImageDecoder decodes the JPEG streams of all cameras in parallel straight into
+preallocated, contiguous CHW uint8 buffers and keeps a small per-camera cache keyed
+by a content hash, so frames repeated between update_obs and get_action (or by a
+static camera) are decoded once.
+"""
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def content_key(data):
+    if isinstance(data, np.ndarray):
+        data = data.data if data.flags.c_contiguous else data.tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ImageDecoder:
+    '''
+    输入:
+    cameras: 相机名称列表, List[str]
+    cache_size: 每个相机缓存的已解码帧数, 同时也是缓冲区个数, int
+    num_workers: 解码线程数 (cv2.imdecode 会释放 GIL), None 表示与相机数相同, int
+    返回的 CHW 数组属于缓存, 在该相机再解码 cache_size 个不同的帧之前保持有效
+    '''
+    def __init__(self, cameras, cache_size=4, num_workers=None):
+        self.cameras = list(cameras)
+        self.cache_size = max(2, int(cache_size))
+        self.caches = {name: OrderedDict() for name in self.cameras}
+        self.hits = 0
+        self.misses = 0
+        self.executor = ThreadPoolExecutor(max_workers=num_workers or len(self.cameras),
+                                           thread_name_prefix="obs-decode")
+
+    def _take_buffer(self, name, shape):
+        '''
+        缓存未满时新分配, 否则复用最久未使用的缓存项的缓冲区
+        '''
+        cache = self.caches[name]
+        if len(cache) < self.cache_size:
+            return np.empty(shape, dtype=np.uint8)
+        _, buffer = cache.popitem(last=False)
+        return buffer if buffer.shape == shape else np.empty(shape, dtype=np.uint8)
+
+    def _decode_one(self, name, data):
+        key = content_key(data)
+        cache = self.caches[name]
+        if key in cache:
+            cache.move_to_end(key)
+            self.hits += 1
+            return cache[key]
+
+        if isinstance(data, np.ndarray) and data.ndim == 3:
+            image = data   # 客户端已按 obs spec 发送原始 HWC 图像
+        else:
+            jpeg_bytes = bytes(data).rstrip(b"\0") if not isinstance(data, np.ndarray) \
+                else data.tobytes().rstrip(b"\0")
+            image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"can not decode image of {name}")
+
+        height, width, channels = image.shape
+        buffer = self._take_buffer(name, (channels, height, width))
+        np.copyto(buffer, image.transpose(2, 0, 1))
+        cache[key] = buffer
+        self.misses += 1
+        return buffer
+
+    def decode(self, images):
+        '''
+        images: {camera: JPEG bytes 或 HWC 数组}, 返回 {camera: (C, H, W) uint8}
+        '''
+        futures = {name: self.executor.submit(self._decode_one, name, data) for name, data in images.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def infer_batch(policy, observations):
+    '''
+    openpi Policy.infer 每次只处理一个样本; 这里按 Policy.infer 的步骤逐条做输入变换,
+    堆叠后只调用一次 _sample_actions, 再逐条做输出变换
+    输入:
+    policy: openpi 的 Policy, create_trained_policy 的返回值
+    observations: Policy.infer 接受的观测 dict 列表, List[Dict]
+    返回每条观测的 actions, List[np.ndarray]
+    缺少这些内部接口 (或 PyTorch 模型) 时退回逐条 infer
+    '''
+    required = ("_input_transform", "_output_transform", "_sample_actions", "_rng")
+    if (len(observations) == 1 or not all(hasattr(policy, name) for name in required)
+            or getattr(policy, "_is_pytorch_model", False)):
+        return [policy.infer(obs)["actions"] for obs in observations]
+
+    import jax
+    import jax.numpy as jnp
+    from openpi.models import model as _model
+
+    inputs = [policy._input_transform(jax.tree.map(lambda x: x, obs)) for obs in observations]
+    batch = jax.tree.map(lambda *xs: jnp.stack([jnp.asarray(x) for x in xs]), *inputs)
+
+    policy._rng, sample_rng = jax.random.split(policy._rng)
+    actions = policy._sample_actions(
+        sample_rng, _model.Observation.from_dict(batch), **getattr(policy, "_sample_kwargs", {})
+    )
+    actions = np.asarray(actions)
+
+    results = []
+    for i, sample in enumerate(inputs):
+        outputs = policy._output_transform({"state": np.asarray(sample["state"]), "actions": actions[i]})
+        results.append(outputs["actions"])
+    return results
@@ -1,13 +1,20 @@
 import numpy as np
 import os
 from robot.utils.base.data_handler import debug_print, dict_to_list, hdf5_groups_to_dict
+from robot.utils.base.action_chunk import ActionChunk, DUAL_ARM_LAYOUT
 import numpy as np
 import cv2
 
 from openpi.policies import policy_config as _policy_config
 from openpi.training import config as _config
 
+from policy_lab.openpi_batch import infer_batch
+from policy_lab.obs_preprocess import ImageDecoder
+
 class PI_DUAL:
+    # 这些方法的状态按 client_id 分开保存, ModelServer 调用时传入 client_id, 多台机器人可以共用 (并合批) 一个模型
+    client_state_methods = ("set_language", "update_obs", "get_action", "reset")
+
     def __init__(self, deploy_cfg):
         train_config_name = deploy_cfg.get("train_config_name")
 
@@ -17,13 +24,39 @@ class PI_DUAL:
         self.policy = _policy_config.create_trained_policy(config, deploy_cfg['model_path'])
         print("loading model success!")
 
-        self.observation_window = None
-        self.instruction = None
+        # client_id -> {"instruction", "observation_window"}; 本地部署时 client_id 为 None
+        self.sessions = {}
+        # 模型输入尺寸 [W, H], 设置后客户端先把图像缩小到该尺寸内再发送
+        self.obs_image_size = deploy_cfg.get("obs_image_size")
+        self.max_batch_size = deploy_cfg.get("max_batch_size", 1)
+        # 合批时一批内同一相机的帧都要保留在缓存中
+        self.image_decoder = ImageDecoder(
+            ["cam_high", "cam_left_wrist", "cam_right_wrist"],
+            cache_size=max(4, 2 * self.max_batch_size),
+        )
+
+    def get_obs_spec(self):
+        camera = {"max_size": self.obs_image_size, "format": "jpeg", "quality": 95}
+        return {
+            "state": {
+                "left_arm": ["joint", "gripper"],
+                "right_arm": ["joint", "gripper"]
+            },
+            "cameras": {name: camera for name in ["cam_head", "cam_left_wrist", "cam_right_wrist"]},
+        }
+
+    def _session(self, client_id):
+        return self.sessions.setdefault(client_id, {"instruction": None, "observation_window": None})
+
+    def set_language(self, instruction, client_id=None):
+        self._session(client_id)["instruction"] = instruction
 
-    def set_language(self, instruction):
-        self.instruction = instruction
+    def update_obs(self, obs, client_id=None):
+        session = self._session(client_id)
+        session["observation_window"] = self.build_observation(obs, session["instruction"])
+        return session["observation_window"]
 
-    def update_obs(self, obs):
+    def build_observation(self, obs, instruction):
         state = np.concatenate([
             np.array(obs[0]["left_arm"]["joint"]).reshape(-1),
             np.array(obs[0]["left_arm"]["gripper"]).reshape(-1),
@@ -31,55 +64,46 @@ class PI_DUAL:
             np.array(obs[0]["right_arm"]["gripper"]).reshape(-1)
         ])
 
-        def decode(img):
-            jpeg_bytes = np.array(img).tobytes().rstrip(b"\0")
-            nparr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
-            return cv2.imdecode(nparr, 1)
+        images = self.image_decoder.decode({
+            "cam_high": obs[1]["cam_head"]["color"],
+            "cam_left_wrist": obs[1]["cam_left_wrist"]["color"],
+            "cam_right_wrist": obs[1]["cam_right_wrist"]["color"],
+        })
 
-        img_front = decode(obs[1]["cam_head"]["color"])
-        img_right = decode(obs[1]["cam_right_wrist"]["color"])
-        img_left = decode(obs[1]["cam_left_wrist"]["color"])
-        
-        img_front = np.transpose(img_front, (2, 0, 1))
-        img_right = np.transpose(img_right, (2, 0, 1))
-        img_left = np.transpose(img_left, (2, 0, 1))
-
-        self.observation_window = {
+        return {
             "state": state,
-            "images": {
-                "cam_high": img_front,
-                "cam_left_wrist": img_left,
-                "cam_right_wrist": img_right,
-            },
-            "prompt": self.instruction,
+            "images": images,
+            "prompt": instruction,
         }
     
-    def get_action(self, obs=None):
+    def get_action(self, obs=None, client_id=None):
         if obs is not None:
-            self.update_obs(obs)
-        
-        ret_actions = []
-
-        actions = self.policy.infer(self.observation_window)["actions"]
-        for action in actions:
-            ret_action = {
-                "arm": {
-                    "left_arm": {
-                        "joint": action[:6],
-                        "gripper": action[6],
-                    },
-                    "right_arm": {
-                        "joint": action[7:13],
-                        "gripper": action[13],
-                    }
-                }
-            }
-            ret_actions.append(ret_action)
-
-        return ret_actions
-
-    def reset(self):
+            self.update_obs(obs, client_id)
+
+        actions = self.policy.infer(self._session(client_id)["observation_window"])["actions"]
+        return ActionChunk(np.asarray(actions)[:, :DUAL_ARM_LAYOUT.dim], DUAL_ARM_LAYOUT)
+
+    def get_action_batch(self, obs_list, client_ids=None):
+        # ModelServer 合批时调用: 多个机器人的观测只做一次前向
+        # 每条观测使用各自客户端的 instruction
+        client_ids = client_ids if client_ids is not None else [None] * len(obs_list)
+        windows = [self.update_obs(obs, client_id) for obs, client_id in zip(obs_list, client_ids)]
+        return [
+            ActionChunk(np.asarray(actions)[:, :DUAL_ARM_LAYOUT.dim], DUAL_ARM_LAYOUT)
+            for actions in infer_batch(self.policy, windows)
+        ]
+
+    def warmup(self, sample_obs):
+        '''
+        服务端就绪前调用: 触发 JIT 编译, 合批时每个批大小的输入形状各编译一次
+        '''
+        self.set_language("warmup")
+        self.get_action(sample_obs)
+        for batch_size in range(2, self.max_batch_size + 1):
+            self.get_action_batch([sample_obs] * batch_size)
+        self.reset()
+
+    def reset(self, client_id=None):
         # Reset the observation cache or window here
-        self.observation_window = None
-        self.instruction = None
+        self.sessions.pop(client_id, None)
         print("successfully reset observation_window and instruction")
\ No newline at end of file
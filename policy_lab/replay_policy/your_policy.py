@@ -1,7 +1,12 @@
 import numpy as np
 import os
-from robot.utils.base.data_handler import debug_print, dict_to_list, hdf5_groups_to_dict
-import numpy as np
+from robot.utils.base.data_handler import debug_print
+from robot.utils.base.action_chunk import ActionChunk, DUAL_ARM_LAYOUT
+
+# (group, item) 按顺序拼接为 14 维状态
+STATE_COLUMNS = [("left_arm", "joint"), ("left_arm", "gripper"), ("right_arm", "joint"), ("right_arm", "gripper")]
+BASE_STATE = np.array([0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1], dtype=np.float32)
+TRAJECTORY_SUFFIX = ".replay_v1.npy"
 
 def state_transform(data):
     state = np.concatenate([
@@ -12,52 +17,60 @@ def state_transform(data):
     ])
     return state
 
+def trajectory_cache_path(hdf5_path):
+    return os.path.splitext(hdf5_path)[0] + TRAJECTORY_SUFFIX
+
+def interpolate(start, end, num):
+    """线性插值，不包含终点"""
+    return np.linspace(start, end, num=num, endpoint=False, dtype=np.float32)
+
+def build_trajectory(hdf5_path):
+    '''
+    只读取关节和夹爪列 (不解码相机), 返回 float32 的 (T, 14) 回放轨迹:
+    base → first, episode, last → base
+    '''
+    import h5py
+
+    with h5py.File(hdf5_path, "r") as f:
+        columns = [np.asarray(f[group][item][()], dtype=np.float32) for group, item in STATE_COLUMNS]
+    length = min(len(column) for column in columns)
+    states = np.concatenate([column[:length].reshape(length, -1) for column in columns], axis=1)
+
+    return np.concatenate([
+        interpolate(BASE_STATE, states[0], 10),
+        states,
+        interpolate(states[-1], BASE_STATE, 30),
+    ])
+
+def load_trajectory(hdf5_path, rebuild=False):
+    '''
+    读取 episode 旁边缓存的轨迹 (memmap), 缓存不存在或比 episode 旧时重新生成
+    '''
+    cache_path = trajectory_cache_path(hdf5_path)
+    if (rebuild or not os.path.exists(cache_path)
+            or os.path.getmtime(cache_path) < os.path.getmtime(hdf5_path)):
+        tmp_path = f"{cache_path}.tmp.{os.getpid()}.npy"
+        np.save(tmp_path, build_trajectory(hdf5_path))
+        os.replace(tmp_path, cache_path)
+        debug_print("REPLAY", f"build trajectory cache {cache_path}", "INFO")
+    return np.load(cache_path, mmap_mode="r")
+
 class REPLAY:
     def __init__(self, hdf5_path, chunk_size=500):
-        self.raw_episode = dict_to_list(hdf5_groups_to_dict(hdf5_path))
         self.chunk_size = chunk_size
         self.ptr = 0
-        self.episode = self._get_full_actions()
-
-    def _interpolate(self, start, end, num):
-        """线性插值，不包含终点"""
-        return np.linspace(start, end, num=num, endpoint=False)
-
-    def _get_full_actions(self):
-        base_state = np.array(
-            [0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1],
-            dtype=np.float32
-        )
-
-        start_state = state_transform(self.raw_episode[0])
-        end_state = state_transform(self.raw_episode[-1])
-
-        actions = []
-
-        # base → first
-        actions.extend(self._interpolate(base_state, start_state, 10))
-
-        # episode
-        for ep in self.raw_episode:
-            actions.append(state_transform(ep))
-
-        # last → base
-        actions.extend(self._interpolate(end_state, base_state, 30))
-
-        return np.asarray(actions)   # (T, 14)
+        self.episode = load_trajectory(hdf5_path)   # (T, 14) memmap
 
     def infer(self):
-        action_chunk = []
-
-        for _ in range(self.chunk_size):
-            action = self.episode[self.ptr]
-            action_chunk.append(action)
-
-            self.ptr += 1
-            if self.ptr >= len(self.episode):
-                self.ptr = 0  # 循环
+        length = len(self.episode)
+        start = self.ptr
+        self.ptr = (start + self.chunk_size) % length  # 循环
 
-        return np.asarray(action_chunk)
+        # 转为普通 ndarray 视图, 不复制也不会以 memmap 类型被序列化
+        episode = np.asarray(self.episode)
+        if start + self.chunk_size <= length:
+            return episode[start:start + self.chunk_size]
+        return np.take(episode, np.arange(start, start + self.chunk_size) % length, axis=0)
 
     def reset(self):
         self.ptr = 0
@@ -77,23 +90,7 @@ class Your_Policy:
         
         actions = self.model.infer()
 
-        ret_actions = []
-        for action in actions:
-            ret_action = {
-                "arm": {
-                    "left_arm": {
-                        "joint": action[:6],
-                        "gripper": action[6],
-                    },
-                    "right_arm": {
-                        "joint": action[7:13],
-                        "gripper": action[13],
-                    }
-                }
-            }
-            ret_actions.append(ret_action)
-
-        return ret_actions
+        return ActionChunk(actions, DUAL_ARM_LAYOUT)
 
     def set_language(self, instruction):
         # Set the language instruction for the model here
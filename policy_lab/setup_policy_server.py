@@ -4,7 +4,10 @@ import time
 import yaml
 import importlib
 import argparse
+import traceback
 from client_server.model_server import ModelServer
+from client_server.async_model_server import AsyncModelServer
+from policy_lab.warmup import warmup_model
 
 def eval_function_decorator(policy_name, model_name):
     """Load a specified function (e.g., get_model) from a policy module"""
@@ -22,10 +25,31 @@ def main(deploy_cfg):
     model = get_model(deploy_cfg)
 
     # Start server in background thread
-    server = ModelServer(model, port=port)
+    # max_batch_size > 1 时多个客户端的 get_action 合批推理 (例如一个模型服务多台 X-One)
+    # async_server: 使用带请求 id 的 asyncio 服务端, 一个连接上可同时处理多个请求
+    server_cls = AsyncModelServer if deploy_cfg.get("async_server", False) else ModelServer
+    server = server_cls(
+        model,
+        port=port,
+        max_batch_size=deploy_cfg.get("max_batch_size", 1),
+        batch_wait_ms=deploy_cfg.get("batch_wait_ms", 5.0),
+    )
+    # 先开始监听, 客户端连接后通过 READY_CMD 等待预热完成再开始 episode
+    server.status = {"ready": False, "stage": "warmup"}
     thread = threading.Thread(target=server.start, daemon=True)
     thread.start()
 
+    try:
+        with server.model_lock:
+            elapsed = warmup_model(model, deploy_cfg)
+        server.status = {"ready": True, "warmup_s": elapsed}
+        if elapsed is not None:
+            print(f"🔥 Warmup finished in {elapsed:.2f}s")
+    except Exception as e:
+        # 预热失败不阻止服务, 错误随就绪状态返回给客户端
+        traceback.print_exc()
+        server.status = {"ready": True, "warmup_error": str(e)}
+
     # Keep main thread alive until KeyboardInterrupt
     try:
         while True:
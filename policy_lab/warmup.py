@@ -0,0 +1,87 @@
+"""
+Policy warm-up before the server reports ready.
+get_model implementations may provide warmup(sample_obs); it is called once with a
+synthetic observation shaped like what DeployEnv sends (built from the robot config
+and shrunk by the policy's obs spec), so JIT compilation, cuDNN autotune and lazy
+weight loading happen before the first real get_action.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+from robot.utils.base.load_file import load_yaml
+from robot.config._GLOBAL_CONFIG import CONFIG_DIR
+from client_server.obs_spec import ObservationSpec
+
+# 与相机驱动默认输出一致
+DEFAULT_IMAGE_SIZE = (640, 480)
+
+
+def build_sample_obs(base_cfg, image_size=DEFAULT_IMAGE_SIZE, seed=0):
+    '''
+    根据机器人配置构造一帧 [controller_data, sensor_data]:
+    init_qpos 中的 <side>_arm / <side>_gripper -> {"<side>_arm": {"joint", "gripper"}}
+    CAMERA_SERIALS 中的相机 -> {"cam_<name>": {"color": JPEG bytes}}, 内容为随机噪声
+    配置了 SLAMWARE 时加上 {"slamware": {"move_velocity"}}
+    '''
+    robot_cfg = base_cfg.get("robot", {})
+    init_qpos = robot_cfg.get("init_qpos", {})
+    timestamp = time.monotonic_ns()
+
+    controller_data = {}
+    for key, joints in init_qpos.items():
+        if not key.endswith("_arm"):
+            continue
+        gripper = init_qpos.get(key[:-len("_arm")] + "_gripper", 0.0)
+        controller_data[key] = {
+            "joint": np.asarray(joints, dtype=np.float64),
+            "gripper": np.asarray([gripper], dtype=np.float64),
+            "timestamp": timestamp,
+        }
+    if "SLAMWARE" in robot_cfg:
+        controller_data["slamware"] = {"move_velocity": np.zeros(3), "timestamp": timestamp}
+
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    sensor_data = {}
+    for name in robot_cfg.get("CAMERA_SERIALS", {}):
+        image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        _, encoded = cv2.imencode(".jpg", image)
+        sensor_data[f"cam_{name}"] = {"color": encoded.tobytes(), "timestamp": timestamp}
+    return [controller_data, sensor_data]
+
+
+def load_base_cfg(deploy_cfg):
+    '''
+    deploy_cfg["base_cfg"] 是 config/ 下的配置名 (eval.sh 通过 --overrides 传入), 也可以是文件路径
+    '''
+    name = deploy_cfg.get("base_cfg")
+    if not name:
+        return None
+    path = name if os.path.isfile(name) else os.path.join(CONFIG_DIR, f"{name}.yml")
+    return load_yaml(path) if os.path.isfile(path) else None
+
+
+def warmup_model(model, deploy_cfg):
+    '''
+    model 没有 warmup 方法或找不到机器人配置时跳过; 返回耗时 (秒), 跳过时返回 None
+    '''
+    warmup = getattr(model, "warmup", None)
+    if not callable(warmup):
+        return None
+    base_cfg = load_base_cfg(deploy_cfg)
+    if base_cfg is None:
+        print(f"⚠️ Skip warmup: robot config '{deploy_cfg.get('base_cfg')}' not found")
+        return None
+
+    sample_obs = build_sample_obs(base_cfg)
+    spec = model.get_obs_spec() if callable(getattr(model, "get_obs_spec", None)) else None
+    if spec:
+        # 与客户端按 obs spec 缩小后发送的观测保持相同的尺寸/格式
+        sample_obs = ObservationSpec(**spec).apply(sample_obs)
+
+    start = time.monotonic()
+    warmup(sample_obs)
+    return time.monotonic() - start
@@ -17,7 +17,11 @@ import cv2
 import os
 import glob
 import json
+import time
+import threading
 from datetime import datetime
+
+from robot.utils.base.data_handler import debug_print
 # os.environ['QT_QPA_PLATFORM_PLUGIN_PATH'] = '/usr/lib/x86_64-linux-gnu/qt5/plugins/platforms'
 os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = "/home/xspark-ai/miniconda3/envs/Xone/lib/qt5/plugins/platforms"
 
@@ -41,6 +45,92 @@ class RestWorker(QtCore.QThread):
         
         self.finished.emit()
 
+PREVIEW_CAMERAS = ["cam_head", "cam_left_wrist", "cam_right_wrist"]
+
+# JPEG 在 DCT 域直接缩小解码, 比全分辨率解码后再缩放快得多
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def decode_preview(data, scale=2):
+    """解码一帧预览图像, 并转置为 pyqtgraph ImageView 使用的 (W, H, C)"""
+    # If already a numpy array, subsample directly (TEST_MODE)
+    if isinstance(data, np.ndarray) and data.ndim == 3:
+        img = data[::scale, ::scale]
+    else:
+        nparr = np.frombuffer(data, dtype=np.uint8)
+        img = cv2.imdecode(nparr, REDUCED_DECODE_FLAGS[scale])
+    if img is None:
+        return None
+    return np.ascontiguousarray(np.transpose(img, (1, 0, 2)))
+
+class PreviewWorker(QtCore.QThread):
+    """
+    在后台线程中按 preview_fps 获取观测并缩小解码, 与采集频率互不影响
+    只保留最新一帧, UI 来不及显示的旧帧直接丢弃
+    同一类异常每 error_interval 秒最多输出一次, 停止时汇总丢帧和异常次数
+    """
+    frame_ready = QtCore.pyqtSignal()
+    error_interval = 5.0
+
+    def __init__(self, robot, fps=15, scale=2):
+        super().__init__()
+        self.robot = robot
+        self.period = 1.0 / max(fps, 1e-3)
+        self.scale = scale if scale in REDUCED_DECODE_FLAGS else 2
+        self.dropped = 0
+        self.errors = {}            # 异常类型 -> 次数
+        self._last_logged = {}      # 异常类型 -> 上次输出时间
+        self._latest = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def run(self):
+        self._running = True
+        next_tick = time.monotonic()
+        while self._running:
+            try:
+                data = self.robot.get_obs()[1]
+                frames = {cam: decode_preview(data[cam]["color"], self.scale) for cam in PREVIEW_CAMERAS}
+                with self._lock:
+                    if self._latest is not None:
+                        self.dropped += 1
+                    self._latest = frames
+                self.frame_ready.emit()
+            except Exception as e:
+                self._log_error(e)
+
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def _log_error(self, e):
+        name = type(e).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+        now = time.monotonic()
+        if now - self._last_logged.get(name, -self.error_interval) >= self.error_interval:
+            self._last_logged[name] = now
+            debug_print("PreviewWorker", f"preview error ({self.errors[name]} x {name}): {e}", "WARNING")
+
+    def take_latest(self):
+        with self._lock:
+            frames, self._latest = self._latest, None
+        return frames
+
+    def stop(self):
+        self._running = False
+        self.wait()
+        debug_print("PreviewWorker", f"preview stopped, dropped {self.dropped} frames, errors: {self.errors}", "INFO")
+        self.dropped = 0
+        self.errors.clear()
+        self._last_logged.clear()
+
 class DataCollectorUI(QtWidgets.QWidget):
     def __init__(self, robot):
         super().__init__()
@@ -214,9 +304,14 @@ class DataCollectorUI(QtWidgets.QWidget):
         self.btn_set_worker.clicked.connect(self.set_worker)
         self.btn_reload_cameras.clicked.connect(self.reload_cameras)
 
-        # Timer
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_views)
+        # Preview: decoded on a worker thread, rate limited independently of save_freq
+        collect_cfg = getattr(getattr(self.robot, "collector", None), "collect_cfg", None) or {}
+        self.preview = PreviewWorker(
+            self.robot,
+            fps=collect_cfg.get("preview_fps", 15),
+            scale=collect_cfg.get("preview_scale", 2),
+        )
+        self.preview.frame_ready.connect(self.update_views)
 
         # Pedal device placeholder
         self.pedal = self.init_pedal()
@@ -391,7 +486,8 @@ class DataCollectorUI(QtWidgets.QWidget):
         self.stop_worker = RestWorker(self.robot, is_save=False)
         self.stop_worker.finished.connect(self.on_start_finished)
         self.stop_worker.start()
-        self.timer.start(33)  # 10 Hz
+        if not self.preview.isRunning():
+            self.preview.start()
 
     def on_start_finished(self):
         self.is_running = True
@@ -534,32 +630,19 @@ class DataCollectorUI(QtWidgets.QWidget):
         self.show_message("Info", "Aborted and Reset!", 2000)
 
     def update_views(self):
-        data = self.robot.get_obs()
-        # if self.is_running:
-        #     self.robot.collect(data)
-
-        self.update_images(data[1])
+        # 多个 frame_ready 排队时, 只有第一个能取到 (最新的) 帧
+        frames = self.preview.take_latest()
+        if frames is None:
+            return
+        self.update_images(frames)
 
     # ------------ UI Update ------------
-    def update_images(self, data):
-        def decode(data):
-            # If already a numpy array, return directly (TEST_MODE)
-            if isinstance(data, np.ndarray):
-                return data
-            jpeg_bytes = data # .tobytes().rstrip(b"\0")
-            nparr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
-            return cv2.imdecode(nparr, 1)
-        cam_head = data["cam_head"]["color"]
-        cam_left_wrist = data["cam_left_wrist"]["color"]
-        cam_right_wrist = data["cam_right_wrist"]["color"]
-        
-        cam_head = decode(cam_head)
-        cam_left_wrist = decode(cam_left_wrist)
-        cam_right_wrist = decode(cam_right_wrist)
-        
-        cam_head = np.transpose(cam_head, (1, 0, 2)) 
-        cam_left_wrist = np.transpose(cam_left_wrist, (1, 0, 2)) 
-        cam_right_wrist = np.transpose(cam_right_wrist, (1, 0, 2)) 
+    def update_images(self, frames):
+        cam_head = frames["cam_head"]
+        cam_left_wrist = frames["cam_left_wrist"]
+        cam_right_wrist = frames["cam_right_wrist"]
+        if cam_head is None or cam_left_wrist is None or cam_right_wrist is None:
+            return
         
         # Head: Manual Range for Zoom (ViewBox)
         self.img_main.setImage(cam_head, autoRange=False)
@@ -581,9 +664,20 @@ class DataCollectorUI(QtWidgets.QWidget):
     
     def reload_cameras(self):
         """Reload camera devices"""
+        # 预览线程会读取相机, 重新加载期间先停止
+        was_running = self.preview.isRunning()
+        if was_running:
+            self.preview.stop()
         self.robot.reload_cameras()
+        if was_running:
+            self.preview.start()
         self.show_message("Info", "Cameras reloaded!", 1000)
 
+    def closeEvent(self, event):
+        if self.preview.isRunning():
+            self.preview.stop()
+        super().closeEvent(event)
+
     def init_pedal(self):
         """
         初始化并返回踏板设备对象。
@@ -7,6 +7,106 @@ import json
 from tqdm import tqdm
 import subprocess
 import sys
+import time
+import argparse
+from contextlib import nullcontext
+from multiprocessing import Pool, BoundedSemaphore, cpu_count
+
+try:
+    from robot.data.manifest import DatasetManifest, list_episode_files
+except ImportError:
+    DatasetManifest = None
+
+# 批量导出时所有进程共享的 ffmpeg 并发上限, 由 _init_export_worker 设置
+_FFMPEG_SLOTS = None
+
+EXPORT_VERSION = 1
+EXPORT_STAMP_NAME = ".export.json"
+EXPORT_INDEX_NAME = "index.json"
+
+
+def prepare_video_frame(frame, filename, is_tactile=False):
+    """
+    将一帧数据转换为 ffmpeg 输入用的 BGR uint8 图像
+    """
+    if is_tactile:
+        # 处理触觉数据
+        # 归一化到0-255范围
+        normalized = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX)
+        # 转换为uint8类型
+        normalized = normalized.astype(np.uint8)
+        # 应用颜色映射
+        colormap = cv2.applyColorMap(normalized, cv2.COLORMAP_VIRIDIS)
+        # 放大图像以便观看 (16x16 -> 256x256)
+        resized = cv2.resize(colormap, (256, 256), interpolation=cv2.INTER_NEAREST)
+        # 添加标题
+        cv2.putText(resized, f"Tactile: {filename}", (10, 30), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        return resized
+
+    # 处理相机数据, JPEG 等编码后的帧解码后已经是 BGR, 直接返回
+    if frame.dtype.kind in ('S', 'O') or frame.ndim == 0:
+        return cv2.imdecode(np.frombuffer(frame.tobytes().rstrip(b"\0"), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame.dtype != np.uint8:
+        # 如果数据不是uint8，进行归一化
+        frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    
+    # 检查是否需要颜色空间转换
+    if len(frame.shape) == 3 and frame.shape[2] == 3:
+        # 未编码的原始数组按RGB格式存储，转换为BGR
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    if len(frame.shape) == 2:
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    return frame
+
+
+def save_with_ffmpeg(frames, filename, output_path, fps=30, is_tactile=False, verbose=False):
+    """
+    使用FFmpeg保存视频（需要系统安装FFmpeg）
+    帧以 rawvideo 的形式直接写入 ffmpeg stdin, 不再生成临时PNG
+    批量导出时同时运行的 ffmpeg 数量受 _FFMPEG_SLOTS 限制
+    """
+    if len(frames) == 0:
+        return None
+
+    first = prepare_video_frame(frames[0], filename, is_tactile)
+    h, w = first.shape[:2]
+    video_path = os.path.join(output_path, f"{filename}.mp4")
+    cmd = [
+            'ffmpeg',
+            '-y',  # 覆盖现有文件
+            '-loglevel', 'error',  # 只显示错误信息
+            '-f', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-s', f'{w}x{h}',
+            '-framerate', str(fps),
+            '-i', '-',
+            '-c:v', 'libx264',
+            '-crf', '23',
+            '-preset', 'medium',
+            '-pix_fmt', 'yuv420p',
+            video_path
+        ]
+
+    with (_FFMPEG_SLOTS if _FFMPEG_SLOTS is not None else nullcontext()):
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        try:
+            for i, frame in enumerate(tqdm(frames, desc=f"Saving {filename} frames", disable=not verbose)):
+                frame = first if i == 0 else prepare_video_frame(frame, filename, is_tactile)
+                proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        ret = proc.wait()
+
+    if ret != 0:
+        if verbose:
+            print(f"FFmpeg error: exit code {ret} for {video_path}")
+        return None
+    if verbose:
+        print(f"Saved video: {video_path}")
+    return video_path
+
 
 def visualize_hdf5(hdf5_path, output_dir="output", verbose=False):
     """
@@ -161,86 +261,17 @@ def visualize_hdf5(hdf5_path, output_dir="output", verbose=False):
             if verbose:
                 print(f"Saved dual-arm data plot: {os.path.join(output_dir, 'dual_arm_data_plot.png')}")
         
-        # 视频保存函数
-        def save_with_ffmpeg(frames, filename, output_path, fps=30, is_tactile=False):
-            """使用FFmpeg保存视频（需要系统安装FFmpeg）"""
-            if len(frames) == 0:
-                return
-                
-            # 创建临时目录存储帧图像
-            temp_dir = os.path.join(output_path, "temp_frames")
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # 保存所有帧为PNG图像
-            for i, frame in enumerate(tqdm(frames, desc=f"Saving {filename} frames", disable=not verbose)):
-                if is_tactile:
-                    # 处理触觉数据
-                    # 归一化到0-255范围
-                    normalized = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX)
-                    # 转换为uint8类型
-                    normalized = normalized.astype(np.uint8)
-                    # 应用颜色映射
-                    colormap = cv2.applyColorMap(normalized, cv2.COLORMAP_VIRIDIS)
-                    # 放大图像以便观看 (16x16 -> 256x256)
-                    resized = cv2.resize(colormap, (256, 256), interpolation=cv2.INTER_NEAREST)
-                    # 添加标题
-                    cv2.putText(resized, f"Tactile: {filename}", (10, 30), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    cv2.imwrite(os.path.join(temp_dir, f"frame_{i:06d}.png"), resized)
-                else:
-                    # 处理相机数据
-                    if frame.dtype != np.uint8:
-                        # 如果数据不是uint8，进行归一化
-                        frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-                    
-                    # 检查是否需要颜色空间转换
-                    if len(frame.shape) == 3 and frame.shape[2] == 3:
-                        # 假设是RGB格式，转换为BGR
-                        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    else:
-                        frame_bgr = frame
-                    
-                    cv2.imwrite(os.path.join(temp_dir, f"frame_{i:06d}.png"), frame_bgr)
-            
-            # 使用FFmpeg创建视频
-            video_path = os.path.join(output_path, f"{filename}.mp4")
-            cmd = [
-                    'ffmpeg',
-                    '-y',  # 覆盖现有文件
-                    '-loglevel', 'error',  # 只显示错误信息
-                    '-framerate', str(fps),
-                    '-i', os.path.join(temp_dir, 'frame_%06d.png'),
-                    '-c:v', 'libx264',
-                    '-crf', '23',
-                    '-preset', 'medium',
-                    '-pix_fmt', 'yuv420p',
-                    video_path
-                ]
-            
-            try:
-                subprocess.run(cmd, check=True)
-                if verbose:
-                    print(f"Saved video: {video_path}")
-            except subprocess.CalledProcessError as e:
-                if verbose:
-                    print(f"FFmpeg error: {e}")
-            finally:
-                # 清理临时文件
-                for file in os.listdir(temp_dir):
-                    os.remove(os.path.join(temp_dir, file))
-                os.rmdir(temp_dir)
-        
         # Save camera videos
         for camera_name, camera_frames in camera_data.items():
             if len(camera_frames) > 0:
-                save_with_ffmpeg(camera_frames, f"{camera_name}_video", camera_dir)
+                save_with_ffmpeg(camera_frames, f"{camera_name}_video", camera_dir, verbose=verbose)
         
         # Save tactile force videos
         for data_type, data in tactile_data.items():
             # 确保数据是16x16矩阵
             if len(data.shape) == 3 and data.shape[1] == 16 and data.shape[2] == 16:
                 os.makedirs(tactile_dir, exist_ok=True)
-                save_with_ffmpeg(data, f"tactile_{data_type}", tactile_dir, fps=30, is_tactile=True)
+                save_with_ffmpeg(data, f"tactile_{data_type}", tactile_dir, fps=30, is_tactile=True, verbose=verbose)
             else:
                 if verbose:
                     print(f"Warning: Unexpected tactile data shape {data.shape} for {data_type}")
@@ -285,11 +316,14 @@ def visualize_folder(folder_path, output_base_dir="output", verbose=False):
         print(f"文件夹不存在: {folder_path}")
         return
     
-    # 查找所有HDF5文件
-    hdf5_files = []
-    for file in os.listdir(folder_path):
-        if file.endswith('.hdf5') or file.endswith('.h5'):
-            hdf5_files.append(os.path.join(folder_path, file))
+    # 查找所有HDF5文件 (有 manifest.jsonl 时直接读取, 不再扫描目录)
+    if DatasetManifest is not None:
+        hdf5_files = list_episode_files(folder_path)
+    else:
+        hdf5_files = []
+        for file in os.listdir(folder_path):
+            if file.endswith('.hdf5') or file.endswith('.h5'):
+                hdf5_files.append(os.path.join(folder_path, file))
     
     if not hdf5_files:
         print(f"在文件夹 {folder_path} 中未找到HDF5文件")
@@ -341,9 +375,144 @@ def visualize_folder(folder_path, output_base_dir="output", verbose=False):
         print(f"输出目录: {output_base_dir}")
         print(f"{'='*60}")
 
+def _init_export_worker(ffmpeg_slots):
+    global _FFMPEG_SLOTS
+    _FFMPEG_SLOTS = ffmpeg_slots
+
+def _source_stamp(hdf5_path):
+    stat = os.stat(hdf5_path)
+    return {
+        'version': EXPORT_VERSION,
+        'source': os.path.abspath(hdf5_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+def _list_outputs(output_dir):
+    outputs = []
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            if name.endswith(('.png', '.mp4')):
+                outputs.append(os.path.relpath(os.path.join(root, name), output_dir))
+    return sorted(outputs)
+
+def is_export_up_to_date(hdf5_path, output_dir):
+    """
+    输出目录中的 .export.json 与源文件的大小/mtime 一致, 且记录的输出文件都存在
+    """
+    stamp_path = os.path.join(output_dir, EXPORT_STAMP_NAME)
+    if not os.path.exists(stamp_path):
+        return None
+    try:
+        with open(stamp_path, 'r') as f:
+            stamp = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if {k: stamp.get(k) for k in ('version', 'source', 'size', 'mtime_ns')} != _source_stamp(hdf5_path):
+        return None
+    if not stamp.get('outputs') or not all(os.path.exists(os.path.join(output_dir, p)) for p in stamp['outputs']):
+        return None
+    return stamp
+
+def export_episode(hdf5_path, output_dir, force=False, verbose=False):
+    """
+    导出单个 episode (曲线图 + 视频), 输出已是最新时跳过
+    返回写入汇总索引的条目
+    """
+    entry = {
+        'episode': os.path.splitext(os.path.basename(hdf5_path))[0],
+        'source': os.path.abspath(hdf5_path),
+        'output_dir': os.path.abspath(output_dir),
+    }
+    if not force:
+        stamp = is_export_up_to_date(hdf5_path, output_dir)
+        if stamp is not None:
+            entry.update(status='skipped', outputs=stamp['outputs'], seconds=0.0)
+            return entry
+
+    start = time.monotonic()
+    try:
+        visualize_hdf5(hdf5_path, output_dir, verbose=verbose)
+        outputs = _list_outputs(output_dir)
+        if not outputs:
+            raise RuntimeError("no output produced (missing config.json or no plottable data)")
+        stamp = _source_stamp(hdf5_path)
+        stamp['outputs'] = outputs
+        with open(os.path.join(output_dir, EXPORT_STAMP_NAME), 'w') as f:
+            json.dump(stamp, f, indent=2)
+        entry.update(status='exported', outputs=outputs)
+    except Exception as e:
+        entry.update(status='failed', error=f"{type(e).__name__}: {e}", outputs=[])
+    entry['seconds'] = round(time.monotonic() - start, 2)
+    return entry
+
+def _export_task(task):
+    return export_episode(*task)
+
+def batch_export(folder_path, output_base_dir="output", num_workers=None, max_ffmpeg=None, force=False, verbose=False):
+    """
+    多进程批量导出文件夹下的所有HDF5文件
+    
+    Parameters:
+        folder_path: 包含HDF5文件的文件夹路径
+        output_base_dir: 输出基础目录, 同时写入汇总索引 index.json
+        num_workers: 进程数, 默认 CPU 核数
+        max_ffmpeg: 所有进程同时运行的 ffmpeg 上限, 默认 CPU 核数
+        force: 忽略已有输出, 全部重新导出
+    
+    Returns:
+        dict: 汇总索引
+    """
+    if not os.path.exists(folder_path):
+        print(f"文件夹不存在: {folder_path}")
+        return None
+
+    if DatasetManifest is not None:
+        hdf5_files = list_episode_files(folder_path)
+    else:
+        hdf5_files = sorted(os.path.join(folder_path, file) for file in os.listdir(folder_path)
+                            if file.endswith('.hdf5') or file.endswith('.h5'))
+    if not hdf5_files:
+        print(f"在文件夹 {folder_path} 中未找到HDF5文件")
+        return None
+
+    os.makedirs(output_base_dir, exist_ok=True)
+    num_workers = max(1, min(num_workers or cpu_count(), len(hdf5_files)))
+    ffmpeg_slots = BoundedSemaphore(max_ffmpeg or cpu_count())
+    tasks = [
+        (hdf5_file, os.path.join(output_base_dir, os.path.splitext(os.path.basename(hdf5_file))[0]), force, verbose)
+        for hdf5_file in hdf5_files
+    ]
+    print(f"找到 {len(hdf5_files)} 个HDF5文件, 使用 {num_workers} 个进程导出")
+
+    start = time.monotonic()
+    entries = []
+    with Pool(num_workers, initializer=_init_export_worker, initargs=(ffmpeg_slots,)) as pool:
+        for entry in tqdm(pool.imap_unordered(_export_task, tasks), total=len(tasks), desc="Exporting HDF5 files", unit="file"):
+            if entry['status'] == 'failed':
+                print(f"✗ 处理文件 {os.path.basename(entry['source'])} 时出错: {entry['error']}")
+            entries.append(entry)
+
+    entries.sort(key=lambda entry: entry['source'])
+    counts = {status: sum(entry['status'] == status for entry in entries) for status in ('exported', 'skipped', 'failed')}
+    index = {
+        'folder': os.path.abspath(folder_path),
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'seconds': round(time.monotonic() - start, 2),
+        **counts,
+        'episodes': entries,
+    }
+    index_path = os.path.join(output_base_dir, EXPORT_INDEX_NAME)
+    with open(index_path, 'w') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"导出 {counts['exported']} 个, 跳过 {counts['skipped']} 个, 失败 {counts['failed']} 个, 汇总索引: {index_path}")
+    return index
+
 def get_hdf5_files_info(folder_path):
     """
     获取文件夹中所有HDF5文件的信息
+    文件列表来自 list_episode_files (manifest 过期或缺少登记时会扫描目录),
+    manifest 中有最新记录的文件直接使用记录中的结构和大小, 其余文件打开读取
     
     Parameters:
         folder_path: 文件夹路径
@@ -353,41 +522,76 @@ def get_hdf5_files_info(folder_path):
     """
     if not os.path.exists(folder_path):
         return []
-    
-    files_info = []
-    for file in os.listdir(folder_path):
-        if file.endswith('.hdf5') or file.endswith('.h5'):
-            file_path = os.path.join(folder_path, file)
-            file_size = os.path.getsize(file_path)
-            
-            # 获取文件基本信息
-            info = {
-                'name': file,
-                'path': file_path,
-                'size_mb': file_size / (1024 * 1024),
-                'structure': {}
+
+    records = {}
+    if DatasetManifest is not None:
+        file_paths = list_episode_files(folder_path)
+        manifest = DatasetManifest(folder_path)
+        if manifest.exists() and not manifest.is_stale():
+            records = {
+                os.path.normpath(os.path.join(folder_path, record['path'])): record
+                for record in manifest.records()
             }
-            
-            # 获取HDF5文件结构信息
-            try:
-                with h5py.File(file_path, 'r') as f:
-                    def collect_structure(name, obj):
-                        if isinstance(obj, h5py.Dataset):
-                            info['structure'][name] = {
-                                'shape': obj.shape,
-                                'dtype': str(obj.dtype)
-                            }
-                        elif isinstance(obj, h5py.Group):
-                            info['structure'][name] = {'type': 'group'}
-                    
-                    f.visititems(collect_structure)
-            except Exception as e:
-                info['error'] = str(e)
-            
-            files_info.append(info)
-    
+    else:
+        file_paths = sorted(
+            os.path.join(folder_path, file) for file in os.listdir(folder_path)
+            if file.endswith('.hdf5') or file.endswith('.h5')
+        )
+
+    files_info = []
+    for file_path in file_paths:
+        record = records.get(os.path.normpath(file_path))
+        if record is not None and record.get('mtime') == os.path.getmtime(file_path):
+            files_info.append(get_record_file_info(record, file_path))
+        else:
+            files_info.append(read_hdf5_file_info(file_path))
     return files_info
 
+def read_hdf5_file_info(file_path):
+    """
+    打开HDF5文件读取结构信息
+    """
+    info = {
+        'name': os.path.basename(file_path),
+        'path': file_path,
+        'size_mb': os.path.getsize(file_path) / (1024 * 1024),
+        'structure': {}
+    }
+
+    try:
+        with h5py.File(file_path, 'r') as f:
+            def collect_structure(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    info['structure'][name] = {
+                        'shape': obj.shape,
+                        'dtype': str(obj.dtype)
+                    }
+                elif isinstance(obj, h5py.Group):
+                    info['structure'][name] = {'type': 'group'}
+
+            f.visititems(collect_structure)
+    except Exception as e:
+        info['error'] = str(e)
+    return info
+
+def get_record_file_info(record, file_path):
+    """
+    从 manifest 记录构造与 read_hdf5_file_info 相同格式的文件信息, 不打开HDF5文件
+    """
+    structure = {}
+    for name, stream in record.get('streams', {}).items():
+        structure[name] = {
+            'shape': tuple(stream['shape']) if stream.get('shape') is not None else None,
+            'dtype': stream.get('dtype'),
+        }
+    return {
+        'name': os.path.basename(file_path),
+        'path': file_path,
+        'size_mb': record.get('size', 0) / (1024 * 1024),
+        'frames': record.get('frames'),
+        'structure': structure,
+    }
+
 def print_files_summary(files_info, verbose=False):
     """
     打印文件信息摘要
@@ -418,22 +622,29 @@ def print_files_summary(files_info, verbose=False):
         print()
 
 if __name__ == "__main__":
-    # 文件夹路径
-    folder_path = "path/to/your/dataset/"
-    
+    parser = argparse.ArgumentParser(description="Export plots and videos for every HDF5 episode in a folder.")
+    parser.add_argument("folder_path", type=str, nargs="?", default="path/to/your/dataset/",
+                        help="包含HDF5文件的文件夹路径")
+    parser.add_argument("-o", "--output_dir", type=str, default="save/output", help="输出目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认 CPU 核数")
+    parser.add_argument("--max_ffmpeg", type=int, default=None, help="同时运行的 ffmpeg 上限, 默认 CPU 核数")
+    parser.add_argument("--force", action="store_true", help="忽略已有输出, 全部重新导出")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出详细信息")
+    args = parser.parse_args()
+
     # 检查文件夹是否存在
-    if not os.path.exists(folder_path):
-        print(f"文件夹不存在: {folder_path}")
+    if not os.path.exists(args.folder_path):
+        print(f"文件夹不存在: {args.folder_path}")
         print("请检查路径是否正确")
         sys.exit(1)
-    
+
     # 获取文件信息并仅输出数量（安静模式）
-    files_info = get_hdf5_files_info(folder_path)
-    print(f"找到 {len(files_info)} 个HDF5文件")
-    
-    # 直接批量处理（启用详细输出以便调试）
+    files_info = get_hdf5_files_info(args.folder_path)
+    print_files_summary(files_info, verbose=args.verbose)
+
+    # 多进程批量处理, 已是最新的 episode 会被跳过
     if files_info:
-        output_dir = "save/output"
-        visualize_folder(folder_path, output_dir, verbose=True)
+        batch_export(args.folder_path, args.output_dir, num_workers=args.workers, max_ffmpeg=args.max_ffmpeg,
+                     force=args.force, verbose=args.verbose)
     else:
-        print("没有找到HDF5文件，无法处理")
\ No newline at end of file
+        print("没有找到HDF5文件，无法处理")
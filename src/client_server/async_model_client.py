@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from .client_server_utils import *
+from .async_model_server import CANCEL_CMD
+
+
+class AsyncModelClient:
+    '''
+    AsyncModelServer 的 asyncio 客户端, 一个连接上可以同时发出多个请求
+    每个请求带 id, 后台读取任务按 id 把响应交给对应的 future, 不存在队头阻塞
+    '''
+    def __init__(self, host="localhost", port=9999, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self._ids = itertools.count()
+        self._pending = {}
+        self._read_task = None
+        self._write_lock = None
+        self.tracer = None
+        # 服务端按该 id 保存 instruction/观测窗口
+        self.client_id = uuid.uuid4().hex
+
+    async def connect(self, max_attempts=1000, retry_delay=5):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+                break
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt == max_attempts:
+                    raise ConnectionError(f"Failed to connect to server after {max_attempts} attempts: {str(e)}")
+                print(f"⚠️ Connection attempt {attempt} failed: {str(e)}")
+                print(f"🔄 Retrying in {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+
+        self._write_lock = asyncio.Lock()
+        self._read_task = asyncio.create_task(self._read_loop())
+        print(f"🔗 Connected to model server at {self.host}:{self.port}")
+        return self
+
+    async def _read_loop(self):
+        error = ConnectionError("Connection closed by server")
+        try:
+            while True:
+                response = await read_frame(self.reader)
+                future = self._pending.pop(response.get("id"), None)
+                if future is None or future.done():
+                    # 已超时或取消的请求, 响应直接丢弃
+                    continue
+                if "error" in response:
+                    future.set_exception(RuntimeError(response.get("error", "Unknown server error")))
+                else:
+                    future.set_result(response)
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            error = ConnectionError(f"Communication error: {str(e)}")
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def _write(self, data):
+        if self.writer is None:
+            raise ConnectionError("Not connected")
+        async with self._write_lock:
+            self.writer.write(encode_frame(data))
+            await self.writer.drain()
+
+    async def call(self, func_name=None, obs=None, timeout=None):
+        '''
+        timeout: 本次请求的超时 (秒), None 使用 self.timeout; 超时或被取消时通知服务端取消该请求
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        req_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = future
+        request = {"id": req_id, "cmd": func_name, "obs": obs, "timeout": timeout, "client": self.client_id}
+        tracer = self.tracer if self.tracer is not None and self.tracer.enabled else None
+        if tracer is not None:
+            request["trace"] = True
+        try:
+            start_ns = time.monotonic_ns()
+            await self._write(request)
+            response = await asyncio.wait_for(future, timeout)
+            if tracer is not None:
+                # 编码在写入时完成, 解码在读取任务中完成, 都计入 transfer
+                received_ns = time.monotonic_ns()
+                tracer.record_rpc(func_name, start_ns, start_ns, received_ns, received_ns, response.get("trace"))
+            return response.get("res")
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if self._pending.pop(req_id, None) is not None and self.writer is not None:
+                try:
+                    await asyncio.shield(self._write({"id": None, "cmd": CANCEL_CMD, "obs": req_id}))
+                except (ConnectionError, OSError):
+                    pass
+            raise
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def send(self, func_name=None, obs=None):
+        """单向请求, 服务端不回复"""
+        await self._write({"cmd": func_name, "obs": obs, "no_reply": True, "client": self.client_id})
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.writer = None
+            print("🔌 Connection closed")
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class MuxModelClient:
+    '''
+    AsyncModelClient 的同步封装, 接口与 ModelClient 相同, 可直接替换 DeployEnv 中的 model_client
+    事件循环运行在后台线程中, 多个线程可以共用一个连接同时发请求; submit 返回 concurrent.futures.Future
+    '''
+    def __init__(self, host="localhost", port=9999, timeout=30):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mux-model-client", daemon=True)
+        self._thread.start()
+        self.client = AsyncModelClient(host=host, port=port, timeout=timeout)
+        self._run(self.client.connect())
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @property
+    def tracer(self):
+        return self.client.tracer
+
+    @tracer.setter
+    def tracer(self, tracer):
+        self.client.tracer = tracer
+
+    def submit(self, func_name=None, obs=None, timeout=None):
+        return asyncio.run_coroutine_threadsafe(self.client.call(func_name, obs, timeout), self._loop)
+
+    def call(self, func_name=None, obs=None, timeout=None, idempotent=False):
+        # idempotent 只为与 ModelClient 接口一致, 多路复用连接不重发请求
+        return self.submit(func_name, obs, timeout).result()
+
+    def send(self, func_name=None, obs=None):
+        self._run(self.client.send(func_name, obs))
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=1)
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
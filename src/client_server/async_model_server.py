@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from .client_server_utils import *
+from .model_server import create_batcher, call_model
+from .obs_spec import OBS_SPEC_CMD
+from .latency_trace import server_trace
+
+CANCEL_CMD = "__cancel__"
+
+
+class AsyncModelServer:
+    '''
+    asyncio 版本的 ModelServer, 帧格式与 ModelServer 相同, 请求中可以带:
+    id: 请求编号, 响应带回同一个 id; 同一连接上可以同时有多个请求在处理, 响应按完成顺序返回
+    timeout: 服务端等待结果的最长时间 (秒), 超时返回 error
+    {"id": x, "cmd": "__cancel__", "obs": 请求 id}: 取消仍在处理的请求, 被取消的请求不回复
+    不带 id 的请求 (旧版 ModelClient) 按顺序处理并按顺序回复
+    '''
+    def __init__(self, model, host="localhost", port=None, max_batch_size=1, batch_wait_ms=5.0, max_workers=4):
+        self.model = model
+        self.host = host
+        self.port = port
+        self.model_lock = threading.Lock()
+        self.batcher = create_batcher(model, self.model_lock, max_batch_size, batch_wait_ms)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model")
+        self._loop = None
+        self._stop_event = None
+        self.status = {"ready": True}
+
+    def start(self):
+        """阻塞运行, 与 ModelServer.start 一样可以放在后台线程中"""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self.batcher is not None:
+            self.batcher.start()
+
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"🚀 Async model server started on {self.host}:{self.port}")
+        async with server:
+            await self._stop_event.wait()
+
+    def stop(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.executor.shutdown(wait=False)
+        print("🛑 Server has been stopped")
+
+    async def _handle_connection(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"✅ Client connected from {addr}")
+        write_lock = asyncio.Lock()
+        tasks = {}
+        try:
+            while True:
+                try:
+                    request = await read_frame(reader)
+                    recv_ns = time.monotonic_ns()
+                except asyncio.IncompleteReadError:
+                    print("🔌 Client disconnected")
+                    break
+
+                req_id = request.get("id")
+                cmd = request.get("cmd")
+                if cmd == CANCEL_CMD:
+                    task = tasks.get(request.get("obs"))
+                    if task is not None:
+                        task.cancel()
+                    continue
+
+                no_reply = request.get("no_reply") is True or cmd == "move"
+                # 旧版客户端不带 "client" 时按连接区分
+                request.setdefault("client", str(addr))
+                task = asyncio.create_task(self._dispatch(request, writer, write_lock, no_reply, recv_ns))
+                if req_id is not None:
+                    tasks[req_id] = task
+                    task.add_done_callback(lambda _, req_id=req_id: tasks.pop(req_id, None))
+                elif not no_reply:
+                    # 旧客户端没有 id, 只能按顺序回复
+                    await task
+        except (ConnectionResetError, BrokenPipeError):
+            print("🔌 Client connection lost")
+        finally:
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+    async def _dispatch(self, request, writer, write_lock, no_reply, recv_ns):
+        cmd = request.get("cmd")
+        timeout = request.get("timeout")
+        stamps = {}
+        try:
+            call = self._call(cmd, request.get("obs"), stamps, request["client"])
+            response = {"res": await asyncio.wait_for(call, timeout) if timeout else await call}
+            if request.get("trace") and stamps:
+                # read_frame 同时完成了反序列化, 没有单独的解码时间
+                response["trace"] = server_trace(recv_ns, recv_ns, stamps["start"], stamps["end"])
+        except asyncio.TimeoutError:
+            response = {"error": f"Request '{cmd}' timed out after {timeout}s"}
+        except Exception as e:
+            response = {"error": f"Error handling request: {e}", "traceback": traceback.format_exc()}
+
+        if no_reply:
+            if "error" in response:
+                print(f"⚠️ Error handling one-way request '{cmd}': {response['error']}")
+            return
+        if request.get("id") is not None:
+            response["id"] = request["id"]
+
+        frame = encode_frame(response)
+        async with write_lock:
+            writer.write(frame)
+            await writer.drain()
+
+    async def _call(self, cmd, obs, stamps, client_id):
+        if cmd == PING_CMD:
+            return PONG
+        if cmd == CLOCK_CMD:
+            return time.monotonic_ns()
+        if cmd == READY_CMD:
+            return self.status
+        method = getattr(self.model, cmd, None) if cmd else None
+        if method is None and cmd == OBS_SPEC_CMD:
+            method = lambda: None
+        if not callable(method):
+            raise AttributeError(f"No model method named '{cmd}'")
+        if cmd == "get_action" and self.batcher is not None:
+            # 取消时 wrap_future 会同时取消批处理队列中的请求
+            stamps["start"] = time.monotonic_ns()
+            result = await asyncio.wrap_future(self.batcher.submit(obs, client_id))
+            stamps["end"] = time.monotonic_ns()
+            return result
+        return await self._loop.run_in_executor(self.executor, self._call_locked, cmd, method, obs, stamps, client_id)
+
+    def _call_locked(self, cmd, method, obs, stamps, client_id):
+        with self.model_lock:
+            stamps["start"] = time.monotonic_ns()
+            result = call_model(self.model, cmd, method, obs, client_id)
+            stamps["end"] = time.monotonic_ns()
+            return result
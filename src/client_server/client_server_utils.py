@@ -1,8 +1,11 @@
 import json
+import time
 import numpy as np
 import base64
 from typing import Any, Mapping
 
+from robot.utils.base.action_chunk import ActionChunk, CHUNK_MARKER
+
 try:
     import torch
     _HAS_TORCH = True
@@ -17,6 +20,9 @@ def _to_numpy(obj: Any) -> Any:
         return obj.detach().cpu().numpy()
     if isinstance(obj, np.ndarray):
         return obj  # 留给 NumpyEncoder 处理
+    if isinstance(obj, ActionChunk):
+        # 整段动作作为一个数组 buffer 传输
+        return _to_numpy(obj.to_wire())
     if isinstance(obj, np.generic):
         return obj.item()
     if isinstance(obj, bytes):
@@ -61,8 +67,10 @@ def numpy_to_json(data: Any) -> str:
     return json.dumps(cleaned, cls=NumpyEncoder, ensure_ascii=False)
 
 
-def json_to_numpy(json_str: str) -> Any:
-    """从 JSON 字符串反序列化 numpy array 和 bytes"""
+def json_to_numpy(json_str: Any) -> Any:
+    """从 JSON 字符串 (或 UTF-8 编码的 bytes/bytearray/memoryview) 反序列化 numpy array 和 bytes"""
+    if isinstance(json_str, (bytes, bytearray, memoryview)):
+        json_str = str(json_str, "utf-8")
 
     def object_hook(dct):
         if "__numpy_array__" in dct:
@@ -70,6 +78,91 @@ def json_to_numpy(json_str: str) -> Any:
             return np.frombuffer(data, dtype=dct["dtype"]).reshape(dct["shape"])
         if "__bytes__" in dct:
             return base64.b64decode(dct["data"])
+        if CHUNK_MARKER in dct:
+            return ActionChunk.from_wire(dct)
         return dct
 
     return json.loads(json_str, object_hook=object_hook)
+
+
+FRAME_HEADER_SIZE = 4
+# 服务端内置的健康检查命令, 不调用模型
+PING_CMD = "__ping__"
+PONG = "pong"
+# 返回服务端 time.monotonic_ns(), 用于估计客户端与服务端的时钟偏差
+CLOCK_CMD = "__clock__"
+# 返回服务端就绪状态 {"ready": bool, ...}, 模型预热完成前 ready 为 False
+READY_CMD = "__ready__"
+
+
+def encode_frame(data: Any) -> bytes:
+    """长度头 (4 字节 big-endian) + JSON, 与 ModelServer/ModelClient 的帧格式相同"""
+    payload = numpy_to_json(data).encode("utf-8")
+    return len(payload).to_bytes(FRAME_HEADER_SIZE, "big") + payload
+
+
+def wait_server_ready(model_client, timeout=None, interval=0.5):
+    '''
+    握手: 轮询服务端直到模型预热完成, 之后的第一次推理不再包含编译/加载时间
+    返回服务端的状态 dict, 超时抛出 TimeoutError
+    '''
+    start = time.monotonic()
+    notified = False
+    while True:
+        status = model_client.call(func_name=READY_CMD) or {"ready": True}
+        if status.get("ready"):
+            if notified:
+                print(f"✅ Model server ready ({time.monotonic() - start:.1f}s)")
+            return status
+        if not notified:
+            print(f"⏳ Waiting for model server warmup ({status.get('stage', 'warmup')})...")
+            notified = True
+        if timeout is not None and time.monotonic() - start > timeout:
+            raise TimeoutError(f"Model server not ready after {timeout}s: {status}")
+        time.sleep(interval)
+
+
+class FrameReader:
+    '''
+    从阻塞 socket 读取一帧 (长度头 + 数据), 用 recv_into 直接读入复用的 bytearray,
+    不再按 4096 字节分块拼接; read 返回的 memoryview 在下一次 read 之前有效
+    输入:
+    buffer_size: 初始缓冲区大小, 不够时按需扩容, int
+    '''
+    def __init__(self, buffer_size: int = 1 << 20):
+        self._header = bytearray(FRAME_HEADER_SIZE)
+        self._buffer = bytearray(buffer_size)
+
+    @staticmethod
+    def _read_into(sock, view) -> int:
+        received = 0
+        while received < len(view):
+            n = sock.recv_into(view[received:])
+            if n == 0:
+                break
+            received += n
+        return received
+
+    def read(self, sock):
+        '''
+        对端在帧边界关闭连接时返回 None, 帧读到一半连接断开时抛出 ConnectionError
+        '''
+        received = self._read_into(sock, memoryview(self._header))
+        if received == 0:
+            return None
+        if received < FRAME_HEADER_SIZE:
+            raise ConnectionError("Incomplete frame header received")
+        size = int.from_bytes(self._header, "big")
+        if len(self._buffer) < size:
+            self._buffer = bytearray(max(size, 2 * len(self._buffer)))
+        view = memoryview(self._buffer)[:size]
+        if self._read_into(sock, view) < size:
+            raise ConnectionError("Incomplete frame received")
+        return view
+
+
+async def read_frame(reader) -> Any:
+    """从 asyncio.StreamReader 读取一帧, 连接关闭时抛出 asyncio.IncompleteReadError"""
+    header = await reader.readexactly(FRAME_HEADER_SIZE)
+    payload = await reader.readexactly(int.from_bytes(header, "big"))
+    return json_to_numpy(payload)
@@ -0,0 +1,145 @@
+"""
+Latency tracing for the deploy loop.
+Every stage of a step (get_obs, obs spec, request encode, wire transfer, server decode,
+model lock / batch wait, inference, response decode, Robot.move, take_action pacing) is
+recorded as a span of time.monotonic_ns() timestamps on the client clock. Server spans
+come back in the response when the request carries "trace": True and are moved onto the
+client clock with an NTP style offset estimated at the start of every episode.
+
+Saved per episode next to eval_result.txt as latency_episode{idx}.json:
+    {
+        "episode": idx,
+        "clock_offset_ns": server - client, "clock_rtt_ns": rtt of the best sample,
+        "spans": [[step, stage, start_ns, end_ns], ...],
+        "summary": {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}},
+    }
+"""
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from .client_server_utils import CLOCK_CMD
+
+PERCENTILES = (50, 95, 99)
+
+
+def server_trace(recv_ns, decoded_ns, start_ns, end_ns):
+    '''
+    服务端时间戳 (服务端 monotonic 时钟):
+    recv: 请求帧接收完成, decoded: 反序列化完成, start/end: 拿到模型锁 (或提交批处理) / 推理结束
+    '''
+    return {"recv": recv_ns, "decoded": decoded_ns, "start": start_ns, "end": end_ns}
+
+
+class LatencyTracer:
+    '''
+    输入:
+    enabled: False 时所有记录接口都是空操作, 不在请求中附带 trace, bool
+    clock_samples: 估计时钟偏差时的往返次数, 取 RTT 最小的一次, int
+    '''
+    def __init__(self, enabled=True, clock_samples=8):
+        self.enabled = enabled
+        self.clock_samples = clock_samples
+        self.step = 0
+        self.offset_ns = 0
+        self.rtt_ns = None
+        self.spans = []
+
+    def reset(self):
+        self.step = 0
+        self.spans = []
+
+    def add(self, stage, start_ns, end_ns, step=None):
+        if self.enabled:
+            self.spans.append((self.step if step is None else step, stage, int(start_ns), int(end_ns)))
+
+    def span(self, stage):
+        return self._span(stage) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _span(self, stage):
+        start = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.add(stage, start, time.monotonic_ns())
+
+    def sync_clock(self, model_client):
+        '''
+        offset = 服务端时钟 - 客户端时钟, 假设请求/响应两个方向的网络延迟相同, 误差不超过 rtt / 2
+        '''
+        if not self.enabled:
+            return
+        best = None
+        for _ in range(self.clock_samples):
+            t0 = time.monotonic_ns()
+            server_ns = model_client.call(func_name=CLOCK_CMD)
+            t1 = time.monotonic_ns()
+            if server_ns is None:
+                return
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, server_ns - (t0 + t1) // 2)
+        self.rtt_ns, self.offset_ns = best
+
+    def record_rpc(self, cmd, start_ns, sent_ns, received_ns, end_ns, trace=None):
+        '''
+        客户端一次 RPC 的时间戳: 开始编码 / 编码完成 / 收到完整响应 / 解码完成
+        transfer = 往返时间 - 服务端处理时间, 包含双向网络传输和服务端响应编码
+        '''
+        if not self.enabled or cmd == CLOCK_CMD:
+            return
+        if sent_ns > start_ns:
+            self.add(f"{cmd}.encode", start_ns, sent_ns)
+        if end_ns > received_ns:
+            self.add(f"{cmd}.decode", received_ns, end_ns)
+        if not trace:
+            self.add(f"{cmd}.rpc", sent_ns, received_ns)
+            return
+        recv, decoded, start, end = (trace[key] - self.offset_ns for key in ("recv", "decoded", "start", "end"))
+        self.add(f"{cmd}.server_decode", recv, decoded)
+        self.add(f"{cmd}.server_wait", decoded, start)
+        self.add(f"{cmd}.infer", start, end)
+        # 传输时间不依赖时钟偏差估计, 只用两边各自的时间差
+        transfer = (received_ns - sent_ns) - (trace["end"] - trace["recv"])
+        self.add(f"{cmd}.transfer", sent_ns, sent_ns + max(0, transfer))
+
+    def summary(self):
+        durations = {}
+        for _, stage, start, end in self.spans:
+            durations.setdefault(stage, []).append(end - start)
+        result = {}
+        for stage, values in durations.items():
+            values = np.asarray(values, dtype=np.float64) / 1e6
+            result[stage] = {"count": len(values), "mean_ms": float(values.mean()),
+                             **{f"p{p}_ms": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+                             "max_ms": float(values.max())}
+        return result
+
+    def format_summary(self, summary=None):
+        summary = self.summary() if summary is None else summary
+        lines = [f"{'stage':<32}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)"]
+        for stage, s in sorted(summary.items(), key=lambda item: -item[1]["p50_ms"] * item[1]["count"]):
+            lines.append(f"{stage:<32}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                         f"{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        return "\n".join(lines)
+
+    def save(self, save_dir, episode_idx):
+        '''
+        返回写入的文件路径, 没有记录时返回 None
+        '''
+        if not self.enabled or not self.spans:
+            return None
+        path = os.path.join(save_dir, f"latency_episode{episode_idx}.json")
+        os.makedirs(save_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "episode": episode_idx,
+                "clock_offset_ns": self.offset_ns,
+                "clock_rtt_ns": self.rtt_ns,
+                "spans": [list(span) for span in self.spans],
+                "summary": self.summary(),
+            }, f)
+        return path
@@ -2,91 +2,257 @@ from .client_server_utils import *
 import json
 import socket
 import time
+import random
+import threading
+import uuid
 import pickle
 
+# 服务端只读的命令, 响应丢失时可以安全地重发
+IDEMPOTENT_CMDS = (PING_CMD, READY_CMD, CLOCK_CMD)
+
+
 class ModelClient:
-    def __init__(self, host="localhost", port=9999, timeout=30):
+    '''
+    输入:
+    timeout: 单次请求的 socket 超时 (秒), float
+    standby: 额外保持一条已连接的备用连接, 主连接出错时立即切换, bool
+    keepalive_interval: 空闲超过该时间 (秒) 时对主/备用连接做一次健康检查, <=0 关闭, float
+    sock_buf_size: SO_SNDBUF/SO_RCVBUF 大小 (字节), 观测较大时避免发送被窗口限制, int
+    retry_base / retry_max: 重连退避的初始/最大间隔 (秒), 每次翻倍并加随机抖动, float
+    '''
+    def __init__(self, host="localhost", port=9999, timeout=30, standby=True, keepalive_interval=5.0,
+                 sock_buf_size=4 * 1024 * 1024, retry_base=0.01, retry_max=5.0, max_attempts=1000):
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.sock_buf_size = sock_buf_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.keepalive_interval = keepalive_interval
+
         self.sock = None
-        self._connect()
+        self._standby = None
+        self._use_standby = standby
+        self._lock = threading.Lock()          # 保护主连接上的一次请求/响应
+        self._reader = FrameReader()           # 主连接的接收缓冲区, 只在持有 _lock 时使用
+        self._standby_lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self._closed = False
+        # LatencyTracer, 由 DeployEnv 设置; 设置后请求附带 trace, 服务端在响应中返回各阶段时间戳
+        self.tracer = None
+        # 服务端按该 id 保存 instruction/观测窗口, 切换到备用连接后不变
+        self.client_id = uuid.uuid4().hex
 
-    def _connect(self):
-        attempts = 0
-        max_attempts = 1000
-        retry_delay = 5
+        self.sock = self._connect()
+        self._refill_standby()
+        self._keepalive_thread = None
+        if keepalive_interval and keepalive_interval > 0:
+            self._keepalive_thread = threading.Thread(target=self._keepalive, name="model-client-keepalive",
+                                                      daemon=True)
+            self._keepalive_thread.start()
 
-        while attempts < max_attempts:
+    def _new_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # 动作回复很小, 关闭 Nagle 避免 40ms 级别的延迟 ACK 等待
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            # 内核层保活: 空闲 10s 后开始探测, 3 次失败 (约 15s) 判定连接断开
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 10)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 2)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+        if self.sock_buf_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sock_buf_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.sock_buf_size)
+        sock.settimeout(self.timeout)
+        return sock
+
+    def _connect(self, verbose=True):
+        '''
+        带抖动的指数退避重连: retry_base, 2*retry_base, ... 直到 retry_max
+        '''
+        attempts = 0
+        while True:
+            sock = self._new_socket()
             try:
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.settimeout(self.timeout)
-                self.sock.connect((self.host, self.port))
-                print(f"🔗 Connected to model server at {self.host}:{self.port}")
-                return
+                sock.connect((self.host, self.port))
+                if verbose:
+                    print(f"🔗 Connected to model server at {self.host}:{self.port}")
+                return sock
             except Exception as e:
+                sock.close()
                 attempts += 1
-                if self.sock:
-                    self.sock.close()
-                if attempts < max_attempts:
+                if attempts >= self.max_attempts or self._closed:
+                    raise ConnectionError(f"Failed to connect to server after {attempts} attempts: {str(e)}")
+                delay = min(self.retry_max, self.retry_base * 2 ** min(attempts - 1, 30))
+                delay *= random.uniform(0.5, 1.0)
+                if verbose and delay >= 1:
                     print(f"⚠️ Connection attempt {attempts} failed: {str(e)}")
-                    print(f"🔄 Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    raise ConnectionError(f"Failed to connect to server after {max_attempts} attempts: {str(e)}")
+                    print(f"🔄 Retrying in {delay:.2f} seconds...")
+                time.sleep(delay)
 
-    def _send(self, data):
-        try:
-            # Serialize with numpy support
-            json_data = numpy_to_json(data).encode("utf-8")
+    def _refill_standby(self):
+        if not self._use_standby or self._closed:
+            return
 
-            # Send data length and data
-            self.sock.sendall(len(json_data).to_bytes(4, "big"))
-            self.sock.sendall(json_data)
+        def fill():
+            try:
+                sock = self._connect(verbose=False)
+            except ConnectionError:
+                return
+            with self._standby_lock:
+                if self._standby is None and not self._closed:
+                    self._standby = sock
+                    return
+            sock.close()
 
-        except Exception as e:
-            self.close()
-            raise ConnectionError(f"Communication error: {str(e)}")
+        threading.Thread(target=fill, name="model-client-standby", daemon=True).start()
 
-    def _send_recv(self, data):
-        """Send request and receive response with numpy array support"""
+    def _failover(self):
+        '''
+        主连接出错: 优先切换到备用连接, 没有备用连接时重新连接, 然后在后台补充备用连接
+        '''
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        with self._standby_lock:
+            standby, self._standby = self._standby, None
+        if standby is not None and self._ping(standby):
+            self.sock = standby
+            print("🔁 Switched to standby connection")
+        else:
+            if standby is not None:
+                standby.close()
+            self.sock = self._connect()
+        self._refill_standby()
+
+    def _ping(self, sock):
         try:
-            # Serialize with numpy support
-            json_data = numpy_to_json(data).encode("utf-8")
+            sock.sendall(encode_frame({"cmd": PING_CMD}))
+            return self._recv_response(sock, FrameReader(4096)) == {"res": PONG}
+        except Exception:
+            return False
 
-            # Send data length and data
-            self.sock.sendall(len(json_data).to_bytes(4, "big"))
-            self.sock.sendall(json_data)
-            # Receive and deserialize response
-            response = self._recv_response()
-            return response
+    def _keepalive(self):
+        '''
+        空闲时周期性检查主连接和备用连接, 坏掉的连接在下一次请求之前就被替换
+        '''
+        while not self._closed:
+            time.sleep(self.keepalive_interval / 2)
+            if self._closed or time.monotonic() - self._last_used < self.keepalive_interval:
+                continue
+            if self._lock.acquire(blocking=False):
+                try:
+                    if self.sock is not None and not self._ping(self.sock):
+                        print("⚠️ Keepalive failed, reconnecting...")
+                        self._failover()
+                    self._last_used = time.monotonic()
+                except ConnectionError as e:
+                    print(f"⚠️ Reconnect failed: {e}")
+                finally:
+                    self._lock.release()
+            with self._standby_lock:
+                standby = self._standby
+                if standby is not None and not self._ping(standby):
+                    standby.close()
+                    self._standby = None
+            if standby is not None and self._standby is None:
+                self._refill_standby()
+
+    def _send(self, data):
+        try:
+            # Serialize with numpy support
+            self.sock.sendall(encode_frame(data))
 
         except Exception as e:
             self.close()
             raise ConnectionError(f"Communication error: {str(e)}")
 
-    def _recv_response(self):
-        """Receive response with numpy array reconstruction"""
-        # Read response length
-        
-        len_data = self.sock.recv(4)
+    def _send_recv(self, data, retries=1, idempotent=False):
+        """
+        Send request and receive response with numpy array support
+        发送失败 (请求没有完整到达服务端) 或服务端没有回复任何字节就关闭连接时在新连接上重试;
+        已发出的请求只有幂等命令 (IDEMPOTENT_CMDS 或 idempotent=True) 才会在接收超时/出错后重发,
+        其它命令 (reset 等) 丢弃当前连接并抛出, 避免在服务端执行两次
+        """
+        tracer = self.tracer
+        cmd = data.get("cmd")
+        idempotent = idempotent or cmd in IDEMPOTENT_CMDS
+        start_ns = time.monotonic_ns()
+        frame = encode_frame(data)
+        sent_ns = time.monotonic_ns()
+        with self._lock:
+            for attempt in range(retries + 1):
+                try:
+                    if self.sock is None:
+                        raise ConnectionError("Not connected")
+                    self.sock.sendall(frame)
+                except Exception as e:
+                    if self._closed or attempt == retries:
+                        raise ConnectionError(f"Communication error: {str(e)}")
+                    print(f"⚠️ Send failed: {str(e)}, retrying on a new connection...")
+                    self._failover()
+                    sent_ns = time.monotonic_ns()
+                    continue
+
+                closed_before_reply = False
+                try:
+                    raw = self._reader.read(self.sock)
+                    if raw is None:
+                        closed_before_reply = True
+                        raise ConnectionError("Connection closed by server")
+                    received_ns = time.monotonic_ns()
+                    response = self._decode_response(raw)
+                    self._last_used = time.monotonic()
+                    break
+                except Exception as e:
+                    # 迟到的响应会让这条连接上之后的请求错位, 无论是否重试都换一条连接
+                    retry = (idempotent or closed_before_reply) and not self._closed and attempt < retries
+                    self._discard_connection()
+                    if retry:
+                        print(f"⚠️ Communication error: {str(e)}, retrying '{cmd}' on a new connection...")
+                        sent_ns = time.monotonic_ns()
+                        continue
+                    if isinstance(e, socket.timeout):
+                        raise TimeoutError(f"No response to '{cmd}' within {self.timeout}s")
+                    raise ConnectionError(f"Communication error: {str(e)}")
+            if isinstance(response, dict) and "error" in response:
+                # 服务端发出错误响应后会关闭这条连接, 下一次请求换一条连接
+                self._discard_connection()
+        if tracer is not None and isinstance(response, dict):
+            tracer.record_rpc(data.get("cmd"), start_ns, sent_ns, received_ns, time.monotonic_ns(),
+                              response.pop("trace", None))
+        return response
+
+    def _discard_connection(self):
+        '''
+        丢弃当前连接 (切换到备用连接或重新连接); 重连失败时留到下一次请求再连接
+        '''
+        if self._closed:
+            return
+        try:
+            self._failover()
+        except ConnectionError as e:
+            print(f"⚠️ Reconnect failed: {e}")
+            self.sock = None
 
-        if not len_data:
+    @staticmethod
+    def _recv_frame(sock, reader):
+        raw = reader.read(sock)
+        if raw is None:
             raise ConnectionError("Connection closed by server")
+        return raw
 
-        size = int.from_bytes(len_data, "big")
-
-        # Read complete response
-        chunks = []
-        received = 0
-        while received < size:
-            chunk = self.sock.recv(min(size - received, 4096))
-            if not chunk:
-                raise ConnectionError("Incomplete response received")
-            chunks.append(chunk)
-            received += len(chunk)
-        # Deserialize with numpy reconstruction
-        raw = b"".join(chunks).decode("utf-8")
+    def _recv_response(self, sock=None, reader=None):
+        """Receive response with numpy array reconstruction"""
+        sock = self.sock if sock is None else sock
+        return self._decode_response(self._recv_frame(sock, self._reader if reader is None else reader))
+
+    @staticmethod
+    def _decode_response(raw):
         try:
             return json_to_numpy(raw)
         except json.JSONDecodeError as exc:
@@ -94,8 +260,21 @@ class ModelClient:
                 f"Invalid JSON from server (stream likely desynced after one-way move): {exc}"
             ) from exc
 
-    def call(self, func_name=None, obs=None):
-        response = self._send_recv({"cmd": func_name, "obs": obs})
+    def ping(self):
+        """健康检查, 返回往返时间 (秒)"""
+        start = time.monotonic()
+        self._send_recv({"cmd": PING_CMD})
+        return time.monotonic() - start
+
+    def call(self, func_name=None, obs=None, idempotent=False):
+        '''
+        idempotent: 重复执行不会改变服务端结果的命令 (例如带观测的 get_action/update_obs/set_language),
+                    响应丢失或超时时在新连接上重发一次, bool
+        '''
+        request = {"cmd": func_name, "obs": obs, "client": self.client_id}
+        if self.tracer is not None and self.tracer.enabled:
+            request["trace"] = True
+        response = self._send_recv(request, idempotent=idempotent)
         if isinstance(response, dict) and "error" in response:
             raise RuntimeError(response.get("error", "Unknown server error"))
         if isinstance(response, dict) and "res" in response:
@@ -104,6 +283,11 @@ class ModelClient:
 
     def close(self):
         """Close the connection"""
+        self._closed = True
+        with self._standby_lock:
+            if self._standby is not None:
+                self._standby.close()
+                self._standby = None
         if self.sock:
             try:
                 self.sock.close()
@@ -120,4 +304,4 @@ class ModelClient:
         self.close()
 
 if __name__ == "__main__":
-    ModelClient()
\ No newline at end of file
+    ModelClient()
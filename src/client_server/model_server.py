@@ -1,11 +1,132 @@
 import socket
 import threading
 import traceback
+import queue
+from concurrent.futures import Future
 from .client_server_utils import *
+from .obs_spec import OBS_SPEC_CMD
+from .latency_trace import server_trace
 import pickle
 import time
+
+def call_model(model, cmd, method, obs, client_id):
+    '''
+    model.client_state_methods 中的方法按客户端保存状态 (instruction / 观测窗口等), 调用时额外传入 client_id
+    '''
+    kwargs = {"client_id": client_id} if cmd in getattr(model, "client_state_methods", ()) else {}
+    return method(obs, **kwargs) if obs is not None else method(**kwargs)
+
+
+def create_batcher(model, model_lock, max_batch_size, batch_wait_ms):
+    '''
+    max_batch_size > 1 且 model 按客户端保存 get_action 的状态时返回 InferenceBatcher, 否则返回 None
+    状态 (instruction / 观测窗口) 保存在模型实例上的 policy 合批时会互相覆盖, 只能逐条推理
+    '''
+    if max_batch_size <= 1:
+        return None
+    if "get_action" not in getattr(model, "client_state_methods", ()):
+        print(f"⚠️ {type(model).__name__} does not list get_action in client_state_methods; "
+              f"max_batch_size={max_batch_size} ignored, requests are served one by one")
+        return None
+    return InferenceBatcher(model, model_lock, max_batch_size, batch_wait_ms)
+
+
+class InferenceBatcher:
+    '''
+    集中推理队列: 收集多个客户端的 get_action 请求, 在 batch_wait_ms 的延迟预算内凑批,
+    每批只调用一次 model.get_action_batch(obs_list, client_ids), 再把结果分发回各请求
+    model 没有 get_action_batch 时在推理线程中逐条调用 get_action
+    一批中的请求来自不同客户端, model 必须在 client_state_methods 中声明 get_action,
+    按 client_id 区分各自的状态 (见 create_batcher)
+    '''
+    def __init__(self, model, model_lock, max_batch_size=8, batch_wait_ms=5.0):
+        self.model = model
+        self.model_lock = model_lock
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.batch_wait = max(0.0, float(batch_wait_ms)) / 1000
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def submit(self, obs, client_id=None):
+        future = Future()
+        self._queue.put((obs, client_id, future))
+        return future
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if batch:
+                self._infer(batch)
+
+    def _infer(self, batch):
+        # 已被客户端取消的请求直接丢弃
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # obs 为 None 的请求依赖该客户端缓存的观测, 不能合批
+        singles = [(client_id, future) for obs, client_id, future in batch if obs is None]
+        batched = [item for item in batch if item[0] is not None]
+        with self.model_lock:
+            for client_id, future in singles:
+                try:
+                    future.set_result(self.model.get_action(client_id=client_id))
+                except Exception as e:
+                    future.set_exception(e)
+
+            if batched:
+                batch_fn = getattr(self.model, "get_action_batch", None)
+                try:
+                    if callable(batch_fn) and len(batched) > 1:
+                        results = batch_fn([obs for obs, _, _ in batched], [client_id for _, client_id, _ in batched])
+                    else:
+                        results = [self.model.get_action(obs, client_id=client_id) for obs, client_id, _ in batched]
+                except Exception as e:
+                    for _, _, future in batched:
+                        future.set_exception(e)
+                else:
+                    for (_, _, future), result in zip(batched, results):
+                        future.set_result(result)
+
+        self.batches += 1
+        self.requests += len(batch)
+
+
 class ModelServer:
-    def __init__(self, model, host="localhost", port=None):
+    '''
+    max_batch_size > 1 时启用 InferenceBatcher, 多个客户端 (多台机器人) 的 get_action 请求合批推理
+    (model 需按客户端保存状态, 见 create_batcher); 请求中的 "client" 为客户端 id, 断线重连后保持不变
+    batch_wait_ms: 凑批时最多等待的时间, 即为吞吐额外付出的延迟预算
+    '''
+    def __init__(self, model, host="localhost", port=None, max_batch_size=1, batch_wait_ms=5.0):
         self.model = model
         self.host = host
         self.port = port
@@ -13,6 +134,11 @@ class ModelServer:
         self.running = False
         self.wait_interval = 10
         self.client_threads = []
+        # READY_CMD 的回复; setup_policy_server 在预热期间设为 {"ready": False, ...}
+        self.status = {"ready": True}
+        # 所有客户端线程串行访问模型, 避免同时推理争抢 GIL/显存
+        self.model_lock = threading.Lock()
+        self.batcher = create_batcher(model, self.model_lock, max_batch_size, batch_wait_ms)
 
     def start(self):
         """Start the model server and listen for incoming client connections"""
@@ -21,6 +147,10 @@ class ModelServer:
         self.server_socket.settimeout(self.wait_interval)
         self.server_socket.listen(5)
         self.running = True
+        if self.batcher is not None:
+            self.batcher.start()
+            print(f"📦 Batching get_action: max_batch_size={self.batcher.max_batch_size}, "
+                  f"batch_wait={self.batcher.batch_wait * 1000:.1f}ms")
 
         print(f"🚀 Model server started on {self.host}:{self.port}")
         print("🔄 Server is waiting for client connections...")
@@ -30,6 +160,8 @@ class ModelServer:
     def stop(self):
         """Stop the server and clean up resources gracefully"""
         self.running = False
+        if self.batcher is not None:
+            self.batcher.stop()
         if self.server_socket:
             try:
                 self.server_socket.close()
@@ -45,6 +177,8 @@ class ModelServer:
             try:
                 client_socket, addr = self.server_socket.accept()
                 print(f"✅ Client connected from {addr}")
+                # 回复通常很小, 关闭 Nagle 避免与客户端的延迟 ACK 叠加
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 # Handle each client in a separate thread
                 t = threading.Thread(target=self._handle_client, args=(client_socket,), daemon=True)
                 t.start()
@@ -58,44 +192,59 @@ class ModelServer:
 
     def _handle_client(self, client_socket):
         """Process requests from a single client"""
+        reader = FrameReader()
+        # 旧版客户端不带 "client" 时按连接区分
+        connection_id = str(client_socket.getpeername())
         with client_socket:
             while self.running:
                 try:
-                    # Read message length header (4 bytes, big-endian)
-                    len_bytes = client_socket.recv(4)
-                    if not len_bytes:
+                    # Read one length-prefixed frame into the reused receive buffer
+                    raw_msg = reader.read(client_socket)
+                    if raw_msg is None:
                         print("🔌 Client disconnected")
                         break
-                    msg_length = int.from_bytes(len_bytes, "big")
-
-                    # Read the full message based on length
-                    chunks = []
-                    remaining = msg_length
-                    while remaining > 0:
-                        chunk = client_socket.recv(min(remaining, 4096))
-                        if not chunk:
-                            raise ConnectionError("Incomplete data received")
-                        chunks.append(chunk)
-                        remaining -= len(chunk)
-                    raw_msg = b"".join(chunks).decode("utf-8")
+                    recv_ns = time.monotonic_ns()
                     # Deserialize JSON to Python, reconstruct any numpy arrays
                     data = json_to_numpy(raw_msg)
+                    decoded_ns = time.monotonic_ns()
                     # data = pickle.loads(raw_msg)
 
                     # Extract command and observation
                     cmd = data.get("cmd")
                     obs = data.get("obs")  # None if not provided
+                    client_id = data.get("client", connection_id)
                     # move is fire-and-forget on the master side; do not reply or the
                     # TCP stream desyncs and later RPCs (start/finish) fail JSON decode.
                     no_reply = data.get("no_reply") is True or cmd == "move"
 
+                    if cmd in (PING_CMD, CLOCK_CMD, READY_CMD):
+                        # 健康检查/保活/对时/就绪查询, 不经过模型锁, 推理或预热进行中也能立即回复
+                        if cmd == PING_CMD:
+                            res = PONG
+                        elif cmd == READY_CMD:
+                            res = self.status
+                        else:
+                            res = time.monotonic_ns()
+                        client_socket.sendall(encode_frame({"res": res}))
+                        continue
+
                     # Find corresponding model method
                     method = getattr(self.model, cmd, None)
+                    if method is None and cmd == OBS_SPEC_CMD:
+                        # policy 没有声明 obs spec 时客户端按原样发送观测
+                        method = lambda: None
                     if not callable(method):
                         raise AttributeError(f"No model method named '{cmd}'")
 
                     try:
-                        result = method(obs) if obs is not None else method()
+                        if cmd == "get_action" and self.batcher is not None:
+                            start_ns = time.monotonic_ns()
+                            result = self.batcher.submit(obs, client_id).result()
+                        else:
+                            with self.model_lock:
+                                start_ns = time.monotonic_ns()
+                                result = call_model(self.model, cmd, method, obs, client_id)
+                        end_ns = time.monotonic_ns()
                     except Exception as e:
                         if no_reply:
                             print(f"⚠️ Error handling one-way request '{cmd}': {e}")
@@ -107,11 +256,11 @@ class ModelServer:
                         continue
 
                     response = {"res": result}
+                    if data.get("trace"):
+                        response["trace"] = server_trace(recv_ns, decoded_ns, start_ns, end_ns)
 
                     # Serialize response and send back with length header
-                    resp_bytes = numpy_to_json(response).encode("utf-8")
-                    client_socket.sendall(len(resp_bytes).to_bytes(4, "big"))
-                    client_socket.sendall(resp_bytes)
+                    client_socket.sendall(encode_frame(response))
 
                 except (ConnectionResetError, BrokenPipeError):
                     print("🔌 Client connection lost")
@@ -120,7 +269,5 @@ class ModelServer:
                     err = f"Error handling request: {e}"
                     print(f"⚠️ {err}")
                     tb = traceback.format_exc()
-                    error_resp = numpy_to_json({"error": err, "traceback": tb}).encode("utf-8")
-                    client_socket.sendall(len(error_resp).to_bytes(4, "big"))
-                    client_socket.sendall(error_resp)
+                    client_socket.sendall(encode_frame({"error": err, "traceback": tb}))
                     break
@@ -0,0 +1,153 @@
+"""
+Observation spec negotiated between DeployEnv and the policy server.
+The policy declares which controller keys and cameras it needs and the image size
+and format it wants for each camera; the client crops, downscales and re-encodes
+images (or drops unused streams) before they go over the wire.
+
+    {
+        "state": {"left_arm": ["joint", "gripper"], ...},     # None: send all controller data
+        "cameras": {                                         # None: send all sensor data unchanged
+            "cam_head": {
+                "size": [W, H],        # exact output size
+                "max_size": [W, H],    # or: fit inside W x H, keep aspect ratio (never upscales)
+                "crop": [x, y, w, h],  # crop on the source image before resizing
+                "format": "jpeg",      # jpeg / bgr / rgb (raw uint8 HxWx3)
+                "quality": 90,         # JPEG quality when re-encoding
+                "depth": False,        # also send depth
+            },
+        },
+    }
+"""
+import cv2
+import numpy as np
+
+OBS_SPEC_CMD = "get_obs_spec"
+IMAGE_FORMATS = ("jpeg", "bgr", "rgb")
+# IMREAD_REDUCED_COLOR_x: JPEG 解码时直接按 1/x 缩小, 比完整解码后再缩放快很多
+REDUCED_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                        4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def _jpeg_bytes(color):
+    if isinstance(color, (bytes, bytearray)):
+        return bytes(color)
+    return np.asarray(color).tobytes().rstrip(b"\0")
+
+
+class CameraSpec:
+    def __init__(self, size=None, max_size=None, crop=None, format="jpeg", quality=90, depth=False):
+        if format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{format}', available: {IMAGE_FORMATS}")
+        self.size = tuple(size) if size else None
+        self.max_size = tuple(max_size) if max_size else None
+        self.crop = tuple(crop) if crop else None
+        self.format = format
+        self.quality = int(quality)
+        self.depth = depth
+        self._source_shape = None
+
+    @property
+    def passthrough(self):
+        return self.size is None and self.max_size is None and self.crop is None and self.format == "jpeg"
+
+    def _output_size(self, width, height):
+        if self.size is not None:
+            return self.size
+        if self.max_size is not None:
+            scale = min(1.0, self.max_size[0] / width, self.max_size[1] / height)
+            return max(1, round(width * scale)), max(1, round(height * scale))
+        return width, height
+
+    def _reduction(self):
+        '''
+        根据上一帧的源尺寸选择最大的 JPEG 缩小解码倍数, 保证解码结果不小于输出尺寸
+        '''
+        if self._source_shape is None:
+            return 1
+        height, width = self._source_shape
+        crop_w, crop_h = (self.crop[2], self.crop[3]) if self.crop else (width, height)
+        out_w, out_h = self._output_size(crop_w, crop_h)
+        for factor in (8, 4, 2):
+            if crop_w / factor >= out_w and crop_h / factor >= out_h:
+                return factor
+        return 1
+
+    def decode(self, color):
+        if isinstance(color, np.ndarray) and color.ndim == 3:
+            self._source_shape = color.shape[:2]
+            return color, 1
+        factor = self._reduction()
+        image = cv2.imdecode(np.frombuffer(_jpeg_bytes(color), dtype=np.uint8), REDUCED_DECODE_FLAGS[factor])
+        if image is None:
+            return None, factor
+        self._source_shape = (image.shape[0] * factor, image.shape[1] * factor)
+        return image, factor
+
+    def apply(self, color):
+        if color is None:
+            return None
+        if self.passthrough and not (isinstance(color, np.ndarray) and color.ndim == 3):
+            return color
+
+        image, factor = self.decode(color)
+        if image is None:
+            return None
+        if self.crop is not None:
+            x, y, w, h = (v // factor for v in self.crop)
+            image = image[y:y + h, x:x + w]
+        width, height = self._output_size(*(v * factor for v in image.shape[1::-1]))
+        if (width, height) != tuple(image.shape[1::-1]):
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+        if self.format == "jpeg":
+            success, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            return encoded.tobytes() if success else None
+        if self.format == "rgb":
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return np.ascontiguousarray(image)
+
+
+class ObservationSpec:
+    '''
+    在客户端按 policy 声明的需求裁剪 [controller_data, sensor_data] 观测
+    '''
+    def __init__(self, state=None, cameras=None):
+        self.state = state
+        self.cameras = {name: CameraSpec(**(cfg or {})) for name, cfg in cameras.items()} \
+            if cameras is not None else None
+
+    def __repr__(self):
+        cameras = None if self.cameras is None else {
+            name: {"size": c.size, "max_size": c.max_size, "crop": c.crop, "format": c.format}
+            for name, c in self.cameras.items()
+        }
+        return f"ObservationSpec(state={self.state}, cameras={cameras})"
+
+    @classmethod
+    def negotiate(cls, model_client):
+        '''
+        握手: 向 policy 请求 obs spec, policy 未声明时返回 None (观测原样发送)
+        '''
+        spec = model_client.call(func_name=OBS_SPEC_CMD)
+        return cls(**spec) if spec else None
+
+    def apply(self, obs):
+        controller_data, sensor_data = obs
+        if self.state is not None:
+            controller_data = {
+                name: {key: controller_data[name][key] for key in keys if key in controller_data[name]}
+                for name, keys in self.state.items() if name in controller_data
+            }
+        if self.cameras is not None:
+            filtered = {}
+            for name, camera in self.cameras.items():
+                if name not in sensor_data:
+                    continue
+                data = {"color": camera.apply(sensor_data[name].get("color"))}
+                if camera.depth and "depth" in sensor_data[name]:
+                    data["depth"] = sensor_data[name]["depth"]
+                if "timestamp" in sensor_data[name]:
+                    data["timestamp"] = sensor_data[name]["timestamp"]
+                filtered[name] = data
+            sensor_data = filtered
+        return [controller_data, sensor_data]
@@ -107,10 +107,12 @@ class PiperController(ArmController):
         self._debug_lock = threading.Lock()
         self._debug_dir = None
         self._gripper_debug_path = None
-        self._feedback_lock = threading.Lock()
-        self._cached_joint = None
-        self._cached_joint_velocity = None
-        self._cached_feedback_ns = 0
+        # 反馈快照由反馈线程整体替换 (引用赋值是原子的), 读取方不需要加锁
+        self._feedback = None
+        self._feedback_ready = threading.Event()
+        self._feedback_thread = None
+        self._feedback_stop_event = None
+        self._feedback_hz = float(os.environ.get("XONE_PIPER_FEEDBACK_HZ", "500"))
         self._last_joint_command = None
         self._last_joint_command_ns = 0
         self._last_gripper_command = None
@@ -193,18 +195,6 @@ class PiperController(ArmController):
         self._append_debug_jsonl(self._gripper_debug_path, record)
         return None
 
-    def _wait_for_message(self, getter, timeout=1.0, interval=0.01, description="message"):
-        start_time = time.monotonic()
-        last_value = None
-
-        while time.monotonic() - start_time < timeout:
-            last_value = getter()
-            if last_value is not None:
-                return last_value
-            time.sleep(interval)
-
-        raise RuntimeError(f"Timed out waiting for Piper {description}.")
-
     def _collect_enable_diagnostics(self):
         arm_status = self.controller.get_arm_status()
         driver_states = [self.controller.get_driver_states(i) for i in range(1, 7)]
@@ -250,37 +240,136 @@ class PiperController(ArmController):
         )
         self._teleop_thread.start()
 
-    def _update_feedback_cache(self, joint):
-        joint = np.asarray(joint, dtype=float)
-        now_ns = time.monotonic_ns()
-        joint_velocity = np.zeros_like(joint)
+    @staticmethod
+    def _message_stamp(message):
+        return getattr(message, "timestamp", None)
+
+    def _feedback_loop(self, stop_event):
+        '''
+        按 XONE_PIPER_FEEDBACK_HZ 读取 SDK 中最新解析的 CAN 反馈, 有新帧时生成新的快照:
+        {"joint", "joint_velocity", "joint_ns", "eef", "eef_ns", "gripper", "gripper_value", "gripper_width", "gripper_ns"}
+        *_ns 为收到该字段新帧时的 time.monotonic_ns(); 关节速度由相邻两帧计算
+        帧自带 timestamp 时只处理时间戳变化的帧, 否则每次读取都作为一帧
+        '''
+        period = 1.0 / self._feedback_hz
+        snapshot = {}
+        stamps = {}
+        next_time = time.monotonic()
+        while not stop_event.is_set():
+            try:
+                joint_msg = self.controller.get_joint_angles()
+                eef_msg = self.controller.get_flange_pose()
+                gripper_msg = self.end_effector.get_gripper_status()
+            except Exception as e:
+                debug_print(self.name, f"feedback read failed: {e}", "WARNING")
+                joint_msg = eef_msg = gripper_msg = None
+            now_ns = time.monotonic_ns()
+            updated = dict(snapshot)
+            changed = False
+
+            if joint_msg is not None and (self._message_stamp(joint_msg) is None
+                                          or self._message_stamp(joint_msg) != stamps.get("joint")):
+                joint = np.asarray(joint_msg.msg, dtype=float)
+                velocity = np.zeros_like(joint)
+                if "joint" in snapshot:
+                    stamp, last_stamp = self._message_stamp(joint_msg), stamps.get("joint")
+                    dt = stamp - last_stamp if stamp is not None and last_stamp is not None \
+                        else (now_ns - snapshot["joint_ns"]) / 1_000_000_000
+                    if dt > 1e-6:
+                        velocity = (joint - snapshot["joint"]) / dt
+                    else:
+                        velocity = snapshot["joint_velocity"]
+                updated.update(joint=joint, joint_velocity=velocity, joint_ns=now_ns)
+                stamps["joint"] = self._message_stamp(joint_msg)
+                changed = True
+                self._maybe_log_joint_tracking(joint)
+
+            if eef_msg is not None and (self._message_stamp(eef_msg) is None
+                                        or self._message_stamp(eef_msg) != stamps.get("eef")):
+                updated.update(eef=np.asarray(eef_msg.msg), eef_ns=now_ns)
+                stamps["eef"] = self._message_stamp(eef_msg)
+                changed = True
+
+            if gripper_msg is not None and (self._message_stamp(gripper_msg) is None
+                                            or self._message_stamp(gripper_msg) != stamps.get("gripper")):
+                gripper_value = getattr(gripper_msg.msg, "value", None)
+                gripper_width = getattr(gripper_msg.msg, "width", None)
+                gripper = gripper_value if gripper_value is not None else gripper_width
+                if gripper is not None:
+                    updated.update(gripper=gripper * 10., gripper_value=gripper_value,
+                                   gripper_width=gripper_width, gripper_ns=now_ns)
+                    stamps["gripper"] = self._message_stamp(gripper_msg)
+                    changed = True
+                    self._maybe_log_gripper_tracking(updated["gripper"])
+                    self._log_gripper_target_update(
+                        source="feedback",
+                        teleop=self.teleop,
+                        raw_value=gripper_value,
+                        raw_width=gripper_width,
+                        scaled_gripper=updated["gripper"],
+                    )
+
+            if changed:
+                snapshot = updated
+                self._feedback = snapshot
+                if not self._feedback_ready.is_set() and all(key in snapshot for key in ("joint", "eef", "gripper")):
+                    self._feedback_ready.set()
+
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def _start_feedback_thread(self):
+        if self._feedback_thread is not None and self._feedback_thread.is_alive():
+            return
+
+        self._feedback_stop_event = threading.Event()
+        self._feedback_thread = threading.Thread(
+            target=self._feedback_loop,
+            args=(self._feedback_stop_event,),
+            name=f"{self.name}-feedback",
+            daemon=True,
+        )
+        self._feedback_thread.start()
 
-        with self._feedback_lock:
-            if self._cached_joint is not None and self._cached_feedback_ns > 0:
-                dt = (now_ns - self._cached_feedback_ns) / 1_000_000_000
-                if dt > 1e-6:
-                    joint_velocity = (joint - self._cached_joint) / dt
-                elif self._cached_joint_velocity is not None:
-                    joint_velocity = self._cached_joint_velocity.copy()
+    def _stop_feedback_thread(self):
+        if self._feedback_stop_event is not None:
+            self._feedback_stop_event.set()
 
-            self._cached_joint = joint.copy()
-            self._cached_joint_velocity = joint_velocity.copy()
-            self._cached_feedback_ns = now_ns
+        if self._feedback_thread is not None:
+            self._feedback_thread.join(timeout=1.0)
+
+        self._feedback_thread = None
+        self._feedback_stop_event = None
+
+    def get_feedback(self, timeout=1.0):
+        '''
+        返回最新的反馈快照 (只读, 不要原地修改), 第一帧完整反馈到达前最多等待 timeout 秒
+        '''
+        snapshot = self._feedback
+        if snapshot is not None and self._feedback_ready.is_set():
+            return snapshot
+        if not self._feedback_ready.wait(timeout):
+            raise RuntimeError("Timed out waiting for Piper feedback.")
+        return self._feedback
 
     def get_cached_feedback(self, max_age_s=None):
-        with self._feedback_lock:
-            if self._cached_joint is None or self._cached_feedback_ns <= 0:
-                return None
+        snapshot = self._feedback
+        if snapshot is None or "joint" not in snapshot:
+            return None
 
-            age_s = (time.monotonic_ns() - self._cached_feedback_ns) / 1_000_000_000
-            if max_age_s is not None and age_s > max_age_s:
-                return None
+        age_s = (time.monotonic_ns() - snapshot["joint_ns"]) / 1_000_000_000
+        if max_age_s is not None and age_s > max_age_s:
+            return None
 
-            return {
-                "joint": self._cached_joint.copy(),
-                "joint_velocities": self._cached_joint_velocity.copy() if self._cached_joint_velocity is not None else np.zeros_like(self._cached_joint),
-                "age_s": age_s,
-            }
+        return {
+            "joint": snapshot["joint"].copy(),
+            "joint_velocities": snapshot["joint_velocity"].copy(),
+            "age_s": age_s,
+        }
 
     def _set_teleop_enabled(self, enabled):
         if self._teleop_event is None:
@@ -331,46 +420,19 @@ class PiperController(ArmController):
 
         self.controller.set_motion_mode()
 
+        self._start_feedback_thread()
         self._start_teleop_thread()
 
         self.change_mode(teleop=teleop)
 
     def get_state(self):
-        state = {}
-
-        joint_msg = self._wait_for_message(
-            self.controller.get_joint_angles,
-            description="joint angles",
-        )
-        joint = joint_msg.msg
-
-        eef = self.controller.get_flange_pose().msg
-
-        gripper_msg = self._wait_for_message(
-            self.end_effector.get_gripper_status,
-            description="gripper status",
-        )
-        gripper_value = getattr(gripper_msg.msg, "value", None)
-        gripper_width = getattr(gripper_msg.msg, "width", None)
-        gripper = gripper_value
-
-        if gripper is None and gripper_width is not None:
-            gripper = gripper_width
-
-        state["joint"] = np.array(joint)
-        state["eef"] = np.array(eef)
-        state["gripper"] = gripper * 10.
-        self._update_feedback_cache(state["joint"])
-        self._maybe_log_joint_tracking(state["joint"])
-        self._maybe_log_gripper_tracking(state["gripper"])
-        self._log_gripper_target_update(
-            source="get_state",
-            teleop=self.teleop,
-            raw_value=gripper_value,
-            raw_width=gripper_width,
-            scaled_gripper=state["gripper"],
-        )
-        return state
+        # 非阻塞读取反馈线程维护的快照
+        snapshot = self.get_feedback()
+        return {
+            "joint": snapshot["joint"].copy(),
+            "eef": snapshot["eef"].copy(),
+            "gripper": snapshot["gripper"],
+        }
 
     def get_teleop_state(self):
         state = self.get_state()
@@ -472,6 +534,7 @@ class PiperController(ArmController):
         try:
             self._close_debug_loggers()
             self._stop_teleop_thread()
+            self._stop_feedback_thread()
             if hasattr(self, "controller"):
                 pass
         except Exception:
@@ -6,6 +6,8 @@ each controller/sensor corresponds to a separate group.
 import os
 
 from robot.utils.base.data_handler import debug_print
+from robot.utils.base.motion_filter import MotionFilter
+from robot.data.manifest import DatasetManifest
 
 import os
 import numpy as np
@@ -13,6 +15,7 @@ import json
 import glob
 import re
 import h5py
+from concurrent.futures import ThreadPoolExecutor
 
 KEY_BANNED = ["timestamp"]
 
@@ -66,12 +69,20 @@ class CollectAny:
         self.episode = []
         self.extra_episode_info = {}
         self.move_check = config.get("move_check", False) if config is not None else False
-        self.last_controller_data = None
         self.resume = resume
         self.handler = None
         self.move_tolerance = config.get("move_tolerance", 0.001)
+        # move_stop_frames > 1 会在停止后多保留几帧, 避免短暂停顿把轨迹切碎
+        self.motion_filter = MotionFilter(
+            tolerance=self.move_tolerance,
+            key_banned=KEY_BANNED,
+            start_frames=config.get("move_start_frames", 1),
+            stop_frames=config.get("move_stop_frames", 1),
+        )
         
         # Initialize episode_index based on resume parameter
+        self._manifest = None
+        self._checksum_executor = None
         if resume and config is not None:
             self.episode_index = self._get_next_episode_index()
         else:
@@ -80,12 +91,27 @@ class CollectAny:
     def _add_data_transform_pipeline(self, handler):
         self.handler = handler
 
+    def _save_dir(self):
+        return os.path.join(self.collect_cfg["save_dir"], self.collect_cfg["task_name"], self.collect_cfg['type'])
+
+    @property
+    def manifest(self):
+        save_dir = self._save_dir()
+        if self._manifest is None or self._manifest.save_dir != save_dir:
+            self._manifest = DatasetManifest(save_dir)
+        return self._manifest
+
     def _get_next_episode_index(self):
-        save_dir = os.path.join(self.collect_cfg["save_dir"], self.collect_cfg["task_name"], self.collect_cfg['type'])
+        save_dir = self._save_dir()
         if not os.path.exists(save_dir):
             debug_print("CollectAny", f"Save path {save_dir} does not exist, starting from episode 0", "INFO")
             return 0
 
+        if self.manifest.exists():
+            next_episode = self.manifest.next_free_index()
+            debug_print("CollectAny", f"Found {len(self.manifest)} episodes in manifest, next free episode id {next_episode}", "INFO")
+            return next_episode
+
         hdf5_files = glob.glob(os.path.join(save_dir, "*.hdf5"))
         if not hdf5_files:
             debug_print("CollectAny", f"No existing hdf5 files found in {save_dir}, starting from episode 0", "INFO")
@@ -105,6 +131,46 @@ class CollectAny:
         debug_print("CollectAny", f"Found {len(hdf5_files)} existing episodes, next free episode id {next_episode}", "INFO")
         return next_episode
 
+    def _episode_duration(self):
+        """用首尾帧的 timestamp (monotonic ns) 估计 episode 时长, 单位秒"""
+        if len(self.episode) < 2:
+            return None
+        durations = []
+        for name, first in self.episode[0].items():
+            last = self.episode[-1].get(name)
+            if isinstance(first, dict) and isinstance(last, dict) and "timestamp" in first and "timestamp" in last:
+                durations.append((int(last["timestamp"]) - int(first["timestamp"])) / 1e9)
+        return max(durations) if durations else None
+
+    def _update_manifest(self, episode_id):
+        try:
+            extra = {"extra": dict(self.extra_episode_info)} if self.extra_episode_info else {}
+            # 转换 pipeline 可能重采样, 此时帧数以输出文件为准
+            self.manifest.record_episode(
+                episode_id,
+                frames=None if self.handler else len(self.episode),
+                duration=self._episode_duration(),
+                checksum=False,
+                **extra,
+            )
+        except Exception as e:
+            # 工具按 manifest 查找 episode, 漏记会让这一条不可见; 标记过期后读取方改为扫描目录
+            debug_print("CollectAny", f"update manifest for episode {episode_id} failed: {e}", "ERROR")
+            self.manifest.mark_stale(f"episode {episode_id}: {e}")
+            return
+
+        # checksum 要完整读一遍输出, 放到后台线程, 不阻塞两次录制之间的 write
+        if self._checksum_executor is None:
+            self._checksum_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="manifest-checksum")
+        self._checksum_executor.submit(self._fill_checksum, self.manifest, episode_id)
+
+    @staticmethod
+    def _fill_checksum(manifest, episode_id):
+        try:
+            manifest.fill_checksum(episode_id)
+        except Exception as e:
+            debug_print("CollectAny", f"checksum for episode {episode_id} failed: {e}", "WARNING")
+
     def collect(self, controllers_data, sensors_data):
         episode_data = {}
         if controllers_data is not None:    
@@ -116,17 +182,10 @@ class CollectAny:
                 episode_data[sensor_name] = sensor_data
         
         if self.move_check:
-            if controllers_data is None:
-                self.episode.append(episode_data)
-            elif self.last_controller_data is None:
-                self.last_controller_data = controllers_data
+            if controllers_data is None or self.motion_filter.update(controllers_data):
                 self.episode.append(episode_data)
             else:
-                if self.move_check_success(controllers_data, tolerance=self.move_tolerance):
-                    self.episode.append(episode_data)
-                else:
-                    debug_print("CollectAny", f"robot is not moving, skip this frame!", "INFO")
-                self.last_controller_data = controllers_data
+                debug_print("CollectAny", f"robot is not moving, skip this frame!", "INFO")
         else:
             self.episode.append(episode_data)
     
@@ -146,7 +205,7 @@ class CollectAny:
         return data
         
     def add_extra_cfg_info(self, extra_info, repeat=True):
-        save_dir = os.path.join(self.collect_cfg["save_dir"], self.collect_cfg["task_name"], self.collect_cfg['type'])
+        save_dir = self._save_dir()
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
         
@@ -175,7 +234,7 @@ class CollectAny:
             json.dump(self.collect_cfg, f, ensure_ascii=False, indent=4)
         
     def write(self, episode_id=None):
-        save_dir = os.path.join(self.collect_cfg["save_dir"], self.collect_cfg["task_name"], self.collect_cfg['type'])
+        save_dir = self._save_dir()
         
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
@@ -216,43 +275,10 @@ class CollectAny:
                             group.create_dataset(item, data=data)
                 
             debug_print("CollectAny", f"write to {hdf5_path}", "INFO")
+        self._update_manifest(id_input)
         self.episode = []
         self.episode_index += 1
-
-    def move_check_success(self, controller_data: dict, tolerance: float) -> bool:
-        for part, current_subdata in controller_data.items():
-            previous_subdata = self.last_controller_data.get(part)
-            if previous_subdata is None:
-                return True
-
-            if isinstance(current_subdata, dict):
-                for key, current_value in current_subdata.items():
-                    if key in KEY_BANNED:
-                        continue
-                    
-                    previous_value = previous_subdata.get(key)
-                    if previous_value is None:
-                        return True 
-
-                    current_arr = np.atleast_1d(current_value)
-                    previous_arr = np.atleast_1d(previous_value)
-
-                    if current_arr.shape != previous_arr.shape:
-                        return True 
-
-                    if np.any(np.abs(current_arr - previous_arr) > tolerance):
-                        return True 
-            else:
-                current_arr = np.atleast_1d(current_subdata)
-                previous_arr = np.atleast_1d(previous_subdata)
-
-                if current_arr.shape != previous_arr.shape:
-                    return True
-
-                if np.any(np.abs(current_arr - previous_arr) > tolerance):
-                    return True
-
-        return False
+        self.motion_filter.reset()
 
     def add_extra_episode_info(self, extra_info):
         self.extra_episode_info.update(extra_info)
@@ -0,0 +1,314 @@
+"""
+Multi-process dataset conversion engine.
+Drives any DATA_TRANSFORM_PIPELINE_REGISTRY entry (or any function with the
+pipeline signature `pipeline(collection, save_path, episode_id, mapping)`)
+straight from HDF5EpisodeReader, one episode per task.
+
+Every converted episode is recorded in the output manifest.jsonl together with
+a cache key built from the source content hash, pipeline name, pipeline version
+and config hash. Re-running a conversion only processes new or changed episodes,
+and an interrupted conversion resumes where it stopped.
+
+Planning only compares the source size/mtime stamp with the manifest, so it never
+reads the source data. The content hash is computed inside the worker task, and only
+for sources whose stamp changed.
+"""
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from multiprocessing import Pool, cpu_count
+
+from tqdm import tqdm
+
+from robot.utils.base.data_handler import debug_print
+from robot.data.manifest import DatasetManifest, path_checksum
+from robot.data.episode_reader import HDF5EpisodeReader
+
+RETRY_LIST_NAME = "fail_episodes.json"
+
+
+def resolve_pipeline(pipeline):
+    if callable(pipeline):
+        return pipeline
+    from robot.robot import DATA_TRANSFORM_PIPELINE_REGISTRY
+    if pipeline not in DATA_TRANSFORM_PIPELINE_REGISTRY:
+        raise ValueError(
+            f"Unknown data transform pipeline '{pipeline}', available: {list(DATA_TRANSFORM_PIPELINE_REGISTRY.keys())}"
+        )
+    return DATA_TRANSFORM_PIPELINE_REGISTRY[pipeline]
+
+
+def pipeline_version(pipeline):
+    from robot.utils.base.data_transform_pipeline import PIPELINE_VERSIONS
+    pipeline = resolve_pipeline(pipeline)
+    return str(getattr(pipeline, "version", PIPELINE_VERSIONS.get(pipeline.__name__, "0")))
+
+
+def json_hash(data):
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def default_episode_id(hdf5_path):
+    return Path(hdf5_path).stem
+
+
+def convert_episode(hdf5_path, pipeline, save_dir, episode_id=None, extra_info_fn=None, condition=None,
+                    checksum=True, cache=None, config=None):
+    '''
+    转换单个 episode 并写入输出 manifest
+    extra_info_fn: hdf5_path -> Dict, 额外的 episode 信息 (instructions/subtasks 等)
+    cache: 由 ConversionEngine 计算的缓存信息, 原样写入 manifest, Dict
+    config: 采集配置, 作为 collection.collect_cfg 传给 pipeline, Dict
+    '''
+    pipeline = resolve_pipeline(pipeline)
+    episode_id = default_episode_id(hdf5_path) if episode_id is None else episode_id
+    os.makedirs(save_dir, exist_ok=True)
+
+    with HDF5EpisodeReader(hdf5_path, condition=condition, collect_cfg=config) as reader:
+        if extra_info_fn is not None:
+            reader.add_extra_episode_info(extra_info_fn(hdf5_path))
+        pipeline(reader, save_dir, episode_id, reader.mapping())
+        extra = dict(reader.extra_episode_info)
+
+    record_extra = {"source": os.path.abspath(hdf5_path)}
+    if extra:
+        record_extra["extra"] = extra
+    if cache:
+        record_extra["cache"] = cache
+    return DatasetManifest(save_dir).record_episode(episode_id, checksum=checksum, **record_extra)
+
+
+# 只用 size/mtime 和转换参数判断是否命中缓存, 不读取源文件内容
+STAMP_KEYS = ("source_size", "source_mtime_ns", "pipeline", "pipeline_version", "config_hash", "extra_hash")
+
+
+def stamp_matches(cache, previous):
+    return bool(previous) and all(cache.get(key) == previous.get(key) for key in STAMP_KEYS)
+
+
+def complete_cache(hdf5_path, cache, previous=None):
+    '''
+    补上源文件内容哈希和 cache_key; size/mtime 与上次记录一致时复用上次的哈希, 否则完整读取源文件
+    '''
+    previous = previous or {}
+    if (previous.get("source_checksum") and previous.get("source_size") == cache["source_size"]
+            and previous.get("source_mtime_ns") == cache["source_mtime_ns"]):
+        source_checksum = previous["source_checksum"]
+    else:
+        source_checksum = path_checksum(hdf5_path)
+    cache = dict(cache, source_checksum=source_checksum)
+    cache["cache_key"] = json_hash([
+        source_checksum, cache["pipeline"], cache["pipeline_version"], cache["config_hash"], cache["extra_hash"],
+    ])
+    return cache
+
+
+def _convert_task(task):
+    '''
+    previous 为 None 时 (resume=False) 不计算内容哈希; 否则在 worker 中计算,
+    内容与上次相同且输出未被修改 (只是 mtime 变了) 时不重新转换, 只刷新 manifest 中的缓存信息
+    返回 (hdf5_path, error, cache_key)
+    '''
+    hdf5_path, kwargs, previous = task
+    cache_key = None
+    try:
+        if previous is not None:
+            kwargs = dict(kwargs, cache=complete_cache(hdf5_path, kwargs["cache"], previous))
+            cache_key = kwargs["cache"]["cache_key"]
+            episode_id = default_episode_id(hdf5_path)
+            manifest = DatasetManifest(kwargs["save_dir"])
+            if previous.get("cache_key") == cache_key and manifest.is_fresh(episode_id):
+                record = manifest.get(episode_id)
+                record["cache"] = kwargs["cache"]
+                manifest.update(record)
+                return hdf5_path, None, cache_key
+        convert_episode(hdf5_path, **kwargs)
+        return hdf5_path, None, cache_key
+    except Exception as e:
+        debug_print("ConversionEngine", f"converting {hdf5_path} Fail: \n{e}", "ERROR")
+        return hdf5_path, f"{type(e).__name__}: {e}", cache_key
+
+
+def write_output_config(save_dir, config, hdf5_path):
+    '''
+    输出目录没有 config.json 时, 按 CollectAny.write 的方式写入 (附带每个 group 的字段列表)
+    '''
+    config_path = os.path.join(save_dir, "config.json")
+    if os.path.exists(config_path) or config is None:
+        return
+    os.makedirs(save_dir, exist_ok=True)
+    config = dict(config)
+    with HDF5EpisodeReader(hdf5_path) as reader:
+        for name, items in reader.mapping().items():
+            config[name] = sorted(items)
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+
+
+def load_retry_list(path):
+    '''
+    读取结构化失败列表, 返回 [{"source", "episode_id", "error", "attempts", "cache_key", "time"}]
+    兼容旧版 fail_episodes.txt (每行一个路径)
+    '''
+    if not os.path.exists(path):
+        return []
+    if path.endswith(".txt"):
+        with open(path, "r", encoding="utf-8") as f:
+            return [{"source": line.strip(), "attempts": 1} for line in f if line.strip()]
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    return json.loads(content).get("failed", []) if content else []
+
+
+class ConversionEngine:
+    '''
+    输入:
+    pipeline: DATA_TRANSFORM_PIPELINE_REGISTRY 的 key 或 pipeline 函数 (多进程时需可 pickle), str | function
+    save_dir: 输出目录, str
+    num_workers: 进程数, 默认 cpu_count(), int
+    extra_info_fn: hdf5_path -> Dict, 模块级函数, function
+    resume: 跳过源文件 size/mtime 和转换参数未变化且输出未被修改的 episode, False 时不计算源文件内容哈希, bool
+    max_tasks_per_child: 每个 worker 处理多少个 episode 后重启, 限制长时间运行的内存增长, int
+    config: 写入输出 config.json 的配置, 同时参与缓存键计算, Dict
+    '''
+    def __init__(self, pipeline, save_dir, num_workers=None, extra_info_fn=None, resume=True,
+                 max_tasks_per_child=16, condition=None, checksum=True, config=None):
+        self.pipeline = pipeline
+        self.save_dir = save_dir
+        self.num_workers = num_workers if num_workers is not None else cpu_count()
+        self.extra_info_fn = extra_info_fn
+        self.resume = resume
+        self.max_tasks_per_child = max_tasks_per_child
+        self.condition = condition
+        self.checksum = checksum
+        self.config = config
+        self.manifest = DatasetManifest(save_dir)
+        self._cache_keys = {}
+
+        # 提前解析, 名字错误时在启动进程池之前报错
+        pipeline_fn = resolve_pipeline(pipeline)
+        self.pipeline_name = pipeline if isinstance(pipeline, str) else pipeline_fn.__name__
+        self.pipeline_version = pipeline_version(pipeline)
+        self.config_hash = json_hash({"config": config, "condition": condition})
+
+    def cache_info(self, hdf5_path):
+        '''
+        缓存信息中不需要读取源文件内容的部分, 内容哈希由 complete_cache 在 worker 中补上
+        '''
+        stat = os.stat(hdf5_path)
+        return {
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "pipeline": self.pipeline_name,
+            "pipeline_version": self.pipeline_version,
+            "config_hash": self.config_hash,
+            "extra_hash": json_hash(self.extra_info_fn(hdf5_path)) if self.extra_info_fn is not None else None,
+        }
+
+    def plan(self, hdf5_paths):
+        '''
+        返回 (todo, skipped): todo 为 [(hdf5_path, cache, previous)], skipped 为缓存命中的路径列表
+        previous 为 manifest 中上次的缓存信息 (resume=False 时为 None, 不计算内容哈希)
+        '''
+        todo, skipped = [], []
+        records = self.manifest.load() if self.resume and self.manifest.exists() else {}
+        for hdf5_path in hdf5_paths:
+            episode_id = default_episode_id(hdf5_path)
+            cache = self.cache_info(hdf5_path)
+            previous = ((records.get(episode_id) or {}).get("cache") or {}) if self.resume else None
+            if self.resume and stamp_matches(cache, previous) and self.manifest.is_fresh(episode_id):
+                skipped.append(hdf5_path)
+            else:
+                todo.append((hdf5_path, cache, previous))
+        return todo, skipped
+
+    def pending(self, hdf5_paths):
+        return [hdf5_path for hdf5_path, _, _ in self.plan(hdf5_paths)[0]]
+
+    def _task_kwargs(self, cache):
+        return {
+            "pipeline": self.pipeline,
+            "save_dir": self.save_dir,
+            "extra_info_fn": self.extra_info_fn,
+            "condition": self.condition,
+            "checksum": self.checksum,
+            "cache": cache,
+            "config": self.config,
+        }
+
+    def run(self, hdf5_paths, desc="Converting episodes"):
+        '''
+        返回 (converted, failed): converted 为成功转换的路径列表, failed 为 {hdf5_path: error}
+        '''
+        hdf5_paths = list(hdf5_paths)
+        todo, skipped = self.plan(hdf5_paths)
+        if skipped:
+            debug_print("ConversionEngine", f"cache hit: skip {len(skipped)} unchanged episodes, {len(todo)} left", "INFO")
+        self._cache_keys = {}
+        if not todo:
+            return [], {}
+
+        write_output_config(self.save_dir, self.config, todo[0][0])
+
+        start = time.monotonic()
+        tasks = [(hdf5_path, self._task_kwargs(cache), previous) for hdf5_path, cache, previous in todo]
+        converted, failed = [], {}
+
+        num_workers = max(1, min(self.num_workers, len(todo)))
+        debug_print("ConversionEngine", f"Starting parallel processing with {num_workers} workers...", "INFO")
+        if num_workers == 1:
+            results = map(_convert_task, tasks)
+            for hdf5_path, error, cache_key in tqdm(results, total=len(tasks), desc=desc):
+                self._cache_keys[hdf5_path] = cache_key
+                _collect_result(hdf5_path, error, converted, failed)
+        else:
+            with Pool(num_workers, maxtasksperchild=self.max_tasks_per_child) as pool:
+                for hdf5_path, error, cache_key in tqdm(pool.imap_unordered(_convert_task, tasks), total=len(tasks), desc=desc):
+                    self._cache_keys[hdf5_path] = cache_key
+                    _collect_result(hdf5_path, error, converted, failed)
+
+        debug_print(
+            "ConversionEngine",
+            f"converted {len(converted)} episodes, {len(failed)} failed in {time.monotonic() - start:.1f}s",
+            "INFO",
+        )
+        return converted, failed
+
+    def write_retry_list(self, failed, path=None):
+        '''
+        写入结构化失败列表 (默认 save_dir/fail_episodes.json), attempts 在多次重试间累加
+        '''
+        path = path if path is not None else os.path.join(self.save_dir, RETRY_LIST_NAME)
+        previous = {item["source"]: item for item in load_retry_list(path)}
+        items = []
+        for hdf5_path, error in sorted(failed.items()):
+            source = os.path.abspath(hdf5_path)
+            items.append({
+                "source": source,
+                "episode_id": default_episode_id(hdf5_path),
+                "error": error,
+                "attempts": previous.get(source, {}).get("attempts", 0) + 1,
+                "cache_key": self._cache_keys.get(hdf5_path),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "pipeline": self.pipeline_name,
+                "pipeline_version": self.pipeline_version,
+                "config_hash": self.config_hash,
+                "failed": items,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _collect_result(hdf5_path, error, converted, failed):
+    if error is None:
+        converted.append(hdf5_path)
+    else:
+        failed[hdf5_path] = error
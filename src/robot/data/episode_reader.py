@@ -0,0 +1,111 @@
+"""
+Lazy, read-only view of a recorded episode.
+It exposes the same get_item/mapping interface as CollectAny, so every
+data_transform_pipeline can read columns straight from disk instead of
+replaying frames through CollectAny.collect.
+"""
+import numpy as np
+import h5py
+
+from robot.utils.base.data_handler import debug_print
+
+
+class HDF5EpisodeReader:
+    '''
+    按列懒加载 CollectAny 保存的 HDF5 episode (每个 controller/sensor 一个 group)
+    输入:
+    hdf5_path: episode 路径, str
+    condition: 兼容旧 pipeline 的 collection.condition, Dict
+    collect_cfg: 与 CollectAny.collect_cfg 相同, pipeline 从中读取 video 等导出参数, Dict
+    '''
+    def __init__(self, hdf5_path, condition=None, collect_cfg=None):
+        self.hdf5_path = hdf5_path
+        self.condition = condition if condition is not None else {}
+        self.collect_cfg = collect_cfg
+        self.extra_episode_info = {}
+        self.file = h5py.File(hdf5_path, "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        length = 0
+        for name in self.file.keys():
+            group = self.file[name]
+            if isinstance(group, h5py.Group):
+                for item in group.values():
+                    if isinstance(item, h5py.Dataset) and item.shape:
+                        length = max(length, item.shape[0])
+        return length
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def keys(self):
+        return list(self.file.keys())
+
+    def mapping(self):
+        """与 CollectAny.write 传给 pipeline 的 mapping 相同: {group: set(items)}"""
+        mapping = {}
+        for name, group in self.file.items():
+            if isinstance(group, h5py.Group):
+                mapping[name] = set(group.keys())
+        return mapping
+
+    def has_item(self, name, item):
+        return name in self.file and item in self.file[name]
+
+    def get_item(self, name, item):
+        if not self.has_item(name, item):
+            debug_print("HDF5EpisodeReader", f"item {item} not in {name}", "ERROR")
+            return None
+        return self.file[name][item][()]
+
+    def column(self, name, item):
+        """不读取数据的列视图 (h5py.Dataset), 支持 len 和切片, 切片时才从磁盘读取"""
+        if not self.has_item(name, item):
+            debug_print("HDF5EpisodeReader", f"item {item} not in {name}", "ERROR")
+            return None
+        return self.file[name][item]
+
+    def iter_item(self, name, item, chunk_size=256):
+        """按块读取一列, 内存占用与 chunk_size 成正比"""
+        if not self.has_item(name, item):
+            debug_print("HDF5EpisodeReader", f"item {item} not in {name}", "ERROR")
+            return
+        dataset = self.file[name][item]
+        for start in range(0, dataset.shape[0], chunk_size):
+            yield dataset[start:start + chunk_size]
+
+    def get_items(self, name, items):
+        return {item: self.get_item(name, item) for item in items}
+
+    def add_extra_episode_info(self, extra_info):
+        self.extra_episode_info.update(extra_info)
+
+
+def read_columns(hdf5_path, groups=None, skip_items=None):
+    '''
+    只读取指定 group 的列数据, 返回 {group: {item: np.ndarray}}
+    groups: 需要读取的 group 名称, None 表示全部, List[str]
+    skip_items: 不读取的字段 (例如 color/depth), List[str]
+    '''
+    skip_items = skip_items if skip_items is not None else []
+    columns = {}
+    with h5py.File(hdf5_path, "r") as f:
+        for name, group in f.items():
+            if groups is not None and name not in groups:
+                continue
+            if not isinstance(group, h5py.Group):
+                continue
+            columns[name] = {
+                item: np.asarray(dataset[()])
+                for item, dataset in group.items()
+                if isinstance(dataset, h5py.Dataset) and item not in skip_items
+            }
+    return columns
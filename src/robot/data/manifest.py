@@ -0,0 +1,414 @@
+"""
+Dataset manifest: one JSON record per episode in `manifest.jsonl`, stored next to config.json.
+Writers (CollectAny.write, conversion tools) upsert a record after an episode is saved,
+readers (episode index discovery, visualizers, conversion tools) query it instead of
+globbing and opening every file.
+
+record:
+    episode_id: str, episode id used in the file name
+    path: str, episode file or directory, relative to the manifest directory
+    frames: int, number of frames
+    duration: float, seconds between first and last frame (None if unknown)
+    size: int, bytes on disk
+    checksum: str, "blake2b:<hex>" of the file content (sorted files for a directory),
+              None until filled in (CollectAny computes it in the background)
+    mtime: float, modification time of the output when the record was written
+    streams: {"group/dataset": {"shape": [...], "dtype": str, "codec": str}}
+
+After every write the mtime of manifest.jsonl is set to the mtime of its directory.
+A directory that is newer than the manifest has gained or lost entries since then:
+readers scan it for unlisted episodes, and the next write registers them.
+"""
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import argparse
+from contextlib import contextmanager
+
+import h5py
+
+from robot.utils.base.data_handler import debug_print
+
+MANIFEST_NAME = "manifest.jsonl"
+# 更新 manifest 失败时留下的标记, 读取方看到后直接扫描目录, rebuild_manifest 后清除
+STALE_NAME = f".{MANIFEST_NAME}.stale"
+CHECKSUM_CHUNK = 1 << 20
+
+VIDEO_CODECS = {
+    ".mp4": "mp4",
+    ".mkv": "mkv",
+    ".avi": "avi",
+}
+
+
+def file_checksum(path, hasher=None):
+    hasher = hasher if hasher is not None else hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHECKSUM_CHUNK)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher
+
+
+def path_checksum(path):
+    if os.path.isdir(path):
+        hasher = hashlib.blake2b(digest_size=16)
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                hasher.update(os.path.relpath(os.path.join(root, name), path).encode("utf-8"))
+                file_checksum(os.path.join(root, name), hasher)
+    else:
+        hasher = file_checksum(path)
+    return f"blake2b:{hasher.hexdigest()}"
+
+
+def path_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+def _dataset_codec(dataset):
+    if dataset.compression is not None:
+        return dataset.compression
+    if dataset.dtype.kind in ("S", "O") and dataset.shape and dataset.shape[0] > 0:
+        head = bytes(dataset[0])[:4]
+        if head.startswith(b"\xff\xd8"):
+            return "jpeg"
+        if head.startswith(b"\x89PNG"):
+            return "png"
+        return "bytes"
+    return "raw"
+
+
+def describe_hdf5(hdf5_path, prefix=""):
+    """只读取 HDF5 元数据 (shape/dtype/压缩方式), 不解码数据"""
+    streams = {}
+    with h5py.File(hdf5_path, "r") as f:
+        def collect(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                streams[f"{prefix}{name}"] = {
+                    "shape": list(obj.shape),
+                    "dtype": str(obj.dtype),
+                    "codec": _dataset_codec(obj),
+                }
+        f.visititems(collect)
+    return streams
+
+
+def describe_path(path):
+    if not os.path.isdir(path):
+        return describe_hdf5(path)
+
+    streams = {}
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            rel = os.path.relpath(file_path, path)
+            stem, ext = os.path.splitext(rel)
+            if ext in (".hdf5", ".h5"):
+                streams.update(describe_hdf5(file_path, prefix=f"{stem}/"))
+            elif ext in VIDEO_CODECS:
+                streams[stem] = {"shape": None, "dtype": "uint8", "codec": VIDEO_CODECS[ext]}
+    return streams
+
+
+def _frames_from_streams(streams):
+    frames = 0
+    for info in streams.values():
+        shape = info.get("shape")
+        if shape:
+            frames = max(frames, shape[0])
+    return frames
+
+
+def find_episode_output(save_dir, episode_id):
+    """返回 episode 在磁盘上的输出: {id}.hdf5 或 episode{id}/ (X_one_format_pipeline)"""
+    for candidate in (f"{episode_id}.hdf5", f"{episode_id}.h5", f"episode{episode_id}"):
+        path = os.path.join(save_dir, candidate)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def describe_episode(save_dir, episode_id, path=None, frames=None, duration=None, checksum=True):
+    path = path if path is not None else find_episode_output(save_dir, episode_id)
+    if path is None:
+        raise FileNotFoundError(f"No output found for episode {episode_id} in {save_dir}")
+
+    streams = describe_path(path)
+    return {
+        "episode_id": str(episode_id),
+        "path": os.path.relpath(path, save_dir),
+        "frames": int(frames) if frames is not None else _frames_from_streams(streams),
+        "duration": duration,
+        "size": path_size(path),
+        "checksum": path_checksum(path) if checksum else None,
+        "mtime": os.path.getmtime(path),
+        "streams": streams,
+    }
+
+
+class DatasetManifest:
+    '''
+    save_dir 下 manifest.jsonl 的读写
+    输入:
+    save_dir: 数据目录, 与 config.json 同级, str
+    '''
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, MANIFEST_NAME)
+        self.stale_path = os.path.join(save_dir, STALE_NAME)
+        self._records = None
+        self._stamp = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def is_stale(self):
+        return os.path.exists(self.stale_path)
+
+    def mark_stale(self, reason):
+        """manifest 缺少已写入的 episode, 读取方应扫描目录, 直到 rebuild_manifest"""
+        os.makedirs(self.save_dir, exist_ok=True)
+        with open(self.stale_path, "a", encoding="utf-8") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {reason}\n")
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.save_dir, exist_ok=True)
+        with open(os.path.join(self.save_dir, f".{MANIFEST_NAME}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    debug_print("DatasetManifest", f"skip broken line {line_no} in {self.path}: {exc}", "WARNING")
+                    continue
+                records[str(record["episode_id"])] = record
+        return records
+
+    def _write(self, records):
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in sorted(records.values(), key=_record_sort_key):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # 记下写入时目录的 mtime, 见 is_current
+        dir_mtime = os.stat(self.save_dir).st_mtime_ns
+        os.utime(self.path, ns=(dir_mtime, dir_mtime))
+        self._records = records
+        self._stamp = self._file_stamp()
+
+    def is_current(self):
+        """上次写入 manifest 之后目录中没有新增/删除条目 (只比较 mtime, 不扫描目录)"""
+        try:
+            return os.stat(self.save_dir).st_mtime_ns <= os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+    def _add_unlisted(self, records):
+        '''
+        目录在上次写入之后有变化时, 把磁盘上没有登记的 episode 补进 records (不计算 checksum)
+        没有 manifest 的旧数据集第一次写入时, 已有的 episode 也由这里登记
+        '''
+        if self.is_current():
+            return
+        unlisted = scan_episodes(self.save_dir, checksum=False, skip=records.keys())
+        if unlisted:
+            debug_print("DatasetManifest", f"add {len(unlisted)} unlisted episodes to {self.path}", "INFO")
+            records.update(unlisted)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """返回 {episode_id: record}, 文件未变化时复用缓存"""
+        stamp = self._file_stamp()
+        if self._records is None or stamp != self._stamp:
+            self._records = self._read()
+            self._stamp = stamp
+        return self._records
+
+    def records(self):
+        return sorted(self.load().values(), key=_record_sort_key)
+
+    def get(self, episode_id):
+        return self.load().get(str(episode_id))
+
+    def __contains__(self, episode_id):
+        return str(episode_id) in self.load()
+
+    def __len__(self):
+        return len(self.load())
+
+    def update(self, record):
+        """原子地插入/覆盖一条记录 (文件锁 + 临时文件 + os.replace)"""
+        with self._locked():
+            records = self._read()
+            records[str(record["episode_id"])] = record
+            self._add_unlisted(records)
+            self._write(records)
+
+    def remove(self, episode_id):
+        with self._locked():
+            records = self._read()
+            if records.pop(str(episode_id), None) is not None:
+                self._add_unlisted(records)
+                self._write(records)
+
+    def record_episode(self, episode_id, path=None, frames=None, duration=None, checksum=True, **extra):
+        record = describe_episode(self.save_dir, episode_id, path=path, frames=frames, duration=duration, checksum=checksum)
+        record.update(extra)
+        self.update(record)
+        return record
+
+    def fill_checksum(self, episode_id):
+        """为已有记录补上 checksum; 计算期间输出被修改 (mtime 变化) 时放弃, 返回 checksum 或 None"""
+        record = self.get(episode_id)
+        if record is None:
+            return None
+        checksum = path_checksum(os.path.join(self.save_dir, record["path"]))
+        with self._locked():
+            records = self._read()
+            current = records.get(str(episode_id))
+            if current is None or current.get("mtime") != record.get("mtime"):
+                return None
+            current["checksum"] = checksum
+            self._add_unlisted(records)
+            self._write(records)
+        return checksum
+
+    def episode_paths(self):
+        return [os.path.join(self.save_dir, record["path"]) for record in self.records()]
+
+    def numeric_ids(self):
+        ids = set()
+        for episode_id in self.load().keys():
+            if re.fullmatch(r"\d+", episode_id):
+                ids.add(int(episode_id))
+        return ids
+
+    def next_free_index(self, start=0):
+        existing = self.numeric_ids()
+        next_episode = start
+        # manifest 之外手动拷入的文件也不能被覆盖
+        while next_episode in existing or find_episode_output(self.save_dir, next_episode) is not None:
+            next_episode += 1
+        return next_episode
+
+    def is_fresh(self, episode_id):
+        """记录存在且输出文件在记录之后未被修改"""
+        record = self.get(episode_id)
+        if record is None:
+            return False
+        path = os.path.join(self.save_dir, record["path"])
+        return os.path.exists(path) and os.path.getmtime(path) == record.get("mtime")
+
+
+def _record_sort_key(record):
+    episode_id = str(record["episode_id"])
+    return (0, int(episode_id), "") if episode_id.isdigit() else (1, 0, episode_id)
+
+
+def _scan_episode_files(folder_path, extensions, recursive):
+    files = []
+    if recursive:
+        for root, _, names in os.walk(folder_path):
+            files.extend(os.path.join(root, name) for name in names if name.endswith(extensions))
+    else:
+        files = [os.path.join(folder_path, name) for name in os.listdir(folder_path) if name.endswith(extensions)]
+    return sorted(files)
+
+
+def list_episode_files(folder_path, extensions=(".hdf5", ".h5"), recursive=False):
+    '''
+    按 manifest.jsonl 的顺序返回 episode 文件; 目录在 manifest 写入之后有变化时, 再补上没有登记的文件
+    没有 manifest 或 manifest 被标记为过期时只扫描目录
+    '''
+    manifest = DatasetManifest(folder_path)
+    if not manifest.exists():
+        return _scan_episode_files(folder_path, extensions, recursive)
+    if manifest.is_stale():
+        debug_print("DatasetManifest", f"{manifest.path} is stale, scanning directory (run rebuild_manifest to fix)", "WARNING")
+        return _scan_episode_files(folder_path, extensions, recursive)
+
+    listed = [path for path in manifest.episode_paths() if path.endswith(extensions)]
+    if manifest.is_current():
+        return listed
+    files = _scan_episode_files(folder_path, extensions, recursive)
+    known = {os.path.normpath(path) for path in listed}
+    unlisted = [path for path in files if os.path.normpath(path) not in known]
+    if unlisted:
+        debug_print("DatasetManifest", f"{len(unlisted)} episode files in {folder_path} are not in the manifest", "WARNING")
+    return listed + unlisted
+
+
+def scan_episodes(save_dir, checksum=True, skip=()):
+    """扫描目录中的 episode 输出 ({id}.hdf5 / episode{id}/), 返回 {episode_id: record}, 跳过 skip 中的 id"""
+    skip = set(skip)
+    records = {}
+    if not os.path.isdir(save_dir):
+        return records
+    for name in sorted(os.listdir(save_dir)):
+        match = re.fullmatch(r"(?:episode)?(.+?)(\.hdf5|\.h5)?", name)
+        path = os.path.join(save_dir, name)
+        if name.endswith((".hdf5", ".h5")) or (os.path.isdir(path) and name.startswith("episode")):
+            episode_id = match.group(1)
+            if episode_id in skip:
+                continue
+            try:
+                records[episode_id] = describe_episode(save_dir, episode_id, path=path, checksum=checksum)
+            except Exception as e:
+                debug_print("DatasetManifest", f"skip {path}: {e}", "WARNING")
+    return records
+
+
+def rebuild_manifest(save_dir, checksum=True):
+    """扫描已有数据 (没有 manifest 的旧数据集, 或被标记为过期的 manifest) 重建 manifest.jsonl"""
+    records = scan_episodes(save_dir, checksum=checksum)
+    manifest = DatasetManifest(save_dir)
+    with manifest._locked():
+        if manifest.is_stale():
+            os.remove(manifest.stale_path)
+        manifest._write(records)
+    debug_print("DatasetManifest", f"rebuilt {manifest.path} with {len(records)} episodes", "INFO")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild manifest.jsonl for an existing dataset directory.")
+    parser.add_argument("save_dir", type=str, help="directory containing config.json and episodes")
+    parser.add_argument("--no_checksum", action="store_true", help="skip content checksums")
+    args = parser.parse_args()
+    start = time.monotonic()
+    rebuild_manifest(args.save_dir, checksum=not args.no_checksum)
+    debug_print("DatasetManifest", f"done in {time.monotonic() - start:.2f}s", "INFO")
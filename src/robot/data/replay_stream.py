@@ -0,0 +1,255 @@
+"""
+Streaming episode replay.
+Only controller columns are read from the HDF5 episode (camera/tactile groups are
+never touched). Commands are scheduled by the recorded controller timestamps with
+gaps removed, optionally sped up and resampled to the controller rate. A prefetch thread reads fixed-size chunks into a bounded queue, so
+replay starts after the first chunk and memory stays proportional to
+chunk_size * prefetch. Bias is added to whole chunks once, and the per-frame
+commands (dicts of row views into the chunk arrays) are built in the prefetch thread.
+"""
+import time
+import queue
+import threading
+
+import h5py
+import numpy as np
+
+from robot.utils.base.data_handler import debug_print
+
+TIMESTAMP_KEY = "timestamp"
+GAP_FACTOR = 5
+
+
+class DeadlineClock:
+    '''
+    以绝对截止时间计时: 第 i 次 wait 在 start + i * interval (或给定的 offset 秒) 返回, 不会累积 sleep 误差
+    落后超过 max_lag 个周期时整体顺延, 避免追赶时连续突发发送
+    '''
+    def __init__(self, fps, max_lag=1):
+        self.interval = 1.0 / fps
+        self.max_lag = max_lag
+        self.late_ticks = 0
+        self._start = None
+        self._ticks = 0
+
+    def start(self):
+        self._start = time.monotonic()
+        self._ticks = 0
+
+    def wait(self, offset=None):
+        if self._start is None:
+            self.start()
+        if offset is None:
+            offset = self._ticks * self.interval
+        self._ticks += 1
+        delay = self._start + offset - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > self.max_lag * self.interval:
+            self.late_ticks += 1
+            self._start -= delay
+
+
+def warp_timeline(timestamps, max_gap=None):
+    '''
+    把录制时间戳转换为从 0 开始的秒数, 并把超过 max_gap 的间隔 (move_check 丢帧等) 压缩为正常间隔
+    timestamps: Controller.get 记录的 time.monotonic_ns() (整数) 或秒 (浮点), np.ndarray
+    max_gap: 视为断档的间隔 (秒), None 时取中位间隔的 GAP_FACTOR 倍, float
+    返回 (timeline, gaps): timeline 单调递增, gaps 为被压缩的断档数
+    '''
+    timestamps = np.asarray(timestamps)
+    scale = 1e-9 if np.issubdtype(timestamps.dtype, np.integer) else 1.0
+    seconds = (timestamps - timestamps[0]).astype(np.float64) * scale
+    if len(seconds) < 2:
+        return seconds, 0
+
+    intervals = np.diff(seconds)
+    nominal = float(np.median(intervals[intervals > 0])) if np.any(intervals > 0) else 0.0
+    if nominal <= 0:
+        raise ValueError("timestamps do not increase")
+    max_gap = GAP_FACTOR * nominal if max_gap is None else max_gap
+    gaps = intervals > max_gap
+    intervals[gaps] = nominal
+    # 时间戳相同或回退的帧给一个极小间隔, 保证插值时间轴严格递增
+    intervals = np.maximum(intervals, nominal * 1e-3)
+    return np.concatenate([[0.0], np.cumsum(intervals)]), int(gaps.sum())
+
+
+class ReplayStream:
+    '''
+    按块预读 episode 中的 controller 列, 逐条生成 {controller_name: {key: np.ndarray}}
+    命令的发送时间 (相对回放开始的秒数) 在 self.times 中, 与迭代顺序一一对应
+    输入:
+    hdf5_path: episode 路径, str
+    controller_names: 需要回放的 controller 名称 (即 HDF5 group 名), List[str]
+    key_banned: 不发送给 controller 的字段 (例如 eef), List[str]
+    bias: Robot.bias, {controller_name: {key: value}}, Dict
+    chunk_size: 每次生成的命令条数, int
+    prefetch: 队列中最多缓存的块数, int
+    fps: 没有录制时间戳 (或 use_timestamps=False) 时的帧率, float
+    speed: 回放倍速, 2.0 表示两倍速, float
+    rate: 重采样后的命令频率 (例如 Piper 的 200Hz), 浮点字段线性插值, None 表示逐帧发送录制数据, float
+    use_timestamps: 按录制时间戳调度, bool
+    max_gap: 超过该间隔 (秒) 的断档被跳过, None 时取中位间隔的 GAP_FACTOR 倍, float
+    '''
+    def __init__(self, hdf5_path, controller_names, key_banned=None, bias=None, chunk_size=64, prefetch=4,
+                 fps=30, speed=1.0, rate=None, use_timestamps=True, max_gap=None):
+        if speed <= 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.hdf5_path = hdf5_path
+        self.key_banned = set(key_banned or []) | {TIMESTAMP_KEY}
+        self.bias = bias or {}
+        self.chunk_size = max(1, int(chunk_size))
+
+        timestamps = None
+        with h5py.File(hdf5_path, "r") as f:
+            self.columns = {}
+            lengths = set()
+            for name in controller_names:
+                if name not in f or not isinstance(f[name], h5py.Group):
+                    continue
+                keys = [
+                    key for key, dataset in f[name].items()
+                    if isinstance(dataset, h5py.Dataset) and dataset.shape and key not in self.key_banned
+                ]
+                if keys:
+                    self.columns[name] = keys
+                    lengths.update(f[name][key].shape[0] for key in keys)
+                    if use_timestamps and timestamps is None and TIMESTAMP_KEY in f[name]:
+                        # 同一帧内各 controller 同时采集, 取第一个 controller 的时间戳作为帧时间轴
+                        timestamps = f[name][TIMESTAMP_KEY][()]
+            if not self.columns:
+                raise ValueError(f"no controller data for {list(controller_names)} in {hdf5_path}")
+            if len(lengths) > 1:
+                debug_print("ReplayStream", f"controller columns have different lengths {sorted(lengths)}, "
+                                            f"replay the shortest one", "WARNING")
+            self.length = min(lengths)
+            self.float_keys = {
+                name: {key for key in keys if np.issubdtype(f[name][key].dtype, np.floating)}
+                for name, keys in self.columns.items()
+            }
+
+        # positions: 每条命令对应的 (小数) 帧位置, times: 每条命令的发送时间
+        self.positions = np.zeros(0, dtype=np.float64)
+        self.times = np.zeros(0, dtype=np.float64)
+        self.rate = fps * speed
+        if self.length == 0:
+            # 空 episode 不生成命令, 由调用方决定是否跳过
+            debug_print("ReplayStream", f"no controller rows in {hdf5_path}", "WARNING")
+        else:
+            self._schedule(hdf5_path, timestamps, fps, speed, rate, use_timestamps, max_gap)
+
+        self._queue = queue.Queue(maxsize=max(1, int(prefetch)))
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    def _schedule(self, hdf5_path, timestamps, fps, speed, rate, use_timestamps, max_gap):
+        '''
+        由录制时间戳 (或 fps) 计算 positions / times / rate, 只在 episode 非空时调用
+        '''
+        timeline = None
+        if timestamps is not None and len(timestamps) >= self.length > 1:
+            try:
+                timeline, gaps = warp_timeline(timestamps[:self.length], max_gap)
+                if gaps:
+                    debug_print("ReplayStream", f"skip {gaps} gaps in {hdf5_path}", "INFO")
+            except ValueError as e:
+                # 时间戳全部相同/从不增加时退回按 fps 等间隔回放
+                debug_print("ReplayStream", f"unusable timestamps in {hdf5_path} ({e}), replay at {fps} fps", "WARNING")
+        elif use_timestamps:
+            debug_print("ReplayStream", f"no timestamp in {hdf5_path}, replay at {fps} fps", "WARNING")
+        if timeline is None:
+            timeline = np.arange(self.length, dtype=np.float64) / fps
+
+        if rate is None:
+            self.positions = np.arange(self.length, dtype=np.float64)
+            self.times = timeline / speed
+            duration = self.times[-1] if self.length > 1 else 0.0
+            self.rate = (self.length - 1) / duration if duration > 0 else fps * speed
+        else:
+            self.times = np.arange(0.0, timeline[-1] / speed + 0.5 / rate, 1.0 / rate)
+            self.positions = np.interp(self.times * speed, timeline, np.arange(self.length, dtype=np.float64))
+            self.rate = rate
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _read_chunk(self, f, start):
+        positions = self.positions[start:start + self.chunk_size]
+        base = np.minimum(np.floor(positions).astype(np.int64), self.length - 1)
+        frac = positions - base
+        first, last = int(base[0]), min(int(base[-1]) + 1, self.length - 1)
+        index = base - first
+        upper = np.minimum(index + 1, last - first)
+
+        chunk = {}
+        for name, keys in self.columns.items():
+            group = f[name]
+            chunk[name] = {}
+            for key in keys:
+                rows = group[key][first:last + 1]
+                if key in self.float_keys[name]:
+                    weight = frac.reshape((-1,) + (1,) * (rows.ndim - 1))
+                    values = rows[index] + weight * (rows[upper] - rows[index])
+                else:
+                    values = rows[np.where(frac < 0.5, index, upper)]
+                offset = self.bias.get(name, {}).get(key)
+                if offset is not None:
+                    values = values + np.asarray(offset, dtype=values.dtype)
+                chunk[name][key] = values
+        # 在预读线程中把整块拆成逐条命令, 回放循环只需取出并发送
+        return [
+            {name: {key: values[i] for key, values in keys.items()} for name, keys in chunk.items()}
+            for i in range(len(positions))
+        ]
+
+    def _prefetch(self):
+        try:
+            with h5py.File(self.hdf5_path, "r") as f:
+                for start in range(0, len(self.positions), self.chunk_size):
+                    commands = self._read_chunk(f, start)
+                    while not self._stop.is_set():
+                        try:
+                            self._queue.put(commands, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if self._stop.is_set():
+                        return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(None)
+    def start(self):
+        self._thread = threading.Thread(target=self._prefetch, name="replay-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            # 释放可能阻塞在 put 上的预读线程
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        if self._thread is None:
+            self.start()
+        while True:
+            commands = self._queue.get()
+            if commands is None:
+                break
+            yield from commands
+        if self.error is not None:
+            raise self.error
@@ -1,7 +1,10 @@
 from typing import Dict, Any
 import time
 from robot.data.collect_any import CollectAny
-from robot.utils.base.data_handler import debug_print, hdf5_groups_to_dict, dict_to_list
+from robot.utils.base.data_handler import debug_print
+from robot.utils.base.motion_filter import MotionFilter
+from robot.data.replay_stream import ReplayStream, DeadlineClock
+from robot.utils.base.action_chunk import ActionChunk
 import os
 import glob
 import random
@@ -34,9 +37,16 @@ class Robot:
             debug_print(self.name, f"set collect_cfg: \n {collect_cfg}", "INFO")
             self.collector = CollectAny(collect_cfg)
         
-        self.last_controller_data = None
         self.move_tolerance = self.robot_config.get("move_tolerance", 0.01)
+        # is_move 与上一次检测到运动的状态比较, 缓慢漂移也能被累积识别
+        self.motion_filter = MotionFilter(
+            tolerance=self.move_tolerance,
+            key_banned=KEY_BANNED,
+            stop_frames=self.robot_config.get("move_stop_frames", 1),
+            reference="moved",
+        )
         self.bias = self.robot_config.get("bias", None)
+        self._chunk_plans = {}
 
     def set_up(self):
         for controller_type in self.controllers.keys():
@@ -99,20 +109,50 @@ class Robot:
     def move(self, move_data, key_banned=None):
         if move_data is None:
             return
+        if isinstance(move_data, ActionChunk):
+            self.move_chunk(move_data, key_banned=key_banned)
+            return
         
         for controller_type_name, controller_type in move_data.items():
             for controller_name, controller_action in controller_type.items():
                 if self.bias:
                     if controller_name in self.bias.keys():
+                        # 不修改调用方传入的 dict
+                        controller_action = dict(controller_action)
                         for k in self.bias[controller_name].keys():
                             if k in controller_action.keys():
-                                controller_action[k] += self.bias[controller_name][k]
+                                controller_action[k] = controller_action[k] + self.bias[controller_name][k]
                 if key_banned is None:        
                     self.controllers[controller_type_name][controller_name].move(controller_action, is_delta=False)
                 else:
                     controller_action = remove_duplicate_keys(controller_action, key_banned)
                     self.controllers[controller_type_name][controller_name].move(controller_action, is_delta=False)
 
+    def move_chunk(self, chunk, index=0, key_banned=None):
+        '''
+        ActionChunk 快速路径: 取第 index 行, bias 以向量加法一次完成, 按 layout 切片分发给各 controller
+        '''
+        targets, bias = self._chunk_plan(chunk.layout, key_banned)
+        row = chunk.actions[index]
+        if bias is not None:
+            row = row + bias
+        for controller, keys in targets:
+            controller.move({key: row[start] if scalar else row[start:stop] for key, start, stop, scalar in keys},
+                            is_delta=False)
+
+    def _chunk_plan(self, layout, key_banned=None):
+        # 同一 layout 的分发目标和 bias 向量只计算一次
+        cache_key = (layout, tuple(key_banned or ()))
+        plans = self._chunk_plans
+        if cache_key not in plans:
+            targets = [
+                (self.controllers[controller_type][controller_name], keys)
+                for controller_type, controller_name, keys in layout.controllers(key_banned)
+            ]
+            bias = layout.vector(self.bias) if self.bias else None
+            plans[cache_key] = (targets, bias)
+        return plans[cache_key]
+
     def move_blocking(self, move_data, check_freq=30, key_banned=None):
         stop_num =0
         self.move(move_data, key_banned=key_banned)
@@ -137,70 +177,57 @@ class Robot:
 
         return True
     
-    def is_move(self):
+    def get_controller_data(self):
         controller_data = {}
         for type_name, controller_type in self.controllers.items():
             for controller_name, controller in controller_type.items():
                 controller_data[controller_name] = controller.get()
-        
-        if self.last_controller_data is None:
-            self.last_controller_data = controller_data
-            return True
-        else:
-            for part, current_subdata in controller_data.items():
-                previous_subdata = self.last_controller_data.get(part)
-                if previous_subdata is None:
-                    return True
-
-                if isinstance(current_subdata, dict):
-                    for key, current_value in current_subdata.items():
-                        if key in KEY_BANNED:
-                            continue
-                        
-                        previous_value = previous_subdata.get(key)
-                        if previous_value is None:
-                            return True 
-
-                        current_arr = np.atleast_1d(current_value)
-                        previous_arr = np.atleast_1d(previous_value)
-
-                        if current_arr.shape != previous_arr.shape:
-                            self.last_controller_data = controller_data
-                            return True 
-
-                        if np.any(np.abs(current_arr - previous_arr) > self.move_tolerance):
-                            self.last_controller_data = controller_data
-                            return True 
-                else:
-                    current_arr = np.atleast_1d(current_subdata)
-                    previous_arr = np.atleast_1d(previous_subdata)
-
-                    if current_arr.shape != previous_arr.shape:
-                        self.last_controller_data = controller_data
-                        print(5)
-                        return True
-
-                    if np.any(np.abs(current_arr - previous_arr) > self.move_tolerance):
-                        self.last_controller_data = controller_data
-                        print(6)
-                        return True
-            return False
-
-    def replay(self, data_path, fps=30, key_banned=None, is_collect=False, episode_id=None):
-        time_interval = 1 / fps
-        episode_data = dict_to_list(hdf5_groups_to_dict(data_path))
-        
-        now_time = last_time = time.monotonic()
-        for current_action in episode_data:
-            while now_time - last_time < time_interval:
-                now_time = time.monotonic()
-                time.sleep(0.00001)
-            if is_collect:
-                data = self.get_obs()
-                self.collect(data)
-            
-            self.play_once(current_action, key_banned)
-            last_time = time.monotonic()
+        return controller_data
+
+    def is_move(self):
+        return self.motion_filter.update(self.get_controller_data())
+
+    def replay(self, data_path, fps=30, key_banned=None, is_collect=False, episode_id=None,
+               chunk_size=64, prefetch=4, speed=1.0, rate=None, use_timestamps=True, max_gap=None):
+        '''
+        流式回放: 只按块预读 controller 列 (不读取相机数据), 按录制时间戳的绝对截止时间发送
+        chunk_size: 每次从磁盘读取的帧数, int
+        prefetch: 预读队列中最多缓存的块数, int
+        speed: 回放倍速, float
+        rate: 重采样到 controller 的控制频率 (例如 200), None 表示逐帧回放, float
+        use_timestamps: False 时忽略录制时间戳, 按 fps 等间隔回放, bool
+        max_gap: 超过该间隔 (秒) 的断档被跳过, None 自动判断, float
+        '''
+        controllers = {
+            controller_name: controller
+            for controller_group in self.controllers.values()
+            for controller_name, controller in controller_group.items()
+        }
+        stream = ReplayStream(data_path, list(controllers.keys()), key_banned=key_banned, bias=self.bias,
+                              chunk_size=chunk_size, prefetch=prefetch, fps=fps, speed=speed, rate=rate,
+                              use_timestamps=use_timestamps, max_gap=max_gap)
+        if len(stream) == 0:
+            debug_print(self.name, f"no controller rows in {data_path}, skip replay", "WARNING")
+            return
+        clock = DeadlineClock(stream.rate)
+        debug_print(self.name, f"replay {len(stream)} commands at {stream.rate:.1f} Hz "
+                               f"({stream.times[-1]:.2f}s, x{speed})", "INFO")
+
+        last_frame = -1
+        with stream:
+            clock.start()
+            for i, command in enumerate(stream):
+                clock.wait(stream.times[i])
+                # 重采样后多条命令对应同一录制帧, 每个录制帧只采集一次
+                frame = int(stream.positions[i])
+                if is_collect and frame != last_frame:
+                    data = self.get_obs()
+                    self.collect(data)
+                last_frame = frame
+                for controller_name, controller_action in command.items():
+                    controllers[controller_name].move(controller_action, is_delta=False)
+        if clock.late_ticks:
+            debug_print(self.name, f"replay fell behind {clock.late_ticks} times at {stream.rate:.1f} Hz", "WARNING")
         if is_collect:
             self.finish(episode_id)
     
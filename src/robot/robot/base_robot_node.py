@@ -202,6 +202,13 @@ def build_robot_node(base_robot_cls):
 
             return controller_data.copy(), sensor_data.copy()
 
+        def get_controller_data(self):
+            # controller 节点已按 ROBOT_MAP 频率轮询, 直接复用最新缓存, 不再重复读取硬件
+            controller_data = {}
+            for buf in self.controller_data_buffers.values():
+                controller_data.update(buf.get_latest())
+            return controller_data
+
         def start(self):
             if self.start_event.is_set():
                 self.reset()
@@ -0,0 +1,135 @@
+"""
+Array-native action chunks.
+A policy returns one contiguous (T, D) array together with an ActionLayout that maps
+column slices to controller_type/controller_name/key. The chunk travels over the
+wire as a single buffer and Robot.move_chunk applies a row with vector ops, instead
+of building and walking T nested dicts.
+"""
+import numpy as np
+
+CHUNK_MARKER = "__action_chunk__"
+
+
+class ActionLayout:
+    '''
+    动作列布局, 描述 (T, D) 动作数组中每段列对应的 controller 字段
+    输入:
+    fields: [(controller_type, controller_name, key, size)], size 为 None 表示标量 (例如 gripper), List[Tuple]
+    '''
+    def __init__(self, fields):
+        self.fields = []
+        start = 0
+        for controller_type, controller_name, key, size in fields:
+            width = 1 if size is None else int(size)
+            self.fields.append((controller_type, controller_name, key, start, start + width, size is None))
+            start += width
+        self.dim = start
+
+    def __len__(self):
+        return self.dim
+
+    def __eq__(self, other):
+        return isinstance(other, ActionLayout) and self.fields == other.fields
+
+    def __hash__(self):
+        return hash(tuple(self.fields))
+
+    def __repr__(self):
+        return f"ActionLayout({self.to_list()})"
+
+    def to_list(self):
+        return [
+            [controller_type, controller_name, key, None if scalar else stop - start]
+            for controller_type, controller_name, key, start, stop, scalar in self.fields
+        ]
+
+    @classmethod
+    def from_list(cls, fields):
+        return cls([tuple(field) for field in fields])
+
+    def controllers(self, key_banned=None):
+        '''
+        按 controller 分组: [(controller_type, controller_name, [(key, start, stop, scalar)])]
+        '''
+        key_banned = key_banned or []
+        groups = {}
+        for controller_type, controller_name, key, start, stop, scalar in self.fields:
+            if key in key_banned:
+                continue
+            groups.setdefault((controller_type, controller_name), []).append((key, start, stop, scalar))
+        return [(controller_type, controller_name, keys) for (controller_type, controller_name), keys in groups.items()]
+
+    def vector(self, values):
+        '''
+        把 {controller_name: {key: value}} (例如 Robot.bias) 展开为 (D,) 向量, 未出现的列为 0
+        '''
+        vector = np.zeros(self.dim, dtype=np.float64)
+        for controller_type, controller_name, key, start, stop, scalar in self.fields:
+            value = (values or {}).get(controller_name, {}).get(key)
+            if value is not None:
+                vector[start:stop] = value
+        return vector
+
+
+class ActionChunk:
+    '''
+    一段动作: actions 为 (T, D) 数组, layout 为共享的 ActionLayout
+    迭代时逐步返回长度为 1 的 ActionChunk, 可直接传给 Robot.move
+    '''
+    def __init__(self, actions, layout):
+        actions = np.asarray(actions)
+        if actions.ndim == 1:
+            actions = actions[None]
+        if actions.shape[-1] != layout.dim:
+            raise ValueError(f"action dim {actions.shape[-1]} does not match layout dim {layout.dim}")
+        self.actions = actions
+        self.layout = layout
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ActionChunk(self.actions[index], self.layout)
+        return ActionChunk(self.actions[index][None], self.layout)
+
+    def __iter__(self):
+        for i in range(len(self.actions)):
+            yield ActionChunk(self.actions[i:i + 1], self.layout)
+
+    def __repr__(self):
+        return f"ActionChunk(shape={self.actions.shape}, layout={self.layout})"
+
+    def to_dicts(self):
+        '''
+        转为旧格式: T 个 {controller_type: {controller_name: {key: value}}}
+        '''
+        ret_actions = []
+        for row in self.actions:
+            ret_action = {}
+            for controller_type, controller_name, key, start, stop, scalar in self.layout.fields:
+                ret_action.setdefault(controller_type, {}).setdefault(controller_name, {})[key] = \
+                    row[start] if scalar else row[start:stop]
+            ret_actions.append(ret_action)
+        return ret_actions
+
+    def to_wire(self):
+        return {CHUNK_MARKER: True, "actions": np.ascontiguousarray(self.actions), "layout": self.layout.to_list()}
+
+    @classmethod
+    def from_wire(cls, data):
+        return cls(data["actions"], ActionLayout.from_list(data["layout"]))
+
+
+# X-One 双臂: 左臂 6 关节 + 夹爪, 右臂 6 关节 + 夹爪
+DUAL_ARM_LAYOUT = ActionLayout([
+    ("arm", "left_arm", "joint", 6),
+    ("arm", "left_arm", "gripper", None),
+    ("arm", "right_arm", "joint", 6),
+    ("arm", "right_arm", "gripper", None),
+])
+
+# 双臂 + slamware 底盘速度
+DUAL_ARM_MOBILE_LAYOUT = ActionLayout(DUAL_ARM_LAYOUT.to_list() + [
+    ("mobile", "slamware", "move_velocity", 3),
+])
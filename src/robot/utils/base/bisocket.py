@@ -1,9 +1,50 @@
 import socket
 import pickle
-from threading import Thread, Event
+import struct
+from threading import Thread, Event, Lock
 
 from robot.utils.base.data_handler import debug_print
 
+# 帧格式: [pickle 长度 (4 字节), 带外 buffer 个数 (2 字节)] + 每个 buffer 的长度 (8 字节)
+#         + pickle 数据 + 各个带外 buffer 的原始字节
+# pickle protocol 5 把连续的 numpy 数组作为带外 buffer 单独发送, 收发两端都不在用户态拷贝数组数据
+FRAME_HEADER = struct.Struct("!IH")
+BUFFER_LENGTH = struct.Struct("!Q")
+PICKLE_PROTOCOL = 5
+# sendmsg 一次最多提交的 iovec 个数 (Linux IOV_MAX = 1024)
+MAX_IOV = 512
+
+
+def encode_message(data):
+    '''
+    返回一帧的分段列表 [帧头, pickle 数据, 带外 buffer...], 数组数据不拷贝
+    '''
+    buffers = []
+    payload = pickle.dumps(data, protocol=PICKLE_PROTOCOL, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    header = FRAME_HEADER.pack(len(payload), len(raws)) + b"".join(BUFFER_LENGTH.pack(raw.nbytes) for raw in raws)
+    return [header, payload, *raws]
+
+
+def decode_message(frame):
+    '''
+    从连续内存 (例如共享内存) 中的一整帧反序列化; 带外 buffer 拷贝到新的 bytearray,
+    返回的数组不引用 frame, frame 之后可以被覆盖
+    '''
+    frame = memoryview(frame)
+    length, buffer_count = FRAME_HEADER.unpack_from(frame)
+    offset = FRAME_HEADER.size
+    lengths = struct.unpack_from(f"!{buffer_count}Q", frame, offset)
+    offset += BUFFER_LENGTH.size * buffer_count
+    payload = frame[offset:offset + length]
+    offset += length
+    buffers = []
+    for size in lengths:
+        buffers.append(bytearray(frame[offset:offset + size]))
+        offset += size
+    return pickle.loads(payload, buffers=buffers)
+
+
 class BiSocket:
     '''
     用于同步client-server信息的类
@@ -21,6 +62,11 @@ class BiSocket:
         self.running = Event()
         self.running.set()
 
+        self._send_lock = Lock()
+        self._header = bytearray(FRAME_HEADER.size)
+        # 复用的接收缓冲区, 只存放 pickle 数据 (反序列化时会拷贝出来), 按需扩容
+        self._recv_buffer = bytearray(64 * 1024)
+
         self.enable_loop = enable_loop
 
         if enable_loop:
@@ -29,36 +75,65 @@ class BiSocket:
         else:
             self.receiver_thread = None
 
-    def _recv_exact(self, n):
-        data = b''
-        while len(data) < n:
+    def _recv_into(self, view):
+        '''
+        读满 view, 连接出错或被关闭时返回 False
+        '''
+        received, size = 0, len(view)
+        while received < size:
             try:
-                packet = self.conn.recv(n - len(data))
+                n = self.conn.recv_into(view[received:])
             except Exception as e:
                 debug_print("BiSocket", f"Recv error: {e}", "ERROR")
                 self.close()
-                return None
-            if not packet:
+                return False
+            if n == 0:
                 debug_print("BiSocket","Remote side closed connection.", "WARNING")
                 self.close()
+                return False
+            received += n
+        return True
+
+    def _recv_frame(self):
+        '''
+        读取一帧, 返回 (pickle 数据的 memoryview, 带外 buffer 列表), 连接断开时返回 None
+        pickle 数据位于复用的接收缓冲区中, 在下一次接收前有效; 带外 buffer 每次新分配,
+        反序列化出的 numpy 数组直接引用它们
+        '''
+        if not self._recv_into(memoryview(self._header)):
+            return None
+        length, buffer_count = FRAME_HEADER.unpack(self._header)
+
+        lengths = ()
+        if buffer_count:
+            raw_lengths = bytearray(BUFFER_LENGTH.size * buffer_count)
+            if not self._recv_into(memoryview(raw_lengths)):
+                return None
+            lengths = struct.unpack(f"!{buffer_count}Q", raw_lengths)
+
+        if len(self._recv_buffer) < length:
+            self._recv_buffer = bytearray(max(length, 2 * len(self._recv_buffer)))
+        payload = memoryview(self._recv_buffer)[:length]
+        if not self._recv_into(payload):
+            return None
+
+        buffers = []
+        for size in lengths:
+            buffer = bytearray(size)
+            if not self._recv_into(memoryview(buffer)):
                 return None
-            data += packet
-        return data
+            buffers.append(buffer)
+        return payload, buffers
 
     def _recv_loop(self):
         try:
             while self.running.is_set():
-                length_bytes = self._recv_exact(4)
-                if length_bytes is None:
-                    break
-
-                length = int.from_bytes(length_bytes, 'big')
-                data = self._recv_exact(length)
-                if data is None:
+                frame = self._recv_frame()
+                if frame is None:
                     break
 
                 try:
-                    message = pickle.loads(data)
+                    message = pickle.loads(frame[0], buffers=frame[1])
                 except Exception as e:
                     debug_print("BiSocket",f"Unpickle error: {e}", "WARNING")
                     continue
@@ -81,14 +156,31 @@ class BiSocket:
             self.close()
 
     
+    def _send_parts(self, parts):
+        '''
+        用 sendmsg 的 scatter/gather 一次提交所有分段, 处理部分发送; 不支持 sendmsg 的平台逐段 sendall
+        '''
+        with self._send_lock:
+            if not hasattr(self.conn, "sendmsg"):
+                for part in parts:
+                    self.conn.sendall(part)
+                return
+            views = [memoryview(part) for part in parts if len(part)]
+            while views:
+                sent = self.conn.sendmsg(views[:MAX_IOV])
+                while views and sent >= len(views[0]):
+                    sent -= len(views[0])
+                    views.pop(0)
+                if sent:
+                    views[0] = views[0][sent:]
+
     def send(self, data):
         '''
         发送信息:
         data: 发送的信息, Dict[Any]
         '''
         try:
-            serialized = pickle.dumps(data)
-            self.conn.sendall(len(serialized).to_bytes(4, 'big') + serialized)
+            self._send_parts(encode_message(data))
         except Exception as e:
             debug_print("BiSocket",f"Send failed: {e}", "ERROR")
             self.close()
@@ -108,30 +200,22 @@ class BiSocket:
         '''
         try:
             # 序列化并发送
-            serialized = pickle.dumps(data)
-            self.conn.sendall(len(serialized).to_bytes(4, 'big') + serialized)
-            debug_print("BiSocket", f"Sent {len(serialized)} bytes, waiting for reply...", "DEBUG")
+            parts = encode_message(data)
+            self._send_parts(parts)
+            debug_print("BiSocket", f"Sent {len(parts[1])} bytes + {len(parts) - 2} buffers, waiting for reply...", "DEBUG")
 
             # 设置 socket 超时
             self.conn.settimeout(timeout)
 
-            # 读取返回包头（4 字节长度）
-            length_bytes = self._recv_exact(4)
-            if length_bytes is None:
-                debug_print("BiSocket", "No reply length header received.", "WARNING")
-                return None
-
-            length = int.from_bytes(length_bytes, 'big')
-
-            # 读取返回主体
-            data_bytes = self._recv_exact(length)
-            if data_bytes is None:
-                debug_print("BiSocket", "No reply data received.", "WARNING")
+            # 读取返回的一帧
+            frame = self._recv_frame()
+            if frame is None:
+                debug_print("BiSocket", "No reply received.", "WARNING")
                 return None
 
             # 反序列化
-            reply = pickle.loads(data_bytes)
-            debug_print("BiSocket", f"Reply received successfully ({len(data_bytes)} bytes).", "DEBUG")
+            reply = pickle.loads(frame[0], buffers=frame[1])
+            debug_print("BiSocket", f"Reply received successfully ({len(frame[0])} bytes, {len(frame[1])} buffers).", "DEBUG")
 
             # 若定义了 handler，可自动执行（例如 client.move）
             if self.handler:
@@ -1,13 +1,38 @@
 ''' 将真机数据转换为 x-one 格式 '''
 
 from robot.utils.base.data_handler import debug_print
-import subprocess
+from robot.utils.base.motion_filter import motion_mask
+from robot.utils.base.video_export import export_videos, video_config
 import h5py
 import numpy as np
 import cv2
 import os
 import json
 
+def _column(collection, name, item):
+    '''
+    HDF5EpisodeReader 返回懒加载的列 (按需分块读取), CollectAny 返回内存中的数组
+    '''
+    column = getattr(collection, "column", None)
+    return column(name, item) if column is not None else collection.get_item(name, item)
+
+
+def _copy_column(group, key, collection, name, item):
+    '''
+    把 collection 的一列写入 group[key]; 从 HDF5EpisodeReader 读取时按块复制, 内存占用与块大小成正比
+    '''
+    iter_item = getattr(collection, "iter_item", None)
+    if iter_item is None:
+        return group.create_dataset(key, data=collection.get_item(name, item))
+    source = collection.column(name, item)
+    dataset = group.create_dataset(key, shape=source.shape, dtype=source.dtype)
+    start = 0
+    for chunk in iter_item(name, item):
+        dataset[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return dataset
+
+
 def image_rgb_encode_pipeline(collection, save_path, episode_id, mapping):
     def images_encoding(imgs):
         encode_data = []
@@ -100,88 +125,22 @@ def X_one_format_pipeline(collection, save_path, episode_id, mapping):
     right_eef, right_joint, right_gripper, right_timestamp = collection.get_item("right_arm", "qpos"), collection.get_item("right_arm", "joint"),\
                                                         collection.get_item("right_arm", "gripper"), collection.get_item("right_arm", "timestamp")
 
-    def decode(imgs):
-        # print(type(imgs), len(imgs.shape))
-        ret_imgs = []
-        if isinstance(imgs, bytes) or (isinstance(imgs,np.ndarray) and len(imgs.shape) == 1):
-            for img in imgs:
-                jpeg_bytes = img.tobytes().rstrip(b"\0")
-                nparr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
-                ret_imgs.append(cv2.imdecode(nparr, 1))
-        else:
-            ret_imgs = imgs
-        return ret_imgs
-
-    cam_head, cam_head_timestamp = decode(collection.get_item("cam_head", "color")), collection.get_item("cam_head", "timestamp")
-    cam_left_wrist, cam_left_wrist_timestamp = decode(collection.get_item("cam_left_wrist", "color")), collection.get_item("cam_left_wrist", "timestamp")
-    cam_right_wrist, cam_right_wrist_timestamp = decode(collection.get_item("cam_right_wrist", "color")), collection.get_item("cam_right_wrist", "timestamp")
-
-    def save_video_from_frames(
-        frames,
-        save_path,
-        filename,
-        fps=30,
-        is_rgb=True,
-        crf=0,              # ⭐ 控制损失率，0=无损，10≈几乎无损
-    ):
-        """
-        使用 FFmpeg 生成 near-lossless MP4（yuv444）
-        
-        frames: List[np.ndarray], shape (H, W, 3), uint8
-        save_path: 输出目录
-        filename: xxx.mp4
-        fps: 帧率
-        is_rgb: True 表示 frames 是 RGB（推荐）
-        crf: H.264 CRF，0=无损，10~12=dataset 推荐
-        """
-
-        if len(frames) == 0:
-            raise ValueError(f"No frames to save for {filename}")
-
-        os.makedirs(save_path, exist_ok=True)
-        video_path = os.path.join(save_path, filename)
-
-        h, w, c = frames[0].shape
-        assert c == 3, "Frames must be HxWx3"
-        assert frames[0].dtype == np.uint8, "Frames must be uint8"
-
-        # FFmpeg 命令
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-f", "rawvideo",
-            "-vcodec", "rawvideo",
-            "-pix_fmt", "rgb24" if is_rgb else "bgr24",
-            "-s", f"{w}x{h}",
-            "-framerate", str(fps),   # ⭐ 输入帧率（比 -r 正确）
-            "-i", "-",                # stdin
-            "-an",
-            "-c:v", "libx264",
-            "-preset", "ultrafast",
-            "-pix_fmt", "yuv444p",    # ⭐ 不丢色度
-            "-crf", str(crf),
-            video_path,
-        ]
-
-        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-
-        for frame in frames:
-            if not is_rgb:
-                # 如果是 BGR，转成 RGB 给 ffmpeg
-                frame = frame[:, :, ::-1]
-            proc.stdin.write(frame.tobytes())
-
-        proc.stdin.close()
-        ret = proc.wait()
-
-        if ret != 0:
-            raise RuntimeError("FFmpeg video encoding failed")
-
-        return video_path
-    
-    save_video_from_frames(cam_head, output_path, "cam_head.mp4")
-    save_video_from_frames(cam_left_wrist, output_path, "cam_left_wrist.mp4")
-    save_video_from_frames(cam_right_wrist, output_path, "cam_right_wrist.mp4")
+    cam_head, cam_head_timestamp = _column(collection, "cam_head", "color"), collection.get_item("cam_head", "timestamp")
+    cam_left_wrist, cam_left_wrist_timestamp = _column(collection, "cam_left_wrist", "color"), collection.get_item("cam_left_wrist", "timestamp")
+    cam_right_wrist, cam_right_wrist_timestamp = _column(collection, "cam_right_wrist", "color"), collection.get_item("cam_right_wrist", "timestamp")
+
+    # 三路相机同时编码, JPEG 在各自的解码线程中按块读取、解码后直接送入 ffmpeg
+    # cv2.imdecode 解码结果为 BGR, 按 bgr24 送入, SeekableVideoReader 读出的帧与 imdecode 一致
+    export_videos(
+        {
+            "cam_head.mp4": cam_head,
+            "cam_left_wrist.mp4": cam_left_wrist,
+            "cam_right_wrist.mp4": cam_right_wrist,
+        },
+        output_path,
+        video_config(getattr(collection, "collect_cfg", None)),
+        is_rgb=False,
+    )
 
     hdf5_path = os.path.join(output_path, f"robotpose.hdf5")
     with h5py.File(hdf5_path, "w") as f:
@@ -330,21 +289,13 @@ def diff_freq_pipeline(collection, save_path, episode_id, mapping):
     right_timestamp = right_timestamp[right_indices]
 
     # 移动判定
-    tolerance = 0.00001
-    indices = []
-    prev_qpos = None
-
-    for i in range(len(right_joint)):
-        current_qpos = np.concatenate([
-            left_joint[i].reshape(-1),
-            left_gripper[i].reshape(-1),
-            right_joint[i].reshape(-1),
-            right_gripper[i].reshape(-1),
-        ])
-
-        if prev_qpos is None or np.any(np.abs(current_qpos - prev_qpos) > tolerance):
-                indices.append(i)
-                prev_qpos = current_qpos
+    qpos = np.concatenate([
+        left_joint.reshape(len(left_joint), -1),
+        left_gripper.reshape(len(left_gripper), -1),
+        right_joint.reshape(len(right_joint), -1),
+        right_gripper.reshape(len(right_gripper), -1),
+    ], axis=1)
+    indices = np.flatnonzero(motion_mask(qpos, tolerance=0.00001, reference="moved"))
     
     left_joint = left_joint[indices]
     left_eef = left_eef[indices]
@@ -409,9 +360,10 @@ def X_spark_format_pipeline(collection, save_path, episode_id, mapping):
     right_eef, right_joint, right_gripper, right_timestamp = collection.get_item("right_arm", "eef"), collection.get_item("right_arm", "joint"),\
                                                         collection.get_item("right_arm", "gripper"), collection.get_item("right_arm", "timestamp")
 
-    cam_head_color, cam_head_timestamp = collection.get_item("cam_head", "color"), collection.get_item("cam_head", "timestamp")
-    cam_left_wrist_color, cam_left_wrist_timestamp = collection.get_item("cam_left_wrist", "color"), collection.get_item("cam_left_wrist", "timestamp")
-    cam_right_wrist_color, cam_right_wrist_timestamp = collection.get_item("cam_right_wrist", "color"), collection.get_item("cam_right_wrist", "timestamp")
+    # 图像列不整列读入内存, 写入时按块复制
+    cam_head_color, cam_head_timestamp = _column(collection, "cam_head", "color"), collection.get_item("cam_head", "timestamp")
+    cam_left_wrist_color, cam_left_wrist_timestamp = _column(collection, "cam_left_wrist", "color"), collection.get_item("cam_left_wrist", "timestamp")
+    cam_right_wrist_color, cam_right_wrist_timestamp = _column(collection, "cam_right_wrist", "color"), collection.get_item("cam_right_wrist", "timestamp")
 
     hdf5_path = os.path.join(save_path, f"{episode_id}.hdf5")
     '''
@@ -448,16 +400,16 @@ def X_spark_format_pipeline(collection, save_path, episode_id, mapping):
         vision = f.create_group("vision")
         state = f.create_group("state")
         cam_head = vision.create_group("cam_head")
-        cam_head.create_dataset("colors", data=cam_head_color)
+        _copy_column(cam_head, "colors", collection, "cam_head", "color")
         
         cam_head.create_dataset("shape", data=get_cam_shape(cam_head_color[0]))
 
         cam_left_wrist = vision.create_group("cam_left_wrist")
-        cam_left_wrist.create_dataset("colors", data=cam_left_wrist_color)
+        _copy_column(cam_left_wrist, "colors", collection, "cam_left_wrist", "color")
         cam_left_wrist.create_dataset("shape", data=get_cam_shape(cam_left_wrist_color[0])) # 固定分辨率
     
         cam_right_wrist = vision.create_group("cam_right_wrist")
-        cam_right_wrist.create_dataset("colors", data=cam_right_wrist_color)
+        _copy_column(cam_right_wrist, "colors", collection, "cam_right_wrist", "color")
         cam_right_wrist.create_dataset("shape", data=get_cam_shape(cam_right_wrist_color[0])) # 固定分辨率
 
         def rpy2quat(xyzrpy):
@@ -496,4 +448,13 @@ def X_spark_format_pipeline(collection, save_path, episode_id, mapping):
         state.create_dataset("right_ee_joint_states", data=right_gripper)
         state.create_dataset("right_ee_poses", data=rpy2quat(right_eef))
 
-    debug_print("X_one_format_pipeline", f"save data success at: {output_path} !", "INFO")
\ No newline at end of file
+    debug_print("X_one_format_pipeline", f"save data success at: {output_path} !", "INFO")
+
+# 输出格式变化时递增对应版本号, 转换缓存 (robot.data.convert) 会据此重新处理已转换的 episode
+PIPELINE_VERSIONS = {
+    "image_rgb_encode_pipeline": "1",
+    "general_hdf5_rdt_format_pipeline": "1",
+    "X_one_format_pipeline": "3",
+    "diff_freq_pipeline": "1",
+    "X_spark_format_pipeline": "1",
+}
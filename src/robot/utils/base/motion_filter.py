@@ -0,0 +1,195 @@
+import numpy as np
+from typing import Dict, Any, List, Optional, Sequence
+
+from robot.utils.base.data_handler import debug_print
+
+REFERENCE_MODES = ["last", "moved"]
+
+
+class MotionLayout:
+    '''
+    缓存 controller 数据在扁平向量中的位置:
+    slots: [(controller_name, key, start, stop)], key 为 None 表示该 controller 数据本身不是 dict
+    '''
+    def __init__(self, slots, size):
+        self.slots = slots
+        self.size = size
+
+    @classmethod
+    def build(cls, controller_data: Dict[str, Any], key_banned: Sequence[str] = ()):
+        slots = []
+        start = 0
+        for part, sub in controller_data.items():
+            if isinstance(sub, dict):
+                for key, value in sub.items():
+                    if key in key_banned or value is None:
+                        continue
+                    size = np.size(value)
+                    slots.append((part, key, start, start + size))
+                    start += size
+            elif sub is not None:
+                size = np.size(sub)
+                slots.append((part, None, start, start + size))
+                start += size
+        return cls(slots, start)
+
+    def fill(self, controller_data: Dict[str, Any], out: np.ndarray) -> bool:
+        """按缓存布局把一帧数据写入 out, 布局失效(字段缺失/长度变化)时返回 False"""
+        try:
+            for part, key, start, stop in self.slots:
+                value = controller_data[part] if key is None else controller_data[part][key]
+                out[start:stop] = np.reshape(value, -1)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def stack(self, columns: Dict[str, Any]) -> np.ndarray:
+        """把整段 episode 的列数据 {controller: {key: (T, ...)}} 拼成 (T, size) 矩阵"""
+        parts = []
+        for part, key, start, stop in self.slots:
+            column = np.asarray(columns[part] if key is None else columns[part][key])
+            parts.append(column.reshape(column.shape[0], -1))
+        if not parts:
+            return np.zeros((0, 0), dtype=np.float64)
+        return np.concatenate(parts, axis=1).astype(np.float64, copy=False)
+
+
+def raw_motion(frames: np.ndarray, tolerance: float, reference: str = "last") -> np.ndarray:
+    '''
+    逐帧判断是否运动, 第一帧恒为 True
+    frames: (T, D)
+    reference: "last" 与上一帧比较; "moved" 与上一次判定为运动的帧比较
+    '''
+    frames = np.asarray(frames, dtype=np.float64)
+    num = frames.shape[0]
+    moving = np.ones(num, dtype=bool)
+    if num < 2:
+        return moving
+
+    if reference == "last":
+        moving[1:] = np.any(np.abs(np.diff(frames, axis=0)) > tolerance, axis=1)
+    elif reference == "moved":
+        ref = frames[0]
+        for i in range(1, num):
+            if np.any(np.abs(frames[i] - ref) > tolerance):
+                ref = frames[i]
+            else:
+                moving[i] = False
+    else:
+        raise ValueError(f"reference must be one of {REFERENCE_MODES}, got {reference}")
+    return moving
+
+
+def apply_hysteresis(raw: np.ndarray, start_frames: int = 1, stop_frames: int = 1, initial: bool = True) -> np.ndarray:
+    '''
+    滞回窗口: 连续 start_frames 帧运动才进入运动状态, 连续 stop_frames 帧静止才进入静止状态
+    start_frames = stop_frames = 1 时与 raw 完全一致
+    '''
+    raw = np.asarray(raw, dtype=bool)
+    if start_frames <= 1 and stop_frames <= 1:
+        return raw.copy()
+
+    mask = np.empty_like(raw)
+    state, run = initial, 0
+    for i, value in enumerate(raw):
+        if value != state:
+            run += 1
+            if run >= (start_frames if value else stop_frames):
+                state, run = value, 0
+        else:
+            run = 0
+        mask[i] = state
+    return mask
+
+
+def motion_mask(frames: np.ndarray, tolerance: float, start_frames: int = 1, stop_frames: int = 1, reference: str = "last") -> np.ndarray:
+    '''
+    离线计算整段 episode 的运动 mask
+    frames: (T, D), 每行为一帧扁平化后的 controller 状态
+    '''
+    return apply_hysteresis(raw_motion(frames, tolerance, reference), start_frames, stop_frames)
+
+
+class MotionFilter:
+    '''
+    基于缓存布局的运动检测, 将每帧 controller 数据扁平为一个连续向量后用一次向量运算比较
+    输入:
+    tolerance: 任一分量变化超过该值即视为运动, float
+    key_banned: 不参与比较的字段, 如 timestamp, List[str]
+    start_frames / stop_frames: 滞回窗口长度, int
+    reference: "last" 与上一帧比较; "moved" 与上一次运动帧比较, str
+    '''
+    def __init__(self, tolerance: float, key_banned: Optional[List[str]] = None, start_frames: int = 1, stop_frames: int = 1, reference: str = "last"):
+        if reference not in REFERENCE_MODES:
+            raise ValueError(f"reference must be one of {REFERENCE_MODES}, got {reference}")
+        self.tolerance = tolerance
+        self.key_banned = list(key_banned) if key_banned is not None else []
+        self.start_frames = max(1, int(start_frames))
+        self.stop_frames = max(1, int(stop_frames))
+        self.reference = reference
+
+        self.layout: Optional[MotionLayout] = None
+        self.reset()
+
+    def reset(self):
+        self._current = None
+        self._reference = None
+        self._diff = None
+        self._state = True
+        self._run = 0
+
+    def _rebuild(self, controller_data):
+        self.layout = MotionLayout.build(controller_data, self.key_banned)
+        size = self.layout.size
+        self._current = np.empty(size, dtype=np.float64)
+        self._reference = np.empty(size, dtype=np.float64)
+        self._diff = np.empty(size, dtype=np.float64)
+        self.layout.fill(controller_data, self._reference)
+        debug_print("MotionFilter", f"layout rebuilt, {len(self.layout.slots)} streams, {size} dims", "DEBUG")
+
+    def flatten(self, controller_data: Dict[str, Any]) -> np.ndarray:
+        """返回一帧数据的扁平向量(新数组), 用于离线分析或调试"""
+        layout = self.layout if self.layout is not None else MotionLayout.build(controller_data, self.key_banned)
+        out = np.empty(layout.size, dtype=np.float64)
+        if not layout.fill(controller_data, out):
+            layout = MotionLayout.build(controller_data, self.key_banned)
+            out = np.empty(layout.size, dtype=np.float64)
+            layout.fill(controller_data, out)
+        return out
+
+    def update(self, controller_data: Dict[str, Any]) -> bool:
+        """输入新一帧 controller 数据, 返回滞回后的运动状态"""
+        if self._reference is None or not self.layout.fill(controller_data, self._current):
+            # 首帧或布局变化(字段增减、形状变化)都视为运动
+            self._rebuild(controller_data)
+            self._state, self._run = True, 0
+            return True
+
+        np.subtract(self._current, self._reference, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        raw = bool((self._diff > self.tolerance).any())
+
+        if raw or self.reference == "last":
+            self._current, self._reference = self._reference, self._current
+
+        if raw != self._state:
+            self._run += 1
+            if self._run >= (self.start_frames if raw else self.stop_frames):
+                self._state, self._run = raw, 0
+        else:
+            self._run = 0
+        return self._state
+
+    def episode_mask(self, columns: Dict[str, Any]) -> np.ndarray:
+        '''
+        离线版本: columns 为整段 episode 的列数据 {controller: {key: (T, ...)}},
+        例如 hdf5_groups_to_dict 的结果, 返回 (T,) bool mask
+        '''
+        first_frame = {}
+        for part, sub in columns.items():
+            if isinstance(sub, dict):
+                first_frame[part] = {key: value[0] for key, value in sub.items() if key not in self.key_banned}
+            else:
+                first_frame[part] = sub[0]
+        layout = MotionLayout.build(first_frame, self.key_banned)
+        return motion_mask(layout.stack(columns), self.tolerance, self.start_frames, self.stop_frames, self.reference)
@@ -0,0 +1,273 @@
+"""
+Parallel ffmpeg video export.
+Every camera gets its own ffmpeg process. A decode thread turns the stored frame
+column into contiguous (N, H, W, 3) blocks and hands them to a writer thread
+through a bounded queue; the writer passes each block to ffmpeg stdin in a single
+write, so all cameras encode at the same time and memory stays bounded.
+"""
+import os
+import queue
+import threading
+import subprocess
+
+import cv2
+import numpy as np
+
+from robot.utils.base.data_handler import debug_print
+from robot.utils.base.video_index import write_video_index
+
+# encoder name -> ffmpeg codec, output pix_fmt, default preset, rate control ({crf} is filled in)
+VIDEO_ENCODERS = {
+    "x264": {"codec": "libx264", "pix_fmt": "yuv444p", "preset": "ultrafast", "rate": ["-crf", "{crf}"]},
+    "x265": {"codec": "libx265", "pix_fmt": "yuv444p", "preset": "ultrafast", "rate": ["-crf", "{crf}"],
+             "lossless": ["-x265-params", "lossless=1"]},
+    "av1": {"codec": "libsvtav1", "pix_fmt": "yuv420p", "preset": "8", "rate": ["-crf", "{crf}"], "min_crf": 1},
+    "aom_av1": {"codec": "libaom-av1", "pix_fmt": "yuv444p", "preset": "8", "preset_arg": "-cpu-used",
+                "rate": ["-crf", "{crf}", "-b:v", "0"]},
+    "nvenc": {"codec": "h264_nvenc", "pix_fmt": "yuv444p", "preset": "p1", "rate": ["-rc", "constqp", "-qp", "{crf}"]},
+    "hevc_nvenc": {"codec": "hevc_nvenc", "pix_fmt": "yuv444p", "preset": "p1", "rate": ["-rc", "constqp", "-qp", "{crf}"]},
+}
+
+DEFAULT_VIDEO_CONFIG = {
+    "encoder": "x264",      # 只依赖 CPU 的默认编码器
+    "crf": 0,               # 0=无损 (x264), 10~12=dataset 推荐
+    "preset": None,         # None 使用 VIDEO_ENCODERS 中的默认 preset
+    "fps": 30,
+    "chunk_frames": 32,     # 每次写入 ffmpeg 的帧数
+    "queue_size": 4,        # 解码线程与写入线程之间最多缓存的块数
+    "gop": None,            # 关键帧间隔, None 使用编码器默认值; 随机读取训练建议 15~30
+    "index": True,          # 编码完成后写入 <name>.index.json 关键帧/PTS 索引
+    "loglevel": "error",
+}
+
+
+def video_config(collect_cfg=None):
+    '''
+    从采集配置的 video 字段读取视频导出参数, 缺省项使用 DEFAULT_VIDEO_CONFIG
+    '''
+    cfg = dict(DEFAULT_VIDEO_CONFIG)
+    if collect_cfg is not None:
+        cfg.update(collect_cfg.get("video") or {})
+    if cfg["encoder"] not in VIDEO_ENCODERS:
+        raise ValueError(f"Unknown video encoder '{cfg['encoder']}', available: {list(VIDEO_ENCODERS.keys())}")
+    return cfg
+
+
+def encoder_command(video_path, width, height, video_cfg, is_rgb=True):
+    spec = VIDEO_ENCODERS[video_cfg["encoder"]]
+    crf = max(int(video_cfg["crf"]), spec.get("min_crf", 0))
+    if crf == 0 and "lossless" in spec:
+        rate = list(spec["lossless"])
+    else:
+        rate = [arg.format(crf=crf) for arg in spec["rate"]]
+
+    return [
+        "ffmpeg",
+        "-y",
+        "-loglevel", str(video_cfg["loglevel"]),
+        "-f", "rawvideo",
+        "-vcodec", "rawvideo",
+        "-pix_fmt", "rgb24" if is_rgb else "bgr24",
+        "-s", f"{width}x{height}",
+        "-framerate", str(video_cfg["fps"]),   # 输入帧率（比 -r 正确）
+        "-i", "-",                             # stdin
+        "-an",
+        "-c:v", spec["codec"],
+        spec.get("preset_arg", "-preset"), str(video_cfg["preset"] or spec["preset"]),
+        "-pix_fmt", spec["pix_fmt"],
+        *rate,
+        *(["-g", str(int(video_cfg["gop"]))] if video_cfg.get("gop") else []),
+        *video_cfg.get("extra_args", []),
+        video_path,
+    ]
+
+
+def is_encoded_column(frames):
+    # np.ndarray 或 HDF5EpisodeReader.column 返回的 h5py.Dataset
+    return isinstance(frames, bytes) or getattr(frames, "ndim", None) == 1
+
+
+def decode_frame(frame):
+    jpeg_bytes = frame.tobytes().rstrip(b"\0") if isinstance(frame, np.ndarray) else bytes(frame).rstrip(b"\0")
+    return cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), 1)
+
+
+class VideoExportJob:
+    '''
+    单个相机的导出任务: 解码线程 -> 有界队列 -> 写入线程 -> ffmpeg stdin
+    输入:
+    frames: JPEG 字节列 (T,) 或已解码的 (T, H, W, 3) uint8 数组, 也可以是 h5py.Dataset (按块读取), np.ndarray
+    video_path: 输出路径, str
+    video_cfg: video_config() 的结果, Dict
+    is_rgb: frames 为 RGB 顺序时为 True, BGR 时由 ffmpeg 直接按 bgr24 读取, bool
+    '''
+    def __init__(self, frames, video_path, video_cfg, is_rgb=True):
+        if frames is None or len(frames) == 0:
+            raise ValueError(f"No frames to save for {os.path.basename(video_path)}")
+        self.frames = frames
+        self.video_path = video_path
+        self.video_cfg = video_cfg
+        self.is_rgb = is_rgb
+        self.chunk_frames = max(1, int(video_cfg["chunk_frames"]))
+
+        self.frames_written = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(1, int(video_cfg["queue_size"])))
+        self._free = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._produce, name=f"decode-{os.path.basename(video_path)}", daemon=True),
+            threading.Thread(target=self._consume, name=f"encode-{os.path.basename(video_path)}", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.video_path
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _take_block(self, shape, allocated):
+        '''
+        复用写入线程归还的块, 块总数上限为 queue_size + 2
+        '''
+        limit = self._queue.maxsize + 2
+        while not self._stop.is_set():
+            try:
+                block = self._free.get(block=allocated >= limit, timeout=0.1)
+            except queue.Empty:
+                if allocated < limit:
+                    return np.empty(shape, dtype=np.uint8), allocated + 1
+                continue
+            if block.shape == shape:
+                return block, allocated
+            return np.empty(shape, dtype=np.uint8), allocated
+        return None, allocated
+
+    def _iter_blocks(self):
+        '''
+        生成 (block, count, reusable): block 为 C 连续的 (N, H, W, 3) uint8 数组
+        '''
+        total = len(self.frames)
+        if not is_encoded_column(self.frames):
+            for start in range(0, total, self.chunk_frames):
+                # 内存中的数组沿第 0 维切片本身就是连续内存, 不需要复制
+                block = np.ascontiguousarray(self.frames[start:start + self.chunk_frames], dtype=np.uint8)
+                yield block, len(block), False
+            return
+
+        allocated = 0
+        first = decode_frame(self.frames[0])
+        shape = (self.chunk_frames,) + first.shape
+        for start in range(0, total, self.chunk_frames):
+            count = min(self.chunk_frames, total - start)
+            block, allocated = self._take_block(shape, allocated)
+            if block is None:
+                return
+            # 一次读取整块, 对 h5py.Dataset 只访问一次磁盘
+            encoded = self.frames[start:start + count]
+            for i in range(count):
+                frame = first if start + i == 0 else decode_frame(encoded[i])
+                if frame is None or frame.shape != first.shape:
+                    raise ValueError(f"Frame {start + i} of {self.video_path} can not be decoded to {first.shape}")
+                block[i] = frame
+            yield block, count, True
+
+    def _produce(self):
+        try:
+            for item in self._iter_blocks():
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+        finally:
+            self._put(None)
+
+    def _consume(self):
+        proc = None
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    continue
+                if item is None:
+                    break
+                block, count, reusable = item
+                if proc is None:
+                    h, w, c = block.shape[1:]
+                    assert c == 3, "Frames must be HxWx3"
+                    cmd = encoder_command(self.video_path, w, h, self.video_cfg, self.is_rgb)
+                    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+                proc.stdin.write(memoryview(block[:count]))
+                self.frames_written += count
+                if reusable:
+                    self._free.put(block)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            self._stop.set()
+        finally:
+            if proc is not None:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                ret = proc.wait()
+                if ret != 0 and self.error is None:
+                    self.error = RuntimeError(f"FFmpeg video encoding failed: {self.video_path}")
+                if self.error is None and self.video_cfg.get("index", True):
+                    self._write_index()
+
+    def _write_index(self):
+        try:
+            write_video_index(self.video_path, gop=self.video_cfg.get("gop"))
+        except Exception as e:
+            # 索引只用于加速随机读取, 失败时读取端会退回到直接解析 MP4
+            debug_print("VideoExportJob", f"write index for {self.video_path} Fail: {e}", "WARNING")
+
+
+def export_videos(streams, output_dir, video_cfg=None, is_rgb=True):
+    '''
+    并行导出多路视频, 总耗时接近最慢的单路
+    streams: {filename: frames}, 例如 {"cam_head.mp4": jpeg_column}
+    返回 {filename: video_path}
+    '''
+    video_cfg = video_cfg if video_cfg is not None else video_config()
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = {
+        filename: VideoExportJob(frames, os.path.join(output_dir, filename), video_cfg, is_rgb=is_rgb)
+        for filename, frames in streams.items()
+    }
+    for job in jobs.values():
+        job.start()
+
+    errors = []
+    for filename, job in jobs.items():
+        try:
+            job.join()
+        except Exception as e:
+            errors.append(f"{filename}: {e}")
+    if errors:
+        raise RuntimeError("video export failed, " + "; ".join(errors))
+
+    debug_print("export_videos", f"encoded {len(jobs)} videos with {video_cfg['encoder']} to {output_dir}", "DEBUG")
+    return {filename: job.video_path for filename, job in jobs.items()}
@@ -0,0 +1,253 @@
+"""
+Keyframe/PTS index for MP4 videos and a frame-accurate seekable reader.
+The index is read from the MP4 sample tables (stts/ctts/stss) without decoding,
+and stored next to the video as `<name>.index.json`:
+
+    video: str, video file name
+    frames: int, number of frames
+    fps: float, average frame rate
+    gop: int, GOP size requested from the encoder (None for encoder default)
+    keyframes: [int], presentation-order indices of keyframes
+    pts: [float], presentation time of every frame in seconds, starting at 0
+"""
+import os
+import json
+import struct
+import bisect
+
+import cv2
+import numpy as np
+
+from robot.utils.base.data_handler import debug_print
+
+INDEX_SUFFIX = ".index.json"
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def index_path_for(video_path):
+    return os.path.splitext(video_path)[0] + INDEX_SUFFIX
+
+
+def _iter_boxes(data, offset=0, end=None):
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise ValueError(f"broken mp4 box {box_type} at {offset}")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _read_moov(video_path):
+    with open(video_path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            size, box_type = struct.unpack(">I4s", header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+                header_size = 16
+            if box_type == b"moov":
+                return f.read(size - header_size)
+            if size == 0:
+                break
+            f.seek(size - header_size, os.SEEK_CUR)
+    raise ValueError(f"no moov box in {video_path}")
+
+
+def _find_video_tables(moov):
+    def walk(start, end, tables):
+        for box_type, body, box_end in _iter_boxes(moov, start, end):
+            if box_type in CONTAINER_BOXES:
+                walk(body, box_end, tables)
+            else:
+                tables[box_type] = (body, box_end)
+        return tables
+
+    for box_type, body, box_end in _iter_boxes(moov):
+        if box_type != b"trak":
+            continue
+        tables = walk(body, box_end, {})
+        if b"hdlr" in tables and moov[tables[b"hdlr"][0] + 8:tables[b"hdlr"][0] + 12] == b"vide":
+            return tables
+    raise ValueError("no video track in moov")
+
+
+def _table_entries(moov, tables, name, dtype, columns):
+    if name not in tables:
+        return None
+    body, _ = tables[name]
+    count = struct.unpack_from(">I", moov, body + 4)[0]
+    entries = np.frombuffer(moov, dtype=dtype, count=count * columns, offset=body + 8)
+    return entries.reshape(count, columns) if columns > 1 else entries
+
+
+def read_mp4_index(video_path):
+    '''
+    从 MP4 样本表解析关键帧和 PTS, 不解码任何帧
+    返回 {"frames", "fps", "keyframes", "pts"}, keyframes 为显示顺序下的帧序号
+    '''
+    moov = _read_moov(video_path)
+    tables = _find_video_tables(moov)
+
+    body, _ = tables[b"mdhd"]
+    version = moov[body]
+    timescale = struct.unpack_from(">I", moov, body + (20 if version == 1 else 12))[0]
+
+    stts = _table_entries(moov, tables, b"stts", ">u4", 2)
+    if stts is None or len(stts) == 0:
+        raise ValueError(f"{video_path} has no samples (fragmented mp4 is not supported)")
+    deltas = np.repeat(stts[:, 1].astype(np.int64), stts[:, 0].astype(np.int64))
+    dts = np.concatenate([[0], np.cumsum(deltas)[:-1]])
+
+    ctts = _table_entries(moov, tables, b"ctts", ">i4", 2)
+    pts = dts.copy()
+    if ctts is not None:
+        pts += np.repeat(ctts[:, 1].astype(np.int64), ctts[:, 0].astype(np.int64))[:len(dts)]
+
+    # 解码顺序 -> 显示顺序
+    order = np.argsort(pts, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    stss = _table_entries(moov, tables, b"stss", ">u4", 1)
+    if stss is None:
+        # 没有 stss 表示所有样本都是关键帧
+        keyframes = np.arange(len(dts))
+    else:
+        keyframes = np.sort(rank[stss.astype(np.int64) - 1])
+
+    pts_sorted = pts[order]
+    pts_seconds = (pts_sorted - pts_sorted[0]) / float(timescale)
+    duration = float(deltas.sum()) / timescale
+    return {
+        "frames": int(len(dts)),
+        "fps": len(dts) / duration if duration > 0 else None,
+        "keyframes": keyframes.tolist(),
+        "pts": np.round(pts_seconds, 6).tolist(),
+    }
+
+
+def write_video_index(video_path, gop=None):
+    index = read_mp4_index(video_path)
+    index = {"video": os.path.basename(video_path), "gop": gop, **index}
+    path = index_path_for(video_path)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_video_index(video_path, build=True):
+    '''
+    读取 sidecar 索引, 不存在时 (旧数据) 直接从 MP4 样本表解析
+    '''
+    path = index_path_for(video_path)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if not build:
+        return None
+    return {"video": os.path.basename(video_path), "gop": None, **read_mp4_index(video_path)}
+
+
+class SeekableVideoReader:
+    '''
+    按帧序号或时间戳随机读取 MP4, 只从最近的关键帧开始解码
+    输入:
+    video_path: MP4 路径, str
+    timestamps: 每帧的采集时间戳 (例如 info.json 中的 timestamp), None 时使用视频 PTS, List | np.ndarray
+    返回的帧与 HDF5 中 JPEG 列用 cv2.imdecode 解码的结果一致
+    '''
+    def __init__(self, video_path, timestamps=None):
+        self.video_path = video_path
+        self.index = load_video_index(video_path)
+        self.keyframes = self.index["keyframes"]
+        self.pts = np.asarray(self.index["pts"], dtype=np.float64)
+        self.timestamps = np.asarray(timestamps) if timestamps is not None else self.pts
+        if len(self.timestamps) != len(self):
+            debug_print("SeekableVideoReader",
+                        f"{len(self.timestamps)} timestamps for {len(self)} frames in {video_path}", "WARNING")
+
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"can not open {video_path}")
+        self._next = 0
+
+    @classmethod
+    def from_episode(cls, episode_dir, camera):
+        '''
+        打开 X_one_format_pipeline 输出的 episode 中的一路相机, 时间戳取自 info.json
+        '''
+        timestamps = None
+        info_path = os.path.join(episode_dir, "info.json")
+        if os.path.exists(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                timestamps = json.load(f).get("timestamps", {}).get(camera, {}).get("timestamp")
+        return cls(os.path.join(episode_dir, f"{camera}.mp4"), timestamps=timestamps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.index["frames"]
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def keyframe_before(self, frame_index):
+        return self.keyframes[bisect.bisect_right(self.keyframes, frame_index) - 1]
+
+    def frame_index_at(self, timestamp):
+        """时间戳所在的帧 (不晚于 timestamp 的最后一帧)"""
+        idx = int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1
+        return min(max(idx, 0), len(self) - 1)
+
+    def read(self, frame_index):
+        if frame_index < 0:
+            frame_index += len(self)
+        if not 0 <= frame_index < len(self):
+            raise IndexError(f"frame {frame_index} out of range [0, {len(self)})")
+
+        keyframe = self.keyframe_before(frame_index)
+        # 目标在当前位置之前, 或中间隔着关键帧时才 seek, 否则继续向前解码
+        if frame_index < self._next or keyframe > self._next:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self._next = keyframe
+        while self._next < frame_index:
+            if not self.cap.grab():
+                raise IOError(f"decode failed at frame {self._next} of {self.video_path}")
+            self._next += 1
+
+        ok, frame = self.cap.read()
+        if not ok:
+            raise IOError(f"decode failed at frame {frame_index} of {self.video_path}")
+        self._next += 1
+        return frame
+
+    def read_at(self, timestamp):
+        return self.read(self.frame_index_at(timestamp))
+
+    def read_batch(self, frame_indices):
+        '''
+        按显示顺序读取一组帧 (训练随机采样), 同一 GOP 内的帧共享一次解码
+        返回与 frame_indices 顺序一致的 List[np.ndarray]
+        '''
+        frames = {}
+        for frame_index in sorted(set(frame_indices)):
+            frames[frame_index] = self.read(frame_index)
+        return [frames[frame_index] for frame_index in frame_indices]
@@ -4,8 +4,13 @@ from robot.utils.base.load_file import load_yaml
 from robot.config._GLOBAL_CONFIG import ROOT_DIR, POLLING_INTERVAL
 from robot.utils.base.data_handler import debug_print
 from .base_env import BaseEnv
+from .policy_binding import load_eval_function
 from datetime import datetime
 from client_server.model_client import ModelClient
+from client_server.client_server_utils import wait_server_ready
+from client_server.async_model_client import MuxModelClient
+from client_server.obs_spec import ObservationSpec
+from client_server.latency_trace import LatencyTracer
 import time
 
 class DeployEnv(BaseEnv):
@@ -13,6 +18,8 @@ class DeployEnv(BaseEnv):
         super().__init__(base_cfg=base_cfg)
         self.success_num, self.episode_num = 0, 0
         self.deploy_cfg = deploy_cfg
+        # 每个 episode 复用同一个 eval_one_episode, 不再重复导入 deploy 模块
+        self.eval_function = load_eval_function(deploy_cfg['policy_name'])
 
         self.save_dir = os.path.join(deploy_cfg.get("result_dir"), task_name, deploy_cfg.get("policy_name"))
         
@@ -29,7 +36,22 @@ class DeployEnv(BaseEnv):
             self.episode_step_limit = self.task_info['step_lim']
             
         os.makedirs(self.save_dir, exist_ok=True)
-        self.model_client = ModelClient(port=deploy_cfg['port'])
+        if deploy_cfg.get("async_server", False):
+            self.model_client = MuxModelClient(port=deploy_cfg['port'])
+        else:
+            self.model_client = ModelClient(port=deploy_cfg['port'])
+        # 每一步各阶段的耗时 (客户端 + 服务端), 每个 episode 保存到 save_dir/latency_episode{idx}.json
+        self.tracer = LatencyTracer(enabled=deploy_cfg.get("latency_trace", True))
+        if self.tracer.enabled:
+            self.model_client.tracer = self.tracer
+        # 等待服务端模型预热完成, 避免第一步推理包含编译时间
+        status = wait_server_ready(self.model_client)
+        if status.get("warmup_error"):
+            debug_print("DEPLOY", f"policy warmup failed on server: {status['warmup_error']}", "WARNING")
+        # policy 声明需要的观测 (相机分辨率/格式/字段), 发送前在本地裁剪和缩小
+        self.obs_spec = ObservationSpec.negotiate(self.model_client)
+        if self.obs_spec is not None:
+            debug_print("DEPLOY", f"policy observation spec: {self.obs_spec}", "INFO")
         self.robot.set_up(teleop=False)
 
         if self.deploy_cfg.get("deploy", False):
@@ -40,26 +62,23 @@ class DeployEnv(BaseEnv):
             debug_print("DEPLOY", "deloy policy force_reach_mode=False.", "INFO")
 
     def get_obs(self):
-        return self.robot.get_obs()
+        self.tracer.step = self.episode_step
+        with self.tracer.span("get_obs"):
+            obs = self.robot.get_obs()
+        if self.obs_spec is not None:
+            with self.tracer.span("obs_spec"):
+                obs = self.obs_spec.apply(obs)
+        return obs
 
     def eval_one_episode(self):
-        policy_name = self.deploy_cfg['policy_name']
-        try:
-            eval_module = __import__(f'policy_lab.{policy_name}.deploy', fromlist=['eval_one_episode'])
-        except ImportError as e:
-            debug_print("DEPLOY", f"Failed to import policy module: policy_lab.{policy_name}.deploy. Error: {e}", "ERROR")
-            raise e
-            
-        if not hasattr(eval_module, 'eval_one_episode'):
-            debug_print("DEPLOY", f"Module 'policy_lab.{policy_name}.deploy' does not have 'eval_one_episode' function", "ERROR")
-            raise AttributeError(f"Missing eval_one_episode in policy module")
-            
-        eval_module.eval_one_episode(TASK_ENV=self, model_client=self.model_client)
+        self.eval_function(TASK_ENV=self, model_client=self.model_client)
 
     def reset(self):
         self.robot.reset()
         self.model_client.call(func_name="reset")
         self.episode_step = 0
+        self.tracer.reset()
+        self.tracer.sync_clock(self.model_client)
 
     def get_instruction(self):
         instruction = random.choice(self.task_info['instructions'])
@@ -71,10 +90,13 @@ class DeployEnv(BaseEnv):
         if self.episode_step > self.episode_step_limit:
             return
         
+        self.tracer.step = self.episode_step
         self.episode_step += 1
 
-        super().take_action(action)
+        with self.tracer.span("move"):
+            super().take_action(action)
 
+        pace_start = time.monotonic_ns()
         self.last_time = time.monotonic()
         if self.force_reach_mode:
             while self.robot.is_move():
@@ -97,11 +119,16 @@ class DeployEnv(BaseEnv):
                 else:
                     time.sleep(POLLING_INTERVAL)
             self.last_time = now
+        self.tracer.add("pace", pace_start, time.monotonic_ns())
 
     def is_episode_end(self):
         return self.episode_step >= self.episode_step_limit
     
     def finish_episode(self):
+        latency_path = self.tracer.save(self.save_dir, self.episode_idx)
+        if latency_path is not None:
+            debug_print("DEPLOY", f"latency spans saved to {latency_path}\n{self.tracer.format_summary()}", "INFO")
+
         # Finalize and log information for the completed episode
         print(f"\nEpisode {self.episode_idx} finished. Please input episode result (1=success, 2=fail): ", end="")
         x = input().strip()
@@ -4,7 +4,10 @@ from robot.utils.base.load_file import load_yaml
 from robot.config._GLOBAL_CONFIG import ROOT_DIR, POLLING_INTERVAL
 from robot.utils.base.data_handler import debug_print
 from .base_env import BaseEnv
+from .policy_binding import load_eval_function, MethodCache
+from .process_client import ProcessClient
 from datetime import datetime
+from client_server.latency_trace import LatencyTracer
 import time
 
 import importlib
@@ -15,21 +18,30 @@ class LocalClient:
         module = importlib.import_module(f"policy_lab.{deploy_cfg.get('policy_name')}")
         model_cls = getattr(module, "get_model")
         self.model = model_cls(deploy_cfg)
+        self.methods = MethodCache(self.model)
+        self.tracer = None
 
-    def call(self, func_name, obs=None):
-        debug_print("LocalClient", f"LocalClient called: {func_name}", "INFO")
-        method = getattr(self.model, func_name, None)
-        if method is None:
-            debug_print("LocalClient", f"Method {func_name} not found in model", "ERROR")
-            raise AttributeError(f"Method {func_name} not found in model")
-        
-        return method(obs) if obs is not None else method()
+        from policy_lab.warmup import warmup_model
+        elapsed = warmup_model(self.model, deploy_cfg)
+        if elapsed is not None:
+            debug_print("LocalClient", f"policy warmup finished in {elapsed:.2f}s", "INFO")
+
+    def call(self, func_name, obs=None, idempotent=False):
+        # idempotent 只为与 ModelClient 接口一致, 本地调用不会丢失响应
+        method = self.methods.get(func_name)
+        debug_print("LocalClient", f"LocalClient called: {func_name}", "DEBUG")
+
+        if self.tracer is None:
+            return method(obs) if obs is not None else method()
+        with self.tracer.span(f"{func_name}.infer"):
+            return method(obs) if obs is not None else method()
 
 class DeployLocalEnv(BaseEnv):
     def __init__(self, base_cfg, deploy_cfg, task_name):
         super().__init__(base_cfg=base_cfg)
         self.success_num, self.episode_num = 0, 0
         self.deploy_cfg = deploy_cfg
+        self.eval_function = load_eval_function(deploy_cfg['policy_name'])
 
         self.save_dir = os.path.join(deploy_cfg.get("result_dir"), task_name, deploy_cfg.get("policy_name"))
         
@@ -55,29 +67,29 @@ class DeployLocalEnv(BaseEnv):
             self.force_reach_mode = False
             debug_print("DEPLOY", "deloy policy force_reach_mode=False.", "INFO")
 
-        self.model_client = LocalClient(deploy_cfg=self.deploy_cfg)
+        if deploy_cfg.get("policy_process", False):
+            # policy 在子进程中推理, 不与机器人节点线程争抢 GIL, 观测/动作经共享内存传递
+            self.model_client = ProcessClient(deploy_cfg=self.deploy_cfg)
+        else:
+            self.model_client = LocalClient(deploy_cfg=self.deploy_cfg)
+        # 与 DeployEnv 相同的逐步耗时记录
+        self.tracer = LatencyTracer(enabled=deploy_cfg.get("latency_trace", True))
+        if self.tracer.enabled:
+            self.model_client.tracer = self.tracer
     
     def get_obs(self):
-        return self.robot.get_obs()
+        self.tracer.step = self.episode_step
+        with self.tracer.span("get_obs"):
+            return self.robot.get_obs()
 
     def eval_one_episode(self):
-        policy_name = self.deploy_cfg['policy_name']
-        try:
-            eval_module = __import__(f'policy_lab.{policy_name}.deploy', fromlist=['eval_one_episode'])
-        except ImportError as e:
-            debug_print("DEPLOY", f"Failed to import policy module: policy_lab.{policy_name}.deploy. Error: {e}", "ERROR")
-            raise e
-            
-        if not hasattr(eval_module, 'eval_one_episode'):
-            debug_print("DEPLOY", f"Module 'policy_lab.{policy_name}.deploy' does not have 'eval_one_episode' function", "ERROR")
-            raise AttributeError(f"Missing eval_one_episode in policy module")
-            
-        eval_module.eval_one_episode(TASK_ENV=self, model_client=self.model_client)
+        self.eval_function(TASK_ENV=self, model_client=self.model_client)
 
     def reset(self):
         self.robot.reset()
         self.model_client.call(func_name="reset")
         self.episode_step = 0
+        self.tracer.reset()
 
     def get_instruction(self):
         instruction = random.choice(self.task_info['instructions'])
@@ -89,10 +101,13 @@ class DeployLocalEnv(BaseEnv):
         if self.episode_step > self.episode_step_limit:
             return
         
+        self.tracer.step = self.episode_step
         self.episode_step += 1
 
-        super().take_action(action)
+        with self.tracer.span("move"):
+            super().take_action(action)
 
+        pace_start = time.monotonic_ns()
         self.last_time = time.monotonic()
         if self.force_reach_mode:
             while self.robot.is_move():
@@ -115,11 +130,16 @@ class DeployLocalEnv(BaseEnv):
                 else:
                     time.sleep(POLLING_INTERVAL)
             self.last_time = now
+        self.tracer.add("pace", pace_start, time.monotonic_ns())
 
     def is_episode_end(self):
         return self.episode_step >= self.episode_step_limit
     
     def finish_episode(self):
+        latency_path = self.tracer.save(self.save_dir, self.episode_idx)
+        if latency_path is not None:
+            debug_print("DEPLOY", f"latency spans saved to {latency_path}\n{self.tracer.format_summary()}", "INFO")
+
         # Finalize and log information for the completed episode
         print(f"\nEpisode {self.episode_idx} finished. Please input episode result (1=success, 2=fail): ", end="")
         x = input().strip()
@@ -0,0 +1,41 @@
+import functools
+import importlib
+
+from robot.utils.base.data_handler import debug_print
+
+
+@functools.lru_cache(maxsize=None)
+def load_eval_function(policy_name):
+    '''
+    解析 policy_lab.<policy_name>.deploy 中的 eval_one_episode, 每个 policy 只导入和检查一次
+    '''
+    try:
+        eval_module = importlib.import_module(f"policy_lab.{policy_name}.deploy")
+    except ImportError as e:
+        debug_print("DEPLOY", f"Failed to import policy module: policy_lab.{policy_name}.deploy. Error: {e}", "ERROR")
+        raise e
+
+    eval_function = getattr(eval_module, "eval_one_episode", None)
+    if not callable(eval_function):
+        debug_print("DEPLOY", f"Module 'policy_lab.{policy_name}.deploy' does not have 'eval_one_episode' function", "ERROR")
+        raise AttributeError(f"Missing eval_one_episode in policy module")
+    return eval_function
+
+
+class MethodCache:
+    '''
+    按名称缓存 model 的方法句柄, 每个方法只做一次 getattr 和检查
+    '''
+    def __init__(self, model):
+        self.model = model
+        self._methods = {}
+
+    def get(self, func_name):
+        method = self._methods.get(func_name)
+        if method is None:
+            method = getattr(self.model, func_name, None)
+            if not callable(method):
+                debug_print("POLICY", f"Method {func_name} not found in model", "ERROR")
+                raise AttributeError(f"Method {func_name} not found in model")
+            self._methods[func_name] = method
+        return method
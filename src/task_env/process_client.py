@@ -0,0 +1,218 @@
+"""
+Run the local policy in a child process.
+The robot node threads (arms at 200 Hz, cameras at 30 Hz) keep the parent's GIL to
+themselves while the model runs in its own interpreter. Requests and responses are
+written into two shared-memory rings of fixed-size slots; a one-way pipe per direction
+works as the doorbell and only carries (kind, slot, size). Messages larger than a slot
+go inline through the doorbell pipe instead.
+"""
+import atexit
+import multiprocessing as mp
+import struct
+import time
+import traceback
+from multiprocessing import shared_memory
+
+from robot.utils.base.bisocket import encode_message, decode_message
+from robot.utils.base.data_handler import debug_print
+
+# 门铃消息: 类型 (0: 数据在共享内存槽位中, 1: 数据随后通过管道发送), 槽位, 字节数
+DOORBELL = struct.Struct("!BIQ")
+IN_SLOT, INLINE = 0, 1
+STOP = "__stop__"
+READY = "__ready__"
+
+
+class ShmRing:
+    '''
+    共享内存环形缓冲区, slots 个大小为 slot_size 的槽位按顺序轮流使用
+    同一时刻只有一个请求在处理 (call 是同步的), 因此写入方不会覆盖读取方还在用的槽位
+    '''
+    def __init__(self, slots, slot_size, name=None):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = name is None
+        # spawn 的子进程与父进程共用 resource_tracker, 只由创建方 unlink
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * slot_size)
+        self.buf = self.shm.buf
+        self._next = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, parts):
+        '''
+        把 encode_message 的分段依次拷贝进下一个槽位, 返回 (槽位, 字节数); 放不下时返回 None
+        '''
+        views = [memoryview(part).cast("B") for part in parts]
+        size = sum(len(view) for view in views)
+        if size > self.slot_size:
+            return None
+        slot = self._next
+        self._next = (self._next + 1) % self.slots
+        offset = slot * self.slot_size
+        for view in views:
+            self.buf[offset:offset + len(view)] = view
+            offset += len(view)
+        return slot, size
+
+    def read(self, slot, size):
+        start = slot * self.slot_size
+        return self.buf[start:start + size]
+
+    def close(self):
+        self.buf.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _send(ring, conn, message):
+    parts = encode_message(message)
+    written = ring.write(parts)
+    if written is not None:
+        conn.send_bytes(DOORBELL.pack(IN_SLOT, *written))
+        return
+    blob = b"".join(parts)
+    conn.send_bytes(DOORBELL.pack(INLINE, 0, len(blob)))
+    conn.send_bytes(blob)
+
+
+def _recv(ring, conn):
+    kind, slot, size = DOORBELL.unpack(conn.recv_bytes())
+    if kind == INLINE:
+        return decode_message(conn.recv_bytes())
+    frame = ring.read(slot, size)
+    try:
+        return decode_message(frame)
+    finally:
+        frame.release()
+
+
+def _policy_worker(deploy_cfg, request_name, response_name, slots, slot_size, request_conn, response_conn):
+    '''
+    子进程入口: 加载模型并预热, 然后按门铃处理请求直到收到 STOP
+    '''
+    import importlib
+    from policy_lab.warmup import warmup_model
+    from .policy_binding import MethodCache
+
+    request_ring = ShmRing(slots, slot_size, name=request_name)
+    response_ring = ShmRing(slots, slot_size, name=response_name)
+    try:
+        module = importlib.import_module(f"policy_lab.{deploy_cfg.get('policy_name')}")
+        model = module.get_model(deploy_cfg)
+        methods = MethodCache(model)
+        elapsed = warmup_model(model, deploy_cfg)
+        _send(response_ring, response_conn, {"res": READY, "warmup_s": elapsed})
+
+        while True:
+            func_name, obs = _recv(request_ring, request_conn)
+            if func_name == STOP:
+                break
+            recv_ns = time.monotonic_ns()
+            try:
+                method = methods.get(func_name)
+                start_ns = time.monotonic_ns()
+                result = method(obs) if obs is not None else method()
+                end_ns = time.monotonic_ns()
+                response = {"res": result, "trace": {"recv": recv_ns, "decoded": recv_ns,
+                                                     "start": start_ns, "end": end_ns}}
+            except Exception as e:
+                response = {"error": f"Error handling request: {e}", "traceback": traceback.format_exc()}
+            _send(response_ring, response_conn, response)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        _send(response_ring, response_conn, {"error": f"Policy process failed: {e}", "traceback": traceback.format_exc()})
+    finally:
+        request_ring.close()
+        response_ring.close()
+
+
+class ProcessClient:
+    '''
+    与 LocalClient 接口相同, policy 运行在子进程中
+    输入:
+    deploy_cfg: 部署配置, 读取 policy_name 以及:
+        policy_shm_slots: 每个方向的槽位数, int
+        policy_shm_slot_mb: 每个槽位大小 (MB), 观测/动作超过时改走管道, int
+        policy_start_timeout: 等待子进程加载和预热模型的最长时间 (秒), None 表示一直等待, float
+    '''
+    def __init__(self, deploy_cfg):
+        slots = deploy_cfg.get("policy_shm_slots", 2)
+        slot_size = int(deploy_cfg.get("policy_shm_slot_mb", 32) * 1024 * 1024)
+        self.request_ring = ShmRing(slots, slot_size)
+        self.response_ring = ShmRing(slots, slot_size)
+        self.tracer = None
+
+        # spawn: 不把父进程中 robot 节点的线程和 CAN/相机句柄复制到子进程
+        ctx = mp.get_context("spawn")
+        request_recv, self.request_conn = ctx.Pipe(duplex=False)
+        self.response_conn, response_send = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_policy_worker,
+            args=(deploy_cfg, self.request_ring.name, self.response_ring.name, slots, slot_size,
+                  request_recv, response_send),
+            name="policy-process",
+            daemon=True,
+        )
+        self.process.start()
+        request_recv.close()
+        response_send.close()
+        self._closed = False
+        atexit.register(self.close)
+
+        debug_print("ProcessClient", f"Waiting for policy process (pid={self.process.pid}) to load the model...", "INFO")
+        self._wait(deploy_cfg.get("policy_start_timeout"))
+        ready = _recv(self.response_ring, self.response_conn)
+        if "error" in ready:
+            self.close()
+            raise RuntimeError(f"{ready['error']}\n{ready.get('traceback', '')}")
+        debug_print("ProcessClient", f"Policy process ready (warmup={ready.get('warmup_s')})", "INFO")
+
+    def _wait(self, timeout=None):
+        '''
+        等待子进程的门铃, 子进程异常退出时抛出而不是一直阻塞
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.response_conn.poll(0.5):
+            if not self.process.is_alive():
+                raise RuntimeError(f"Policy process exited with code {self.process.exitcode}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"No response from policy process after {timeout}s")
+
+    def call(self, func_name, obs=None, idempotent=False):
+        # idempotent 只为与 ModelClient 接口一致, 子进程通信不重发请求
+        debug_print("ProcessClient", f"ProcessClient called: {func_name}", "DEBUG")
+        start_ns = time.monotonic_ns()
+        _send(self.request_ring, self.request_conn, (func_name, obs))
+        sent_ns = time.monotonic_ns()
+        self._wait()
+        received_ns = time.monotonic_ns()
+        response = _recv(self.response_ring, self.response_conn)
+        if self.tracer is not None:
+            # 子进程与父进程共用同一个 monotonic 时钟, 不需要估计时钟偏差
+            self.tracer.record_rpc(func_name, start_ns, sent_ns, received_ns, time.monotonic_ns(),
+                                   response.pop("trace", None))
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["res"]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.process.is_alive():
+            try:
+                _send(self.request_ring, self.request_conn, (STOP, None))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.request_conn.close()
+        self.response_conn.close()
+        self.request_ring.close()
+        self.response_ring.close()